@@ -1,25 +1,44 @@
+import time
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from datetime import datetime, time
+from datetime import datetime
 import pytz
 import google.generativeai as genai
-import ta
-import yfinance as yf 
 from plotly.subplots import make_subplots
 import plotly.express as px
 
 # 匯入模組
 from ui.styles import apply_css, COLOR_UP, COLOR_DOWN, COLOR_NEUTRAL, VOL_EXPLODE, VOL_NORMAL, VOL_SHRINK, VOL_MA_LINE, COLOR_VWAP, MACD_BULL_GROW, MACD_BULL_SHRINK, MACD_BEAR_GROW, MACD_BEAR_SHRINK
 from ui.cards import get_price_card_html, get_timeline_html, get_metric_card_html
-from data.fetch import fetch_stock_data_now, fetch_exchange_rate_now
-from logic.indicators import calculate_ma, get_strategy_values, calculate_bollinger, calculate_vwap
-from logic.strategies import generate_ai_summary
+from ui.serialize import compact_figure, binary_colors, record_payload, payload_report, to_ms
+from data.fetch import load_stock_bundle, get_stock_bundle, fetch_quote, fetch_intraday_data, fetch_universe_history, fetch_daily_history, clear_stock_cache, DAILY_TTL
+from data.compact import get_shared_store, session_memory_report
+from data.memo import cached_indicators, get_indicator_memo, data_fingerprint, spec_hash
+from data.live import poll_live_intraday, session_hours, LIVE_POLL_SECONDS, LIVE_INTERVAL_OPTIONS
+from data.quotes import fetch_quote_snapshot, get_quote_symbols, MACRO_SYMBOLS, FX_SYMBOLS, FALLBACK_USDTWD
+from data.singleflight import get_singleflight_stats
+from data.scheduler import get_scheduler
+from data.snapshot import get_snapshot_service
+from data.universe import SECTOR_TICKERS, TICKER_SECTOR, get_universe_tickers
+from logic.indicators import compute_indicators, make_spec, get_strategy_values
+from logic.batch import universe_indicators
+from logic.strategies import generate_ai_summary, screen_universe, signal_series, regime_segments
 from logic.fees import get_fees
+from logic.backtest import backtest_ma_cross
+from logic.optimize import SweepJob
+from logic.correlation import correlation_view, most_correlated, CORR_WINDOWS, BENCHMARK
+from logic.portfolio import backtest_portfolio, REBALANCE_FREQ, RULES as PORTFOLIO_RULES
+from logic.downsample import downsample_chart, CHART_POINTS
+from logic.lookback import plan_lookback, DEFAULT_MA_LIST, DEFAULT_CHART_DAYS, covered_windows, next_window
 
 # --- 1. 網頁設定 & AI 初始化 ---
 st.set_page_config(page_title="AI 智能操盤戰情室 (VIP 終極版)", layout="wide", initial_sidebar_state="collapsed")
 apply_css()
+# [新增] 本次執行的起點：量測主圖等區塊送到瀏覽器的時間
+RUN_STARTED = time.perf_counter()
 
 # ─────────────────────────────────────────────────────────────
 #  [手機優化] 統一的 Plotly 設定輔助函式
@@ -54,6 +73,14 @@ def get_mobile_chart_config(allow_zoom: bool = True) -> dict:
         }
 
 
+def mark_paint(name):
+    """
+    [新增] 記錄從腳本開始到此處經過的毫秒數
+    Streamlit 依執行順序把元素串流給瀏覽器，因此可視為該區塊的首次繪製時間
+    """
+    st.session_state.setdefault('paint_ms', {})[name] = (time.perf_counter() - RUN_STARTED) * 1000
+
+
 def get_responsive_height(desktop: int, mobile: int = None) -> int:
     """根據設備回傳適合的圖表高度 (Streamlit 無法動態偵測，用保守值)"""
     # Streamlit 無法在 Python 端偵測螢幕寬度，
@@ -65,62 +92,36 @@ def get_responsive_height(desktop: int, mobile: int = None) -> int:
     return desktop
 
 
-@st.cache_data(ttl=300)
-def get_macro_data():
-    """抓取宏觀數據 (VIX, 黃金, 原油, BTC)"""
-    tickers = {"VIX": "^VIX", "Gold": "GC=F", "Oil": "CL=F", "BTC": "BTC-USD"}
-    try:
-        raw = yf.download(list(tickers.values()), period="5d", progress=False)
-        # [修正] 安全取得 Close 資料 (處理 MultiIndex)
-        if isinstance(raw.columns, pd.MultiIndex):
-            data = raw['Close']
-        else:
-            data = raw
-        result = {}
-        for name, ticker in tickers.items():
-            try:
-                col = data[ticker]
-                col_clean = col.dropna()
-                if len(col_clean) >= 2:
-                    curr, prev = col_clean.iloc[-1], col_clean.iloc[-2]
-                    chg = ((curr - prev) / prev) * 100
-                    result[name] = (float(curr), float(chg))
-                else:
-                    result[name] = (0.0, 0.0)
-            except:
-                result[name] = (0.0, 0.0)
-        return result
-    except:
-        return {}
+def render_quote_metric(container, label, quote, fmt, delta_color='normal'):
+    """[新增] 以 st.metric 顯示報價，過期 / 無資料時明確標示，不再顯示 0"""
+    if quote is None or quote.last is None:
+        container.metric(label, '—', '無資料', delta_color='off',
+                         help=quote.error if quote is not None else None)
+        return
+    as_of = quote.as_of.strftime('%Y-%m-%d %H:%M') if quote.as_of is not None else '-'
+    help_text = f'資料時間：{as_of}' + (f'\n\n⚠️ 本次更新失敗，顯示上次成功的數值 ({quote.error})' if quote.stale else '')
+    container.metric(label + (' ⚠️' if quote.stale else ''), fmt.format(quote.last),
+                     f'{quote.change_pct:.2f}%', delta_color=delta_color, help=help_text)
 
 
 # ─────────────────────────────────────────────────────────────
 #  [全面修正] 互動式主圖表 — 手機友善版
 # ─────────────────────────────────────────────────────────────
-def plot_interactive_chart(df, ticker):
+# [新增] 趨勢狀態底色 (盤整不著色)
+REGIME_COLORS = {'多頭': '#00C853', '空頭': '#FF3D00'}
+
+
+def plot_interactive_chart(df, ticker, signals=None):
     """
     繪製互動式圖表 (K線 + 量 + MACD + RSI)
+    signals：logic.strategies.signal_series 的結果，提供時在 K 線區加上趨勢狀態底色
     手機優化：
       - 工具列強制顯示 (縮放 / 復位)
       - scrollZoom=True 支援雙指縮放
       - 移除週末空白
       - 圖表高度手機版自適應
     """
-    df = df.copy()
-
-    # --- 計算指標 (以 Pandas 手算，最穩) ---
-    exp12 = df['Close'].ewm(span=12, adjust=False).mean()
-    exp26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD']        = exp12 - exp26
-    df['MACD_Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    df['MACD_Hist']   = df['MACD'] - df['MACD_Signal']
-
-    if 'RSI' not in df.columns:
-        delta = df['Close'].diff()
-        gain  = delta.where(delta > 0, 0).rolling(window=14).mean()
-        loss  = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['RSI'] = (100 - (100 / (1 + rs))).fillna(50)
+    # [修正] 指標 (MACD / RSI) 已由 compute_indicators 算好，直接讀取
 
     # --- 子圖配置 ---
     fig = make_subplots(
@@ -153,27 +154,36 @@ def plot_interactive_chart(df, ticker):
                 name=ma_name, opacity=0.85
             ), row=1, col=1)
 
+    # [新增] Row 1：趨勢狀態底色 (連續相同狀態合併成一塊，shape 數量 = 狀態切換次數)
+    if signals is not None and not signals.empty:
+        x = signals.index
+        shapes = [
+            dict(type='rect', xref='x', yref='y domain', x0=x[start], x1=x[min(end + 1, len(x) - 1)],
+                 y0=0, y1=1, fillcolor=REGIME_COLORS[state], opacity=0.08, line_width=0, layer='below')
+            for start, end, state in regime_segments(signals['trend'].to_numpy())
+            if state in REGIME_COLORS
+        ]
+        fig.update_layout(shapes=shapes)
+
     # Row 2：成交量
-    vol_colors = ['#00C853' if c >= o else '#FF3D00'
-                  for c, o in zip(df['Close'], df['Open'])]
+    # [修正] 漲跌顏色以 0 / 1 + colorscale 傳送，不再逐根產生顏色字串
     fig.add_trace(go.Bar(
         x=df.index, y=df['Volume'],
-        marker_color=vol_colors,
+        marker=binary_colors(df['Close'] >= df['Open'], '#00C853', '#FF3D00'),
         name='Volume', showlegend=False
     ), row=2, col=1)
 
     # Row 3：MACD
-    hist_colors = ['#00C853' if h >= 0 else '#FF3D00' for h in df['MACD_Hist']]
     fig.add_trace(go.Bar(
-        x=df.index, y=df['MACD_Hist'],
-        marker_color=hist_colors, name='MACD Hist', showlegend=False
+        x=df.index, y=df['Hist'],
+        marker=binary_colors(df['Hist'] >= 0, '#00C853', '#FF3D00'), name='MACD Hist', showlegend=False
     ), row=3, col=1)
     fig.add_trace(go.Scatter(
         x=df.index, y=df['MACD'],
         line=dict(color='#2962FF', width=1.2), name='MACD'
     ), row=3, col=1)
     fig.add_trace(go.Scatter(
-        x=df.index, y=df['MACD_Signal'],
+        x=df.index, y=df['Signal'],
         line=dict(color='#FF6D00', width=1.2), name='Signal'
     ), row=3, col=1)
 
@@ -217,89 +227,175 @@ def plot_interactive_chart(df, ticker):
         rangebreaks=[dict(bounds=['sat', 'mon'])],
     )
 
+    # [新增] 日期轉數值、價格取到跳動單位、陣列改用 typed array
+    return compact_figure(fig)
+
+
+# [新增] 完整歷史的主圖只在 (代號, 資料版本, 快慢線) 改變時重建；
+#        各顯示區間的座標範圍預先算好放進按鈕，切換時不重建 trace
+@st.cache_resource(max_entries=8, show_spinner=False)
+def build_main_chart(ticker, data_version, fast, slow, _df):
+    signals = signal_series(_df, fast, slow)
+    fig = plot_interactive_chart(_df, ticker, signals)
+    # [修正] 顯示區間改為圖上的按鈕 (relayout 只改座標範圍)，在瀏覽器端切換，不重跑腳本、不重送整張圖
+    #        只放已載入歷史涵蓋得到的區間
+    covered = covered_windows(len(_df))
+    windows = [(label, chart_window_layout(_df, days)) for label, days in covered]
+    fig.update_layout(
+        chart_window_layout(_df, DEFAULT_CHART_DAYS),
+        # 同一檔股票重跑時保留使用者的縮放 / 平移
+        uirevision=ticker,
+        updatemenus=[dict(
+            type='buttons', direction='right', showactive=True,
+            active=next((i for i, (_, days) in enumerate(covered) if days == DEFAULT_CHART_DAYS), -1),
+            x=0, xanchor='left', y=1.02, yanchor='bottom', pad=dict(t=0, b=0, l=0, r=0),
+            font=dict(size=10), bgcolor='#f8f9fa',
+            buttons=[dict(label=label, method='relayout', args=[layout]) for label, layout in windows],
+        )],
+    )
+    record_payload('主圖', fig, force=True)
     return fig
 
 
-# ─────────────────────────────────────────────────────────────
-#  板塊清單 (不變)
-# ─────────────────────────────────────────────────────────────
-SECTOR_TICKERS = {
-    "Technology": [
-        "NVDA", "AAPL", "MSFT", "AMD", "INTC", "TSM", "AVGO", "QCOM", "ORCL", "ADBE",
-        "CRM", "CSCO", "TXN", "IBM", "NOW", "MU", "LRCX", "AMAT", "ADI", "PANW"
-    ],
-    "Communication": [
-        "GOOGL", "META", "NFLX", "DIS", "TMUS", "VZ", "CMCSA", "T", "CHTR", "DASH"
-    ],
-    "Consumer Cyclical": [
-        "AMZN", "TSLA", "HD", "MCD", "NKE", "SBUX", "LOW", "BKNG", "TJX", "F",
-        "GM", "LULU", "MAR", "HLT", "CMG"
-    ],
-    "Financial": [
-        "JPM", "BAC", "V", "MA", "WFC", "MS", "GS", "BLK", "C", "AXP",
-        "SPGI", "PGR", "CB", "MMC", "UBS", "SCHW"
-    ],
-    "Healthcare": [
-        "LLY", "UNH", "JNJ", "MRK", "PFE", "ABBV", "TMO", "ABT", "DHR", "BMY",
-        "AMGN", "CVS", "ELV", "GILD", "ISRG", "SYK"
-    ],
-    "Energy": [
-        "XOM", "CVX", "COP", "SLB", "EOG", "MPC", "PSX", "VLO", "OXY", "KMI", "WMB"
-    ],
-    "Industrials": [
-        "CAT", "GE", "LMT", "RTX", "BA", "HON", "UNP", "UPS", "DE", "ADP",
-        "ETN", "WM", "GD", "NOC", "ITW", "EMR"
-    ],
-    "Consumer Defensive": [
-        "WMT", "PG", "COST", "KO", "PEP", "PM", "MO", "EL", "CL", "KMB",
-        "GIS", "SYY", "STZ", "TGT"
-    ],
-    "Utilities": [
-        "NEE", "DUK", "SO", "AEP", "SRE", "D", "PEG", "PCG", "EXC", "XEL"
-    ],
-    "Real Estate": [
-        "PLD", "AMT", "CCI", "EQIX", "PSA", "O", "SPG", "WELL", "DLR", "VICI"
-    ]
-}
-
-
-@st.cache_data(ttl=1800)
-def plot_market_map_v2(target_sector=None, use_equal_weight=False):
-    """繪製板塊熱力圖 (v5：支援等權重模式)"""
-    sectors_to_fetch = {target_sector: SECTOR_TICKERS[target_sector]} if target_sector in SECTOR_TICKERS else SECTOR_TICKERS
-    all_tickers = [t for tickers in sectors_to_fetch.values() for t in tickers]
-    data_list = []
+def extend_chart_history(days):
+    """主圖要顯示更長的區間：下次載入時依此規劃日K長度"""
+    st.session_state.chart_history_days = days
+
+
+def chart_window_layout(df, days):
+    """最近 days 根K棒的 x 範圍，以及各子圖在此範圍內的 y 範圍 (plotly 不會依 x 範圍自動縮放 y)"""
+    view = df.tail(days)
+    pad = pd.Timedelta(hours=12)
+
+    def span(cols, lo=None, hi=None, margin=0.05):
+        values = view[[c for c in cols if c in view.columns]].to_numpy(dtype=float)
+        low, high = np.nanmin(values), np.nanmax(values)
+        low = min(low, lo) if lo is not None else low
+        high = max(high, hi) if hi is not None else high
+        gap = (high - low) * margin or abs(high) * margin or 1.0
+        return [low - gap, high + gap]
+
+    price_cols = ['Low', 'High'] + [c for c in view.columns if c.startswith('MA_')]
+    # 與 compact_figure 後的 x 資料同單位 (毫秒)
+    x_range = [to_ms(view.index[0] - pad), to_ms(view.index[-1] + pad)]
+    return {
+        # 子圖共用 x 軸 (matches)，四個軸給同一個範圍
+        **{f'xaxis{i}.range': x_range for i in ('', 2, 3, 4)},
+        'yaxis.range': span(price_cols),
+        'yaxis2.range': [0, np.nanmax(view['Volume'].to_numpy(dtype=float)) * 1.1 or 1],
+        'yaxis3.range': span(['Hist', 'MACD', 'Signal']),
+        'yaxis4.range': span(['RSI'], lo=30, hi=70),
+    }
+
+
+# [新增] 長期模式：完整歷史降採樣到約圖表寬度的點數，線圖用 WebGL (Scattergl)
+LONG_RANGE_BARS = 252 * 10
+LONG_RANGE_LINES = ['MA_20', 'MA_60', 'MA_200', 'MACD', 'Signal', 'RSI']
+
+
+def plot_long_range_chart(data, ticker):
+    """downsample_chart 的結果畫成與主圖相同的 4 列版面 (K線為區間彙整，線圖為 LTTB)"""
+    ohlc, lines = data['ohlc'], data['lines']
+    fig = make_subplots(
+        rows=4, cols=1, shared_xaxes=True, vertical_spacing=0.04,
+        row_heights=[0.50, 0.16, 0.17, 0.17],
+        subplot_titles=(f'{ticker} K線 ({data["bars"]} 根 → {len(ohlc)} 點)', '成交量', 'MACD', 'RSI')
+    )
+    fig.add_trace(go.Candlestick(
+        x=ohlc.index, open=ohlc['Open'], high=ohlc['High'], low=ohlc['Low'], close=ohlc['Close'],
+        name='K線', increasing_line_color='#00C853', decreasing_line_color='#FF3D00',
+    ), row=1, col=1)
+    ma_colors = {'MA_20': '#FF6D00', 'MA_60': '#00C853', 'MA_200': '#2962FF'}
+    for name, color in ma_colors.items():
+        if name in lines:
+            fig.add_trace(go.Scattergl(x=lines[name][0], y=lines[name][1], name=name,
+                                       line=dict(color=color, width=1.2), opacity=0.85), row=1, col=1)
+
+    fig.add_trace(go.Bar(
+        x=ohlc.index, y=ohlc['Volume'], name='Volume', showlegend=False,
+        marker=binary_colors(ohlc['Close'] >= ohlc['Open'], '#00C853', '#FF3D00'),
+    ), row=2, col=1)
+
+    if data['hist'] is not None:
+        hx, hy = data['hist']
+        fig.add_trace(go.Bar(x=hx, y=hy, name='MACD Hist', showlegend=False,
+                             marker=binary_colors(hy >= 0, '#00C853', '#FF3D00')), row=3, col=1)
+    for name, color, row in [('MACD', '#2962FF', 3), ('Signal', '#FF6D00', 3), ('RSI', '#9C27B0', 4)]:
+        if name in lines:
+            fig.add_trace(go.Scattergl(x=lines[name][0], y=lines[name][1], name=name,
+                                       line=dict(color=color, width=1.2)), row=row, col=1)
+    fig.add_hline(y=70, row=4, col=1, line_dash='dot', line_color='red', line_width=1)
+    fig.add_hline(y=30, row=4, col=1, line_dash='dot', line_color='green', line_width=1)
+
+    # 降採樣後每點間隔數天，週末空白已不明顯；Scattergl 也不支援 rangebreaks
+    fig.update_layout(
+        height=780, xaxis_rangeslider_visible=False, template='plotly_white',
+        margin=dict(l=5, r=5, t=28, b=8), showlegend=True,
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1, font=dict(size=11)),
+        dragmode='pan', hovermode='x unified',
+    )
+    fig.update_yaxes(tickfont=dict(size=10), nticks=5)
+    fig.update_xaxes(tickfont=dict(size=10))
+    return compact_figure(fig)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def build_long_range_chart(ticker, data_version, start, end, points, _df):
+    """(代號, 資料版本, 顯示區間) 相同時共用同一張圖；區間縮小時以同樣點數重新取樣 → 細節變多"""
+    view = _df.loc[start:end]
+    fig = plot_long_range_chart(downsample_chart(view, points, LONG_RANGE_LINES), ticker)
+    record_payload('長期主圖', fig, force=True)
+    return fig
+
+
+# [新增] 相關性 / Beta：依 (視窗, 交易日) 快取，同一天重複檢視不重算
+CORR_HISTORY_BARS = max(CORR_WINDOWS) + 1
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_correlation_view(window, trading_date):
+    close = fetch_universe_history(tuple(get_universe_tickers() + [BENCHMARK]), CORR_HISTORY_BARS)['Close']
+    return correlation_view(close, window)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_most_correlated(ticker, window, trading_date, top=10):
+    close = fetch_universe_history(tuple(get_universe_tickers() + [BENCHMARK]), CORR_HISTORY_BARS)['Close']
+    target_close = None if ticker in close.columns else fetch_daily_history(ticker, CORR_HISTORY_BARS)['Close']
+    return most_correlated(close, ticker, window, top, target_close)
+
+
+def plot_correlation_heatmap(corr):
+    """分群排序後的相關矩陣熱力圖"""
+    fig = go.Figure(go.Heatmap(
+        z=corr.to_numpy(), x=list(corr.columns), y=list(corr.index),
+        colorscale='RdBu_r', zmin=-1, zmax=1,
+        hovertemplate='%{y} × %{x}<br>相關 %{z:.2f}<extra></extra>',
+    ))
+    fig.update_layout(
+        height=get_responsive_height(640), template='plotly_white', margin=dict(l=5, r=5, t=10, b=8),
+        xaxis=dict(showticklabels=False), yaxis=dict(showticklabels=False, autorange='reversed'),
+    )
+    record_payload('相關矩陣', compact_figure(fig))
+    return fig
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def plot_market_map_v2(target_sector=None, use_equal_weight=False, snapshot_version=0):
+    """
+    繪製板塊熱力圖 (v6：改由背景快照切片)
+    snapshot_version 只用來區分快取：快照更新後才重新繪製
+    """
+    snap, _, _ = get_snapshot_service().get()
+    if snap.empty: return None
 
     try:
-        raw = yf.download(all_tickers, period='1d', group_by='ticker', progress=False)
-
-        for sector, tickers in sectors_to_fetch.items():
-            for t in tickers:
-                try:
-                    if isinstance(raw.columns, pd.MultiIndex):
-                        if t not in raw.columns.get_level_values(0): continue
-                        sub_df = raw[t]
-                    else:
-                        continue
-
-                    close  = float(sub_df['Close'].iloc[-1])
-                    open_p = float(sub_df['Open'].iloc[-1])
-                    volume = float(sub_df['Volume'].iloc[-1])
-                    change_pct = ((close - open_p) / open_p) * 100
-                    turnover   = close * volume if volume > 0 else 1000
-
-                    data_list.append({
-                        'Ticker': t, 'Sector': sector,
-                        'Change': change_pct, 'Price': close,
-                        'Turnover': turnover, 'EqualSize': 1,
-                        'DisplayLabel': f'{t}<br>{change_pct:+.2f}%'
-                    })
-                except:
-                    continue
-
-        if not data_list: return None
-
-        df_tree = pd.DataFrame(data_list)
+        df_tree = snap[snap['Sector'] == target_sector] if target_sector in SECTOR_TICKERS else snap
+        if df_tree.empty: return None
+
+        df_tree = df_tree.reset_index()
+        df_tree['EqualSize']    = 1
+        df_tree['DisplayLabel'] = df_tree['Ticker'] + '<br>' + df_tree['Change'].map('{:+.2f}%'.format)
         title      = f'🔥 {target_sector} 板塊熱力圖' if target_sector else '🔥 全市場熱力圖 (S&P 100)'
         value_col  = 'EqualSize' if use_equal_weight else 'Turnover'
 
@@ -325,6 +421,7 @@ def plot_market_map_v2(target_sector=None, use_equal_weight=False):
             height=600,
             uniformtext=dict(minsize=9, mode='hide')
         )
+        record_payload('熱力圖', compact_figure(fig))
         return fig
 
     except Exception as e:
@@ -355,30 +452,13 @@ def get_gemini_model():
 # --- 技術分析摘要 (for Gemini prompt) ---
 def generate_technical_context(df):
     if len(df) < 60: return '數據不足，略過技術分析。'
-    df_calc = df.copy()
-    close = df_calc['Close']
-
-    sma20_series = close.rolling(window=20).mean()
-    sma60_series = close.rolling(window=60).mean()
-
-    delta = close.diff()
-    gain  = (delta.where(delta > 0, 0)).ewm(alpha=1/14, adjust=False).mean()
-    loss  = (-delta.where(delta < 0, 0)).ewm(alpha=1/14, adjust=False).mean()
-    rs = gain / loss
-    rsi_series = 100 - (100 / (1 + rs))
-
-    exp12 = close.ewm(span=12, adjust=False).mean()
-    exp26 = close.ewm(span=26, adjust=False).mean()
-    macd_line   = exp12 - exp26
-    signal_line = macd_line.ewm(span=9, adjust=False).mean()
-    macd_hist   = macd_line - signal_line
-
-    price  = close.iloc[-1]
-    sma20  = sma20_series.iloc[-1]
-    sma60  = sma60_series.iloc[-1]
-    rsi    = rsi_series.iloc[-1]
-    cur_hist  = macd_hist.iloc[-1]
-    prev_hist = macd_hist.iloc[-2]
+    # [修正] 直接讀取 compute_indicators 的結果 (MA_20 / MA_60 / RSI / Hist)，與其他面板數值一致
+    price  = df['Close'].iloc[-1]
+    sma20  = df['MA_20'].iloc[-1]
+    sma60  = df['MA_60'].iloc[-1]
+    rsi    = df['RSI'].iloc[-1]
+    cur_hist  = df['Hist'].iloc[-1]
+    prev_hist = df['Hist'].iloc[-2]
 
     report = []
     report.append(f'股價 ({price:.2f}) {"站上" if price > sma20 else "跌破"} 月線 (20MA: {sma20:.2f})，短線{"轉強" if price > sma20 else "示弱"}。')
@@ -418,10 +498,22 @@ with st.sidebar:
          'Simons (西蒙斯 - 量化數據)',
          'General (軍工複合體 - 地緣政治)'], index=0)
 
-    if st.button('🔄 更新報價 (Refresh)'):
+    # [新增] 自訂追蹤代號，與宏觀指標 / 匯率同批下載
+    extra_symbols_input = st.text_input('📌 自訂追蹤代號 (逗號分隔)', '', key='sidebar_extra_symbols',
+                                        placeholder='例：^TWII, ETH-USD')
+    extra_symbols = [s.strip().upper() for s in extra_symbols_input.split(',') if s.strip()]
+
+    # [新增] 即時模式：盤中只輪詢最新K棒，定期重繪報價卡
+    live_mode = st.toggle('⚡ 即時模式 (盤中自動更新)', value=False, key='sidebar_live_mode')
+    # [新增] 報價卡自動更新間隔 (只重跑報價卡 fragment，其餘頁面不動)
+    live_interval = st.select_slider('更新間隔 (秒)', options=LIVE_INTERVAL_OPTIONS, value=LIVE_POLL_SECONDS,
+                                     key='sidebar_live_interval', disabled=not live_mode)
+
+    # [修正] 手動重新整理日K / 基本面 (報價卡另有自己的更新按鈕)
+    if st.button('🔄 重新載入資料 (Refresh)', key='sidebar_refresh'):
         if 'stored_ticker' in st.session_state:
-            del st.session_state['stored_ticker']
-        st.rerun()
+            clear_stock_cache(st.session_state.stored_ticker, st.session_state.get('data_bars'))
+            st.session_state.data_loaded_at = 0     # 視同過期，下方主流程重新載入
 
     st.markdown('---')
     st.subheader('🧠 策略邏輯')
@@ -436,27 +528,197 @@ with st.sidebar:
 
 
 # ─────────────────────────────────────────────────────────────
-#  3. 計算機 Tab (Fragment)
+#  3. 報價卡 + 走勢迷你圖 (Fragment)
+# ─────────────────────────────────────────────────────────────
+# 分K只需要 VWAP
+INTRADAY_SPEC = make_spec(ma=[], macd=None, rsi=None, bollinger=None, vol_ma=None, vwap=True)
+
+def render_price_card(ticker, fallback_prev_close, fallback_close, live_mode=False):
+    """
+    [新增] 報價卡與走勢迷你圖獨立出來，以 fragment 執行：
+    即時模式下定期只重跑這一塊，其餘頁面不動
+    [修正] 報價與分K由 fragment 自己抓 (各有快取)，不依賴整頁重跑帶進來的資料
+    """
+    if live_mode:
+        # 即時模式：只補抓最新K棒，VWAP / 當日高低點增量更新
+        buffer   = poll_live_intraday(ticker)
+        df_intra = buffer.to_frame()
+        day_high, day_low = buffer.day_high, buffer.day_low
+        quote    = buffer.quote(df_intra)
+    else:
+        df_intra, _ = fetch_intraday_data(ticker)
+        # [新增] 報價卡改用輕量報價 (不依賴 stock.info)
+        quote = fetch_quote(ticker)
+
+    if not live_mode and not df_intra.empty:
+        # [修正] VWAP 對分鐘線計算才有意義
+        df_intra = compute_indicators(df_intra, INTRADAY_SPEC)
+
+        df_intra.index = pd.to_datetime(df_intra.index)
+        tz_str, open_time, close_time = session_hours(ticker)
+        try:
+            df_intra_tz = df_intra.tz_convert(tz_str)
+        except TypeError:
+            # 無時區資訊的索引無法轉換，直接使用
+            df_intra_tz = df_intra
+
+        mask_reg_hl = (df_intra_tz.index.time >= open_time) & (df_intra_tz.index.time <= close_time)
+        df_reg_hl = df_intra_tz[mask_reg_hl]
+        day_high = df_reg_hl['High'].max() if not df_reg_hl.empty else df_intra_tz['High'].max()
+        day_low  = df_reg_hl['Low'].min()  if not df_reg_hl.empty else df_intra_tz['Low'].min()
+
+    previous_close = quote['previous_close'] or fallback_prev_close
+    regular_price  = quote['last_price'] or fallback_close
+
+    is_extended, ext_price, ext_label = False, 0, ''
+    live_price = df_intra['Close'].iloc[-1] if not df_intra.empty else 0
+    if quote['pre_market_price']:
+        ext_price, is_extended, ext_label = quote['pre_market_price'], True, '盤前'
+    elif quote['post_market_price']:
+        ext_price, is_extended, ext_label = quote['post_market_price'], True, '盤後'
+    elif not df_intra.empty and abs(live_price - regular_price) / max(regular_price, 0.01) > 0.001:
+        ext_price, is_extended, ext_label = live_price, True, '盤後/試撮'
+
+    reg_change  = regular_price - previous_close
+    reg_pct     = (reg_change / previous_close) * 100
+    ext_pct     = ((ext_price - regular_price) / regular_price) * 100 if is_extended else 0
+    day_high_pct = ((day_high - previous_close) / previous_close) * 100 if not df_intra.empty else 0
+    day_low_pct  = ((day_low  - previous_close) / previous_close) * 100 if not df_intra.empty else 0
+
+    fig_spark = go.Figure()
+
+    if not df_intra.empty:
+        tz_tw = pytz.timezone('Asia/Taipei')
+        if df_intra.index.tz is None:
+            df_plot = df_intra.tz_localize('UTC').tz_convert(tz_tw)
+        else:
+            df_plot = df_intra.tz_convert(tz_tw)
+
+        last_dt = df_plot.index[-1]
+        if last_dt.hour < 12:
+            session_start = (last_dt - pd.Timedelta(days=1)).replace(hour=17, minute=0, second=0, microsecond=0)
+        else:
+            session_start = last_dt.replace(hour=17, minute=0, second=0, microsecond=0)
+        session_end = session_start + pd.Timedelta(hours=16)
+        reg_start   = session_start.replace(hour=22, minute=30)
+        reg_end     = (session_start + pd.Timedelta(days=1)).replace(hour=5, minute=0, second=0, microsecond=0)
+
+        df_plot = df_plot[(df_plot.index >= session_start) & (df_plot.index <= session_end)]
+
+        if not df_plot.empty:
+            df_reg = df_plot[(df_plot.index >= reg_start) & (df_plot.index <= reg_end)]
+
+            fig_spark.add_trace(go.Scatter(
+                x=df_plot.index, y=df_plot['Close'],
+                mode='lines', line=dict(color='#cfd8dc', width=1.5, dash='dot'),
+                hoverinfo='skip'
+            ))
+
+            if not df_reg.empty:
+                day_open_val = df_reg['Open'].iloc[0]
+                day_close_val = df_reg['Close'].iloc[-1]
+                line_color  = COLOR_UP if day_close_val >= day_open_val else COLOR_DOWN
+                fill_color  = 'rgba(5, 154, 129, 0.2)' if day_close_val >= day_open_val else 'rgba(242, 54, 69, 0.2)'
+
+                fig_spark.add_trace(go.Scatter(
+                    x=df_reg.index, y=df_reg['Close'],
+                    mode='lines', line=dict(color=line_color, width=2),
+                    fill='tozeroy', fillcolor=fill_color, hoverinfo='skip'
+                ))
+                if 'VWAP' in df_reg.columns:
+                    fig_spark.add_trace(go.Scatter(
+                        x=df_reg.index, y=df_reg['VWAP'],
+                        mode='lines', line=dict(color=COLOR_VWAP, width=1.5),
+                        name='VWAP', hoverinfo='skip'
+                    ))
+
+            if '.TW' not in ticker:
+                # [修正] 動態判斷夏/冬令時間
+                tz_ny = pytz.timezone('America/New_York')
+                now_ny = datetime.now(tz_ny)
+                is_dst = bool(now_ny.dst())
+                open_str  = '21:30' if is_dst else '22:30'
+                close_str = '04:00' if is_dst else '05:00'
+
+                tick_vals  = [session_start, reg_start, reg_end, session_end]
+                tick_texts = [
+                    '17:00<br><span style="font-size:9px;color:gray">盤前</span>',
+                    f'🔔{open_str}<br><span style="font-size:9px;color:gray">開盤</span>',
+                    f'🌙{close_str}<br><span style="font-size:9px;color:gray">收盤</span>',
+                    '09:00<br><span style="font-size:9px;color:gray">結算</span>'
+                ]
+                x_range = [session_start, session_end]
+            else:
+                tick_vals = tick_texts = None
+                x_range   = None
+
+            y_min = df_plot['Low'].min()  * 0.999
+            y_max = df_plot['High'].max() * 1.001
+
+            fig_spark.update_layout(
+                height=110,
+                margin=dict(l=10, r=10, t=5, b=35),
+                xaxis=dict(
+                    visible=True, range=x_range, fixedrange=True,
+                    showgrid=False, showline=False, zeroline=False,
+                    tickmode='array', tickvals=tick_vals, ticktext=tick_texts,
+                    side='bottom', tickfont=dict(size=11)
+                ),
+                yaxis=dict(visible=False, range=[y_min, y_max], fixedrange=True),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                showlegend=False, dragmode=False
+            )
+
+    st.markdown(get_price_card_html(
+        regular_price, reg_change, reg_pct,
+        is_extended, ext_price, ext_pct, ext_label,
+        day_high_pct, day_low_pct
+    ), unsafe_allow_html=True)
+
+    if not df_intra.empty:
+        # 走勢迷你圖：靜態，不攔截觸控
+        st.markdown('<div class="spark-chart-wrapper">', unsafe_allow_html=True)
+        record_payload('走勢迷你圖', compact_figure(fig_spark))
+        st.plotly_chart(fig_spark, use_container_width=True,
+                        config=get_mobile_chart_config(allow_zoom=False))
+        st.markdown('</div>', unsafe_allow_html=True)
+
+    # [修正] 更新報價只清掉這檔的報價 / 分K快取並重跑本 fragment，不再清 stored_ticker 觸發整頁重抓
+    st.button('🔄 更新報價', key='price_card_refresh', on_click=fetch_intraday_data.clear, args=(ticker,))
+
+
+# ─────────────────────────────────────────────────────────────
+#  4. 計算機 Tab (Fragment)
 # ─────────────────────────────────────────────────────────────
 @st.fragment
-def render_calculator_tab(current_close_price, exchange_rate, quote_type):
+def render_calculator_tab(current_close_price, fx_quote, quote_type):
     st.markdown('#### 🧮 交易前規劃')
     fees = get_fees(quote_type)
     BUY_FIXED_FEE, BUY_RATE_FEE   = fees['buy_fixed'],  fees['buy_rate']
     SELL_FIXED_FEE, SELL_RATE_FEE = fees['sell_fixed'], fees['sell_rate']
 
     st.markdown(f'<div class="fee-badge">{fees["text"]}</div>', unsafe_allow_html=True)
-    st.info(f'💰 目前匯率參考：**1 USD ≈ {exchange_rate:.2f} TWD**')
+    # [修正] 匯率抓不到時明確告知，而非默默套用預設值
+    if fx_quote is None or fx_quote.last is None:
+        exchange_rate = FALLBACK_USDTWD
+        st.warning(f'⚠️ 無法取得即時匯率，暫以 **1 USD ≈ {exchange_rate:.2f} TWD** 試算')
+    else:
+        exchange_rate = fx_quote.last
+        if fx_quote.stale:
+            st.warning(f'⚠️ 匯率更新失敗，沿用 {fx_quote.as_of:%Y-%m-%d %H:%M} 的 **1 USD ≈ {exchange_rate:.2f} TWD**')
+        else:
+            st.info(f'💰 目前匯率參考：**1 USD ≈ {exchange_rate:.2f} TWD**')
 
     # [手機優化] 預算試算
     st.markdown('<div class="calc-header">💰 預算試算 (我有多少錢?)</div>', unsafe_allow_html=True)
     bc1, bc2 = st.columns(2)
     with bc1:
-        budget_twd = st.number_input('台幣預算 (TWD)', value=100000, step=1000, key='budget_input')
+        budget_twd = st.number_input('台幣預算 (TWD)', value=100000, step=1000, key='budget_input', persist_state='session')
     with bc2:
         if 'buy_price_input' not in st.session_state:
             st.session_state.buy_price_input = float(current_close_price)
-        buy_price_input = st.number_input('預計買入價 (USD)', key='buy_price_input', step=0.1, format='%.2f')
+        buy_price_input = st.number_input('預計買入價 (USD)', key='buy_price_input', persist_state='session', step=0.1, format='%.2f')
 
     usd_budget = budget_twd / exchange_rate
     max_shares = (usd_budget - BUY_FIXED_FEE) / (buy_price_input * (1 + BUY_RATE_FEE)) if usd_budget > BUY_FIXED_FEE else 0
@@ -481,11 +743,11 @@ def render_calculator_tab(current_close_price, exchange_rate, quote_type):
     st.markdown('<div class="calc-header">⚖️ 賣出試算 (獲利預估)</div>', unsafe_allow_html=True)
     c_input1, c_input2 = st.columns(2)
     with c_input1:
-        shares_held = st.number_input('持有股數', value=10.0, step=1.0, key='hold_shares_input')
+        shares_held = st.number_input('持有股數', value=10.0, step=1.0, key='hold_shares_input', persist_state='session')
     with c_input2:
         if 'cost_price_input' not in st.session_state:
             st.session_state.cost_price_input = float(current_close_price)
-        cost_price = st.number_input('買入成本 (USD)', key='cost_price_input', step=0.1, format='%.2f')
+        cost_price = st.number_input('買入成本 (USD)', key='cost_price_input', persist_state='session', step=0.1, format='%.2f')
 
     real_buy_cost_usd  = (cost_price * shares_held * (1 + BUY_RATE_FEE)) + BUY_FIXED_FEE
     breakeven_price    = (real_buy_cost_usd + SELL_FIXED_FEE) / (shares_held * (1 - SELL_RATE_FEE))
@@ -495,11 +757,11 @@ def render_calculator_tab(current_close_price, exchange_rate, quote_type):
     calc_mode = st.radio(
         '選擇試算目標：',
         ['🎯 設定【目標獲利】反推股價', '💵 設定【賣出價格】計算獲利'],
-        horizontal=True, key='calc_mode_radio'
+        horizontal=True, key='calc_mode_radio', persist_state='session'
     )
 
     if calc_mode == '🎯 設定【目標獲利】反推股價':
-        target_profit_twd  = st.number_input('我想賺多少台幣 (TWD)?', value=3000, step=500, key='target_profit_input')
+        target_profit_twd  = st.number_input('我想賺多少台幣 (TWD)?', value=3000, step=500, key='target_profit_input', persist_state='session')
         target_sell_price  = ((target_profit_twd / exchange_rate) + real_buy_cost_usd + SELL_FIXED_FEE) / (shares_held * (1 - SELL_RATE_FEE))
         pct_need = ((target_sell_price / cost_price) - 1) * 100 if cost_price > 0 else 0
         st.markdown(f"""
@@ -511,7 +773,7 @@ def render_calculator_tab(current_close_price, exchange_rate, quote_type):
     else:
         if 'target_sell_input' not in st.session_state:
             st.session_state.target_sell_input = float(cost_price) * 1.05
-        target_sell_input = st.number_input('預計賣出價格 (USD)', key='target_sell_input', step=0.1, format='%.2f')
+        target_sell_input = st.number_input('預計賣出價格 (USD)', key='target_sell_input', persist_state='session', step=0.1, format='%.2f')
         net_profit_twd    = ((target_sell_input * shares_held * (1 - SELL_RATE_FEE)) - SELL_FIXED_FEE - real_buy_cost_usd) * exchange_rate
         res_class = 'txt-up-vip' if net_profit_twd >= 0 else 'txt-down-vip'
         res_prefix = '+' if net_profit_twd >= 0 else ''
@@ -526,7 +788,7 @@ def render_calculator_tab(current_close_price, exchange_rate, quote_type):
 
 
 # ─────────────────────────────────────────────────────────────
-#  4. 庫存管理 Tab (Fragment)
+#  5. 庫存管理 Tab (Fragment)
 # ─────────────────────────────────────────────────────────────
 @st.fragment
 def render_inventory_tab(current_close_price, quote_type):
@@ -539,16 +801,16 @@ def render_inventory_tab(current_close_price, quote_type):
     ic1, ic2 = st.columns(2)
     with ic1:
         st.caption('📍 目前持倉')
-        curr_shares = st.number_input('目前股數', value=100.0, key='inv_curr_shares')
+        curr_shares = st.number_input('目前股數', value=100.0, key='inv_curr_shares', persist_state='session')
         if 'inv_curr_avg' not in st.session_state:
             st.session_state.inv_curr_avg = float(current_close_price) * 1.1
-        curr_avg_price = st.number_input('平均成交價 (USD)', key='inv_curr_avg', step=0.1, format='%.2f')
+        curr_avg_price = st.number_input('平均成交價 (USD)', key='inv_curr_avg', persist_state='session', step=0.1, format='%.2f')
     with ic2:
         st.caption('➕ 預計加碼')
-        new_shares = st.number_input('加碼股數', value=50.0, key='inv_new_shares')
+        new_shares = st.number_input('加碼股數', value=50.0, key='inv_new_shares', persist_state='session')
         if 'inv_new_price' not in st.session_state:
             st.session_state.inv_new_price = float(current_close_price)
-        new_buy_price = st.number_input('加碼單價 (USD)', key='inv_new_price', step=0.1, format='%.2f')
+        new_buy_price = st.number_input('加碼單價 (USD)', key='inv_new_price', persist_state='session', step=0.1, format='%.2f')
 
     st.markdown('---')
     total_shares      = curr_shares + new_shares
@@ -586,76 +848,355 @@ def render_inventory_tab(current_close_price, quote_type):
 
 
 # ─────────────────────────────────────────────────────────────
-#  5. 主程式邏輯
+#  5-1. 全市場選股 Tab (Fragment)
+# ─────────────────────────────────────────────────────────────
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def load_screener_table(tickers, fast, slow):
+    """[新增] 多檔日K矩陣 → 批次指標 → 套用摘要規則，整張表一起快取"""
+    bars = plan_lookback(ma_list=[fast, slow], chart_days=0)
+    tickers, _, values = universe_indicators(
+        fetch_universe_history(tickers, bars),
+        make_spec(ma=[fast, slow]),
+    )
+    if not tickers:
+        return pd.DataFrame()
+    return screen_universe(tickers, values, fast, slow, sectors=TICKER_SECTOR)
+
+
+@st.fragment
+def render_screener_tab(fast, slow):
+    st.markdown('#### 🔎 全市場選股')
+    st.caption(f'以技術分析摘要的同一組規則 (MA{fast} / MA{slow}、RSI、MACD、量能、布林) 一次掃描整個清單')
+
+    custom = st.text_input('自訂清單 (逗號分隔，留空 = S&P 100 板塊清單)', key='screener_custom', persist_state='session')
+    tickers = [t.strip().upper() for t in custom.split(',') if t.strip()] if custom else get_universe_tickers()
+
+    with st.spinner('掃描中...'):
+        table = load_screener_table(tuple(dict.fromkeys(tickers)), fast, slow)
+    if table.empty:
+        st.warning('無法取得選股數據')
+        return
+
+    f1, f2, f3 = st.columns(3)
+    with f1:
+        trends = st.multiselect('趨勢', ['多頭', '盤整', '空頭'], default=['多頭'], key='screener_trend', persist_state='session')
+    with f2:
+        rsi_range = st.slider('RSI 區間', 0, 100, (0, 70), key='screener_rsi', persist_state='session')
+    with f3:
+        min_vol_ratio = st.number_input('量比 ≥ (量 / 20日均量)', value=0.0, step=0.5, key='screener_vol', persist_state='session')
+    f4, f5 = st.columns(2)
+    with f4:
+        macd_states = st.multiselect('MACD', ['多方', '空方'], default=['多方', '空方'], key='screener_macd', persist_state='session')
+    with f5:
+        sectors = st.multiselect('板塊', sorted(set(table['Sector']) - {''}), key='screener_sector', persist_state='session')
+
+    mask = (
+        table['趨勢'].isin(trends)
+        & table['RSI'].between(*rsi_range)
+        & (table['量比'] >= min_vol_ratio)
+        & table['MACD'].isin(macd_states)
+    )
+    if sectors:
+        mask &= table['Sector'].isin(sectors)
+    result = table[mask].sort_values('量比', ascending=False)
+
+    st.caption(f'符合條件 {len(result)} / {len(table)} 檔 (點欄位標題可排序)')
+    st.dataframe(
+        result,
+        use_container_width=True,
+        column_config={
+            'Close': st.column_config.NumberColumn(format='%.2f'),
+            'Change %': st.column_config.NumberColumn(format='%+.2f%%'),
+            'RSI': st.column_config.NumberColumn(format='%.1f'),
+            '量比': st.column_config.NumberColumn(format='%.2f×'),
+            'BB_Width': st.column_config.NumberColumn(format='%.3f'),
+        },
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+#  5-2. 策略回測 Tab (Fragment)
+# ─────────────────────────────────────────────────────────────
+BACKTEST_PERIODS = {'1 年': 1, '2 年': 2, '5 年': 5}
+
+
+@st.fragment
+def render_backtest_tab(ticker, fast, slow, quote_type, fx_quote):
+    st.markdown(f'#### 🧪 策略回測：MA{fast} / MA{slow} 交叉')
+    fees = get_fees(quote_type)
+    exchange_rate = fx_quote.last if fx_quote is not None and fx_quote.last is not None else FALLBACK_USDTWD
+    st.caption(f"{fees['text']}｜快線站上慢線隔日收盤買進、跌破隔日收盤賣出｜匯率 1 USD ≈ {exchange_rate:.2f} TWD")
+
+    b1, b2 = st.columns(2)
+    with b1:
+        period = st.selectbox('回測區間', list(BACKTEST_PERIODS), index=1, key='bt_period', persist_state='session')
+    with b2:
+        initial_twd = st.number_input('初始資金 (TWD)', value=100000, step=10000, key='bt_capital', persist_state='session')
+
+    # [新增] 直接讀日K快取 (歷史庫不足時會自動往前補抓)
+    bars = BACKTEST_PERIODS[period] * 252 + max(fast, slow)
+    df_bt = fetch_daily_history(ticker, bars)
+    if df_bt is None or len(df_bt) <= max(fast, slow) + 1:
+        st.warning('歷史資料不足，無法回測')
+        return
+
+    result = backtest_ma_cross(df_bt, fast, slow, quote_type, initial_twd, exchange_rate)
+    stats = result['stats']
+
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric('總報酬', f"{stats['total_return']:+.1%}", f"買進持有 {stats['buy_hold_return']:+.1%}", delta_color='off')
+    k2.metric('年化報酬 (CAGR)', f"{stats['cagr']:+.1%}")
+    k3.metric('最大回撤', f"{stats['max_drawdown']:.1%}")
+    k4.metric('Sharpe', f"{stats['sharpe']:.2f}")
+    k5, k6, k7, k8 = st.columns(4)
+    k5.metric('勝率', f"{stats['win_rate']:.0%}" if stats['trades'] else 'N/A', f"{stats['trades']} 筆", delta_color='off')
+    k6.metric('年化周轉率', f"{stats['turnover']:.1f}×")
+    k7.metric('持倉時間', f"{stats['exposure']:.0%}")
+    k8.metric('手續費合計', f"NT${stats['fees_twd']:,.0f}")
+
+    curve = result['equity']
+    fig_bt = go.Figure()
+    fig_bt.add_trace(go.Scatter(x=curve.index, y=curve['策略'], name='策略', line=dict(color='#2962FF', width=1.6)))
+    fig_bt.add_trace(go.Scatter(x=curve.index, y=curve['買進持有'], name='買進持有', line=dict(color='#adb5bd', width=1.2)))
+    fig_bt.update_layout(
+        height=get_responsive_height(360), template='plotly_white', margin=dict(l=5, r=5, t=10, b=8),
+        hovermode='x unified', yaxis_title='權益 (TWD)',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+    )
+    record_payload('回測權益', compact_figure(fig_bt))
+    st.plotly_chart(fig_bt, use_container_width=True, config=get_mobile_chart_config(allow_zoom=True))
+
+    with st.expander(f"交易明細 ({len(result['trades'])} 筆)", expanded=False):
+        st.dataframe(result['trades'], use_container_width=True, hide_index=True)
+
+
+# ─────────────────────────────────────────────────────────────
+#  5-3. 快慢線參數掃描 (Fragment，掃描中定期重繪)
+# ─────────────────────────────────────────────────────────────
+SWEEP_POLL_SECONDS = 1
+SWEEP_METRICS = {'Sharpe': 'sharpe', '總報酬': 'return', '最大回撤': 'max_drawdown'}
+
+
+def render_sweep_panel(ticker, quote_type, fx_quote):
+    st.markdown('#### 🔧 快慢線參數掃描')
+    sc1, sc2 = st.columns(2)
+    with sc1:
+        scope = st.radio('掃描範圍', [f'目前個股 ({ticker})', '全市場 (S&P 100 平均)'], horizontal=True, key='sweep_scope', persist_state='session')
+        fast_range = st.slider('快線範圍', 2, 60, (3, 30), key='sweep_fast', persist_state='session')
+    with sc2:
+        metric_label = st.selectbox('熱力圖指標', list(SWEEP_METRICS), key='sweep_metric', persist_state='session')
+        slow_range = st.slider('慢線範圍', 5, 250, (10, 120), step=5, key='sweep_slow', persist_state='session')
+
+    job = st.session_state.get('sweep_job')
+    if st.button('▶️ 開始掃描', disabled=job is not None and job.running, key='sweep_start'):
+        period_years = BACKTEST_PERIODS[st.session_state.get('bt_period', '2 年')]
+        bars = period_years * 252 + slow_range[1]
+        if scope.startswith('全市場'):
+            closes = fetch_universe_history(tuple(get_universe_tickers()), bars)['Close']
+            closes = {t: closes[t].to_numpy() for t in closes.columns}
+        else:
+            closes = {ticker: fetch_daily_history(ticker, bars)['Close'].to_numpy()}
+        exchange_rate = fx_quote.last if fx_quote is not None and fx_quote.last is not None else FALLBACK_USDTWD
+        initial_usd = st.session_state.get('bt_capital', 100000) / exchange_rate
+        # [新增] 背景執行 (多檔時用執行緒池)，此區塊定期讀取部分結果
+        st.session_state.sweep_job = SweepJob(
+            closes, range(fast_range[0], fast_range[1] + 1), range(slow_range[0], slow_range[1] + 1, 5),
+            get_fees(quote_type), initial_usd,
+        ).start()
+        st.rerun()
+
+    if job is None:
+        st.caption('設定範圍後按「開始掃描」；結果會隨各批次完成逐步更新。')
+        return
+
+    snap = job.snapshot()
+    st.progress(snap['done'] / max(snap['total'], 1),
+                text=f"已完成 {snap['done']} / {snap['total']} 檔，{job.fast.size} 組參數"
+                     + (f"，耗時 {job.finished_at - job.started_at:.1f}s" if not job.running else ''))
+    if job.error is not None:
+        st.error(f'掃描失敗：{job.error}')
+    if snap['done']:
+        z = snap['grid'][SWEEP_METRICS[metric_label]]
+        fig_sweep = go.Figure(go.Heatmap(
+            z=z, x=job.slow_range, y=job.fast_range, colorscale='RdYlGn', zmid=0 if metric_label != '最大回撤' else None,
+            hovertemplate='快線 %{y} / 慢線 %{x}<br>' + metric_label + ' %{z:.2f}<extra></extra>',
+        ))
+        fig_sweep.update_layout(
+            height=get_responsive_height(420), template='plotly_white', margin=dict(l=5, r=5, t=10, b=8),
+            xaxis_title='慢線 (Slow)', yaxis_title='快線 (Fast)',
+        )
+        st.plotly_chart(fig_sweep, use_container_width=True, config=get_mobile_chart_config(allow_zoom=False))
+        best = job.best(SWEEP_METRICS[metric_label])
+        if best:
+            st.caption(f'🏆 目前最佳：快線 {best[0]} / 慢線 {best[1]} ({metric_label} {best[2]:.2f})')
+
+    # 掃描結束：整頁重跑一次，停止定期重繪
+    if not job.running and st.session_state.get('sweep_polling'):
+        st.session_state.sweep_polling = False
+        st.rerun()
+
+
+# ─────────────────────────────────────────────────────────────
+#  5-4. 組合回測 (Fragment)
+# ─────────────────────────────────────────────────────────────
+@st.fragment
+def render_portfolio_panel(ticker, fast, slow, fx_quote):
+    st.markdown('#### 🧺 組合回測 (共用資金 + 定期再平衡)')
+    pc1, pc2 = st.columns(2)
+    with pc1:
+        basket = st.selectbox('股票籃', ['全部 (S&P 100)'] + list(SECTOR_TICKERS) + ['自訂清單'], key='pf_basket', persist_state='session')
+        if basket == '自訂清單':
+            custom = st.text_input('代號 (逗號分隔)', ticker, key='pf_custom', persist_state='session')
+            tickers = list(dict.fromkeys(t.strip().upper() for t in custom.split(',') if t.strip()))
+        else:
+            tickers = get_universe_tickers(None if basket.startswith('全部') else basket)
+        rule = st.radio('持有規則', list(PORTFOLIO_RULES), format_func=PORTFOLIO_RULES.get, horizontal=True, key='pf_rule', persist_state='session')
+    with pc2:
+        freq_label = st.selectbox('再平衡頻率', list(REBALANCE_FREQ), index=1, key='pf_freq', persist_state='session')
+        sizing = st.radio('部位配置', ['equal', 'inverse_vol'],
+                          format_func={'equal': '等權重', 'inverse_vol': '波動度倒數'}.get, horizontal=True, key='pf_sizing', persist_state='session')
+        max_weight_pct = st.number_input('單檔權重上限 % (0 = 不限)', value=0, min_value=0, max_value=100, step=5, key='pf_max_weight', persist_state='session')
+
+    if not tickers:
+        st.info('請輸入至少一個代號')
+        return
+
+    period_years = BACKTEST_PERIODS[st.session_state.get('bt_period', '2 年')]
+    matrices = fetch_universe_history(tuple(tickers), period_years * 252 + slow)
+    close = matrices['Close']
+    if close.empty:
+        st.warning('無法取得組合數據')
+        return
+
+    exchange_rate = fx_quote.last if fx_quote is not None and fx_quote.last is not None else FALLBACK_USDTWD
+    initial_twd = st.session_state.get('bt_capital', 100000)
+    kwargs = dict(fast=fast, slow=slow, freq=REBALANCE_FREQ[freq_label], sizing=sizing,
+                  max_weight=max_weight_pct / 100 or None, initial_twd=initial_twd, fx_rate=exchange_rate)
+    result = backtest_portfolio(close, rule=rule, **kwargs)
+    baseline = backtest_portfolio(close, rule='hold_all', **kwargs)
+    stats = result['stats']
+
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric('總報酬', f"{stats['total_return']:+.1%}", f"等權基準 {baseline['stats']['total_return']:+.1%}", delta_color='off')
+    k2.metric('年化報酬 (CAGR)', f"{stats['cagr']:+.1%}")
+    k3.metric('最大回撤', f"{stats['max_drawdown']:.1%}")
+    k4.metric('Sharpe', f"{stats['sharpe']:.2f}")
+    k5, k6, k7, k8 = st.columns(4)
+    k5.metric('平均持股', f"{stats['avg_holdings']:.1f} / {close.shape[1]} 檔")
+    k6.metric('年化周轉率', f"{stats['turnover']:.1f}×")
+    k7.metric('交易筆數', f"{stats['trades']:,}", f"再平衡 {stats['rebalances']} 次", delta_color='off')
+    k8.metric('手續費合計', f"NT${stats['fees_twd']:,.0f}")
+
+    fig_pf = go.Figure()
+    fig_pf.add_trace(go.Scatter(x=result['equity'].index, y=result['equity'], name=PORTFOLIO_RULES[rule],
+                                line=dict(color='#2962FF', width=1.6)))
+    if rule != 'hold_all':
+        fig_pf.add_trace(go.Scatter(x=baseline['equity'].index, y=baseline['equity'], name='等權基準',
+                                    line=dict(color='#adb5bd', width=1.2)))
+    fig_pf.update_layout(
+        height=get_responsive_height(360), template='plotly_white', margin=dict(l=5, r=5, t=10, b=8),
+        hovermode='x unified', yaxis_title='權益 (TWD)',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+    )
+    record_payload('組合權益', compact_figure(fig_pf))
+    st.plotly_chart(fig_pf, use_container_width=True, config=get_mobile_chart_config(allow_zoom=True))
+
+    last_weights = result['weights'].iloc[-1]
+    last_weights = last_weights[last_weights > 0].sort_values(ascending=False)
+    with st.expander(f'最新一次再平衡持股 ({len(last_weights)} 檔)', expanded=False):
+        st.dataframe(last_weights.rename('權重').to_frame().style.format('{:.1%}'), use_container_width=True)
+
+
+# ─────────────────────────────────────────────────────────────
+#  6. 主程式邏輯
 # ─────────────────────────────────────────────────────────────
 if ticker_input:
     try:
-        if 'stored_ticker' not in st.session_state or st.session_state.stored_ticker != ticker_input:
+        ticker_changed = 'stored_ticker' not in st.session_state or st.session_state.stored_ticker != ticker_input
+        if ticker_changed:
+            # 換股票時回到預設區間，不沿用上一檔補抓的長歷史
+            st.session_state.pop('chart_history_days', None)
+        # [新增] 依目前指標 / 圖表天數規劃需要的日K長度，只抓這麼多
+        lookback_bars = plan_lookback(
+            ma_list=DEFAULT_MA_LIST + [strat_fast, strat_slow],
+            chart_days=st.session_state.get('chart_history_days', DEFAULT_CHART_DAYS)
+        )
+        # [修正] 超過日K快取的 TTL 就重新取得 bundle (否則 session 會一直沿用第一次載入的那份)
+        data_expired = time.time() - st.session_state.get('data_loaded_at', 0) > DAILY_TTL
+        if ticker_changed or data_expired or st.session_state.get('data_bars', 0) < lookback_bars:
             with st.spinner(f'正在抓取 {ticker_input} 數據...'):
-                df, df_intra, info, quote_type = fetch_stock_data_now(ticker_input)
-                exchange_rate = fetch_exchange_rate_now()
-                st.session_state.update(
-                    stored_ticker=ticker_input,
-                    data_df=df, data_df_intra=df_intra,
-                    data_info=info, data_quote_type=quote_type,
-                    data_exchange_rate=exchange_rate
-                )
-                for k in ['buy_price_input', 'cost_price_input', 'target_sell_input', 'inv_curr_avg', 'inv_new_price']:
-                    if k in st.session_state: del st.session_state[k]
-
-        df, df_intra, info = st.session_state.data_df, st.session_state.data_df_intra, st.session_state.data_info
-        quote_type, exchange_rate = st.session_state.data_quote_type, st.session_state.data_exchange_rate
+                # [新增] session 只存 key，資料本體放在共用 store
+                data_key, _ = load_stock_bundle(ticker_input, lookback_bars)
+                st.session_state.update(stored_ticker=ticker_input, data_key=data_key, data_bars=lookback_bars,
+                                        data_loaded_at=time.time())
+                if ticker_changed:
+                    for k in ['buy_price_input', 'cost_price_input', 'target_sell_input', 'inv_curr_avg', 'inv_new_price']:
+                        if k in st.session_state: del st.session_state[k]
+
+        data_key, bundle = get_stock_bundle(st.session_state.data_key, st.session_state.data_bars)
+        st.session_state.data_key = data_key
+        df, info, quote_type = bundle['df'], bundle['info'], bundle['quote_type']
+
+        # [新增] 宏觀指標 + 匯率 + 自訂代號：每個更新週期一次批次下載
+        # [修正] 延到真正用到時 (宏觀指標展開 / 計算機 / 回測分頁) 才呼叫，同一週期內共用快取
+        quote_symbols = get_quote_symbols(extra_symbols)
 
         if not df.empty and len(df) > 200:
             if strategy_mode == '🤖 自動判別 (Auto)':
                 strat_fast, strat_slow = (10, 20) if info.get('marketCap', 0) > 200_000_000_000 else (5, 10)
                 strat_desc = '🐘 巨頭穩健' if info.get('marketCap', 0) > 200_000_000_000 else '🚀 小型飆股'
 
-            df = calculate_ma(df)
-            if 'MA_10' not in df.columns:
-                df['MA_10'] = df['Close'].rolling(window=10).mean()
-            df = calculate_bollinger(df)
+            # [新增] 所有指標一次算完 (回傳新 DataFrame，不動共用資料)
+            indicator_spec = make_spec(ma=DEFAULT_MA_LIST + [strat_fast, strat_slow])
+            # [新增] 同一份資料 + 同一組 spec 直接取快取 (拉滑桿等不改資料的重跑不再重算)
+            df = cached_indicators(ticker_input, df, indicator_spec)
 
             last  = df.iloc[-1]
             prev  = df.iloc[-2]
             current_close_price = last['Close']
             strat_fast_val, strat_slow_val = get_strategy_values(df, strat_fast, strat_slow)
 
+            # [新增] 延遲載入：收合的區塊 / 未選取的分頁不執行內容 (on_change='rerun' 讓 .open 反映目前狀態)
             # --- 宏觀數據 ---
-            macro_data = get_macro_data()
-            if macro_data:
-                st.markdown('#### 🌍 全球宏觀指標')
-                m1, m2, m3, m4 = st.columns(4)
-                vix  = macro_data.get('VIX',  (0, 0))
-                gold = macro_data.get('Gold', (0, 0))
-                oil  = macro_data.get('Oil',  (0, 0))
-                btc  = macro_data.get('BTC',  (0, 0))
-                m1.metric('VIX 恐慌指數', f'{vix[0]:.2f}',      f'{vix[1]:.2f}%',  delta_color='inverse')
-                m2.metric('黃金 (Gold)',   f'${gold[0]:,.1f}',   f'{gold[1]:.2f}%')
-                m3.metric('原油 (WTI)',    f'${oil[0]:.2f}',     f'{oil[1]:.2f}%')
-                m4.metric('Bitcoin',       f'${btc[0]:,.0f}',    f'{btc[1]:.2f}%')
-            st.divider()
+            macro_panel = st.expander('🌍 全球宏觀指標', expanded=True, key='panel_macro', on_change='rerun')
+            if macro_panel.open:
+                with macro_panel:
+                    quotes = fetch_quote_snapshot(quote_symbols)
+                    m1, m2, m3, m4 = st.columns(4)
+                    render_quote_metric(m1, 'VIX 恐慌指數', quotes.get(MACRO_SYMBOLS['VIX']),  '{:.2f}', delta_color='inverse')
+                    render_quote_metric(m2, '黃金 (Gold)',   quotes.get(MACRO_SYMBOLS['Gold']), '${:,.1f}')
+                    render_quote_metric(m3, '原油 (WTI)',    quotes.get(MACRO_SYMBOLS['Oil']),  '${:.2f}')
+                    render_quote_metric(m4, 'Bitcoin',       quotes.get(MACRO_SYMBOLS['BTC']),  '${:,.0f}')
+                    if extra_symbols:
+                        extra_cols = st.columns(min(len(extra_symbols), 4))
+                        for i, sym in enumerate(extra_symbols):
+                            render_quote_metric(extra_cols[i % len(extra_cols)], sym, quotes.get(sym), '{:,.2f}')
 
             # --- 熱力圖 ---
-            with st.expander('🗺️ 點擊展開：市場板塊熱力圖 (Sector Heatmap)', expanded=False):
-                target_sector = info.get('sector', 'Unknown')
-                sector_mapping = {
-                    'Technology': 'Technology', 'Financial Services': 'Financial',
-                    'Communication Services': 'Communication', 'Consumer Cyclical': 'Consumer Cyclical',
-                    'Consumer Defensive': 'Consumer Defensive', 'Healthcare': 'Healthcare',
-                    'Energy': 'Energy', 'Industrials': 'Industrials',
-                    'Utilities': 'Utilities', 'Real Estate': 'Real Estate'
-                }
-                detected_sector = sector_mapping.get(target_sector, None)
-                if detected_sector:
-                    st.caption(f'🎯 偵測到 {ticker_input} 屬於 **{detected_sector}** 板塊，已自動聚焦。')
-
-                col_map_ctrl, _ = st.columns([0.4, 0.6])
-                with col_map_ctrl:
-                    use_equal = st.checkbox('⊞ 切換為「等權重」模式', value=False)
-
-                with st.spinner('正在掃描全市場數據...'):
-                    fig_map = plot_market_map_v2(detected_sector, use_equal_weight=use_equal)
+            heatmap_panel = st.expander('🗺️ 點擊展開：市場板塊熱力圖 (Sector Heatmap)', expanded=False,
+                                        key='panel_heatmap', on_change='rerun')
+            if heatmap_panel.open:
+                with heatmap_panel:
+                    target_sector = info.get('sector', 'Unknown')
+                    sector_mapping = {
+                        'Technology': 'Technology', 'Financial Services': 'Financial',
+                        'Communication Services': 'Communication', 'Consumer Cyclical': 'Consumer Cyclical',
+                        'Consumer Defensive': 'Consumer Defensive', 'Healthcare': 'Healthcare',
+                        'Energy': 'Energy', 'Industrials': 'Industrials',
+                        'Utilities': 'Utilities', 'Real Estate': 'Real Estate'
+                    }
+                    detected_sector = sector_mapping.get(target_sector, None)
+                    if detected_sector:
+                        st.caption(f'🎯 偵測到 {ticker_input} 屬於 **{detected_sector}** 板塊，已自動聚焦。')
+
+                    col_map_ctrl, _ = st.columns([0.4, 0.6])
+                    with col_map_ctrl:
+                        use_equal = st.checkbox('⊞ 切換為「等權重」模式', value=False, key='heatmap_equal', persist_state='session')
+
+                    # [新增] 熱力圖讀背景快照，不在此等待網路
+                    snapshot_service = get_snapshot_service()
+                    _, snap_version, snap_updated = snapshot_service.get()
+                    fig_map = plot_market_map_v2(detected_sector, use_equal_weight=use_equal, snapshot_version=snap_version)
                     if fig_map:
                         # [手機優化] 熱力圖允許拖拉
                         st.plotly_chart(
@@ -663,269 +1204,206 @@ if ticker_input:
                             use_container_width=True,
                             config=get_mobile_chart_config(allow_zoom=True)
                         )
+                        st.caption(f"資料時間：{datetime.fromtimestamp(snap_updated).strftime('%H:%M:%S')}"
+                                   + (' (背景更新中…)' if snapshot_service.is_refreshing else ''))
+                    elif snapshot_service.is_refreshing:
+                        st.info('⏳ 全市場數據背景載入中，稍後重新整理即可顯示')
                     else:
                         st.warning('無法取得熱力圖數據')
 
+            # --- 相關性矩陣 ---
+            corr_panel = st.expander('🔗 點擊展開：相關性矩陣 & Beta (Correlation)', expanded=False,
+                                     key='panel_corr', on_change='rerun')
+            if corr_panel.open:
+                with corr_panel:
+                    # 收合時保留選擇 (下方「走勢最相近」也讀這個值)
+                    corr_window = st.selectbox('計算視窗 (交易日)', CORR_WINDOWS, index=1, key='corr_window', persist_state='session')
+                    corr_view = load_correlation_view(corr_window, str(df.index[-1].date()))
+                    if corr_view['corr'].empty:
+                        st.warning('無法取得相關性數據')
+                    else:
+                        st.caption(f'近 {corr_window} 個交易日的日報酬相關係數，依階層式分群排序 (同色塊 = 走勢相近的族群)')
+                        st.plotly_chart(plot_correlation_heatmap(corr_view['corr']), use_container_width=True,
+                                        config=get_mobile_chart_config(allow_zoom=True))
+                        beta_table = corr_view['beta'].assign(Sector=lambda d: d.index.map(TICKER_SECTOR))
+                        if 'Beta' in beta_table.columns:
+                            st.dataframe(beta_table.sort_values('Beta', ascending=False), use_container_width=True,
+                                         column_config={'Beta': st.column_config.NumberColumn(format='%.2f'),
+                                                        f'與 {BENCHMARK} 相關': st.column_config.NumberColumn(format='%.2f')})
+
             st.markdown('---')
 
-            tab_analysis, tab_calc, tab_inv = st.tabs(['📊 技術分析', '🧮 交易計算', '📦 庫存管理'])
+            # 只執行目前選取的分頁 (切換分頁會重跑，但其餘分頁不再每次都算)
+            tab_analysis, tab_calc, tab_inv, tab_backtest, tab_screener = st.tabs(
+                ['📊 技術分析', '🧮 交易計算', '📦 庫存管理', '🧪 回測', '🔎 選股'], key='main_tabs', on_change='rerun')
 
             # ── 技術分析 Tab ──────────────────────────────────────
-            with tab_analysis:
-                if not df_intra.empty:
-                    # [修正] VWAP 對分鐘線計算才有意義
-                    df_intra = df_intra.copy()
-                    df_intra['VWAP'] = (df_intra['Close'] * df_intra['Volume']).cumsum() / df_intra['Volume'].cumsum()
-
-                    df_intra.index = pd.to_datetime(df_intra.index)
-                    if '.TW' in ticker_input:
-                        tz_str = 'Asia/Taipei'
-                        open_time, close_time = time(9, 0), time(13, 30)
+            if tab_analysis.open:
+                with tab_analysis:
+                    st.markdown(f"### 📱 {info.get('longName', ticker_input)} ({ticker_input})")
+                    st.caption(f'目前策略：{strat_desc}')
+
+                    # ── 價格卡片 + 走勢迷你圖 ──
+                    c1, c2, c3, c4 = st.columns(4)
+                    with c1:
+                        # 即時模式：fragment 依間隔自動重跑 (只重繪報價卡與迷你圖)
+                        price_card_fragment = st.fragment(render_price_card, run_every=live_interval if live_mode else None)
+                        price_card_fragment(ticker_input, df.iloc[-2]['Close'], last['Close'], live_mode)
+
+                    with c2:
+                        st.markdown(get_metric_card_html('本益比 (P/E)', f"{info.get('trailingPE', 'N/A')}", '估值參考'), unsafe_allow_html=True)
+                    with c3:
+                        st.markdown(get_metric_card_html('EPS', f"{info.get('trailingEps', 'N/A')}", '獲利能力'), unsafe_allow_html=True)
+                    with c4:
+                        mcap  = info.get('marketCap', 0)
+                        m_str = f'{mcap/1_000_000_000:.1f}B' if mcap > 1_000_000_000 else f'{mcap/1_000_000:.1f}M'
+                        st.markdown(get_metric_card_html('市值', m_str, info.get('sector', 'N/A')), unsafe_allow_html=True)
+
+                    # ── 策略訊號 ──
+                    st.markdown('#### 🤖 策略訊號解讀 (Rule-Based)')
+                    ai_data = generate_ai_summary(ticker_input, last, strat_fast_val, strat_slow_val)
+                    k1, k2, k3, k4 = st.columns(4)
+                    with k1:
+                        st.markdown(f"""
+                        <div class="metric-card">
+                          <div class="metric-title">趨勢訊號</div>
+                          <div class="metric-value" style="font-size:1.2rem;">{ai_data['trend']['msg']}</div>
+                          <div><span class="status-badge {ai_data['trend']['bg']}">MA{strat_fast} vs MA{strat_slow}</span></div>
+                        </div>""", unsafe_allow_html=True)
+                    with k2:
+                        st.markdown(f"""
+                        <div class="metric-card">
+                          <div class="metric-title">量能判讀</div>
+                          <div class="metric-value" style="font-size:1.2rem;">{ai_data['vol']['msg']}</div>
+                          <div><span class="status-badge {ai_data['vol']['bg']}">{ai_data['vol']['val']:.1f} 倍均量</span></div>
+                        </div>""", unsafe_allow_html=True)
+                    with k3:
+                        st.markdown(f"""
+                        <div class="metric-card">
+                          <div class="metric-title">MACD 趨勢</div>
+                          <div class="metric-value" style="font-size:1.2rem;">{ai_data['macd']['msg']}</div>
+                          <div><span class="status-badge {ai_data['macd']['bg']}">{ai_data['macd']['val']:.2f}</span></div>
+                        </div>""", unsafe_allow_html=True)
+                    with k4:
+                        st.markdown(f"""
+                        <div class="metric-card">
+                          <div class="metric-title">RSI 強弱</div>
+                          <div class="metric-value" style="font-size:1.2rem;">{ai_data['rsi']['msg']}</div>
+                          <div><span class="status-badge {ai_data['rsi']['bg']}">{ai_data['rsi']['val']:.1f}</span></div>
+                        </div>""", unsafe_allow_html=True)
+
+                    # ── 均線監控 ──
+                    st.markdown('#### 📏 關鍵均線監控')
+                    ma_list = DEFAULT_MA_LIST
+                    ma_html = ''.join([
+                        f'<div class="ma-box">'
+                        f'<div class="ma-label">MA {d}</div>'
+                        f'<div class="ma-val {"txt-up-vip" if last.get(f"MA_{d}", 0) > prev.get(f"MA_{d}", 0) else "txt-down-vip"}">'
+                        f'{last.get(f"MA_{d}", 0):.2f} {"▲" if last.get(f"MA_{d}", 0) > prev.get(f"MA_{d}", 0) else "▼"}</div></div>'
+                        for d in ma_list
+                    ])
+                    st.markdown(f'<div class="ma-container">{ma_html}</div>', unsafe_allow_html=True)
+
+                    # ── 互動式主圖表 ──────────────────────────────────
+                    st.markdown('#### 📉 互動式技術分析 (Plotly)')
+
+                    # [手機優化] 在圖表上方顯示操作提示
+                    st.markdown(
+                        '<div class="mobile-chart-hint">👆 雙指縮放 | 單指拖拉 | 右上角工具列可截圖</div>',
+                        unsafe_allow_html=True
+                    )
+
+                    # [新增] 長期模式：完整歷史 (最多 10 年) 降採樣 + WebGL
+                    long_range = st.toggle('🔭 長期模式 (完整歷史)', key='chart_long_range')
+
+                    st.markdown('<div class="main-chart-wrapper">', unsafe_allow_html=True)
+                    if long_range:
+                        df_long = cached_indicators(ticker_input, fetch_daily_history(ticker_input, LONG_RANGE_BARS), indicator_spec)
+                        # Streamlit 收不到圖表的縮放事件，改以區間選擇重新取樣：區間越短細節越多
+                        months = df_long.index.tz_localize(None).to_period('M').unique()
+                        start_m, end_m = st.select_slider(
+                            '顯示區間', options=list(months), value=(months[0], months[-1]),
+                            format_func=lambda m: m.strftime('%Y-%m'), key='chart_long_window'
+                        )
+                        start, end = start_m.start_time.date(), end_m.end_time.date()
+                        data_version = (data_fingerprint(df_long), spec_hash(indicator_spec))
+                        st.plotly_chart(
+                            build_long_range_chart(ticker_input, data_version, str(start), str(end), CHART_POINTS, df_long),
+                            use_container_width=True,
+                            config=get_mobile_chart_config(allow_zoom=True)
+                        )
+                        mark_paint('主圖')
+                        st.markdown('</div>', unsafe_allow_html=True)
+                        st.caption(f'長期模式：每點為數根K棒的彙整 (K線取區間高低、均線 / MACD / RSI 以 LTTB 保留轉折)，'
+                                   '縮小顯示區間可看到更多細節')
                     else:
-                        tz_str = 'America/New_York'
-                        open_time, close_time = time(9, 30), time(16, 0)
-                    try:
-                        df_intra_tz = df_intra.tz_convert(tz_str)
-                    except:
-                        df_intra_tz = df_intra
-
-                    mask_reg_hl = (df_intra_tz.index.time >= open_time) & (df_intra_tz.index.time <= close_time)
-                    df_reg_hl = df_intra_tz[mask_reg_hl]
-                    day_high = df_reg_hl['High'].max() if not df_reg_hl.empty else df_intra_tz['High'].max()
-                    day_low  = df_reg_hl['Low'].min()  if not df_reg_hl.empty else df_intra_tz['Low'].min()
-
-                previous_close = info.get('previousClose', df.iloc[-2]['Close'])
-                regular_price  = info.get('currentPrice', info.get('regularMarketPrice', last['Close']))
-
-                is_extended, ext_price, ext_label = False, 0, ''
-                live_price = df_intra['Close'].iloc[-1] if not df_intra.empty else 0
-                if info.get('preMarketPrice'):
-                    ext_price, is_extended, ext_label = info['preMarketPrice'], True, '盤前'
-                elif info.get('postMarketPrice'):
-                    ext_price, is_extended, ext_label = info['postMarketPrice'], True, '盤後'
-                elif not df_intra.empty and abs(live_price - regular_price) / max(regular_price, 0.01) > 0.001:
-                    ext_price, is_extended, ext_label = live_price, True, '盤後/試撮'
-
-                reg_change  = regular_price - previous_close
-                reg_pct     = (reg_change / previous_close) * 100
-                ext_pct     = ((ext_price - regular_price) / regular_price) * 100 if is_extended else 0
-                day_high_pct = ((day_high - previous_close) / previous_close) * 100 if not df_intra.empty else 0
-                day_low_pct  = ((day_low  - previous_close) / previous_close) * 100 if not df_intra.empty else 0
-
-                st.markdown(f"### 📱 {info.get('longName', ticker_input)} ({ticker_input})")
-                st.caption(f'目前策略：{strat_desc}')
-
-                # ── 價格卡片 + 走勢迷你圖 ──
-                c1, c2, c3, c4 = st.columns(4)
-                with c1:
-                    fig_spark = go.Figure()
-
-                    if not df_intra.empty:
-                        tz_tw = pytz.timezone('Asia/Taipei')
-                        if df_intra.index.tz is None:
-                            df_plot = df_intra.tz_localize('UTC').tz_convert(tz_tw)
-                        else:
-                            df_plot = df_intra.tz_convert(tz_tw)
-
-                        last_dt = df_plot.index[-1]
-                        if last_dt.hour < 12:
-                            session_start = (last_dt - pd.Timedelta(days=1)).replace(hour=17, minute=0, second=0, microsecond=0)
-                        else:
-                            session_start = last_dt.replace(hour=17, minute=0, second=0, microsecond=0)
-                        session_end = session_start + pd.Timedelta(hours=16)
-                        reg_start   = session_start.replace(hour=22, minute=30)
-                        reg_end     = (session_start + pd.Timedelta(days=1)).replace(hour=5, minute=0, second=0, microsecond=0)
-
-                        df_plot = df_plot[(df_plot.index >= session_start) & (df_plot.index <= session_end)]
-
-                        if not df_plot.empty:
-                            df_reg = df_plot[(df_plot.index >= reg_start) & (df_plot.index <= reg_end)]
-
-                            fig_spark.add_trace(go.Scatter(
-                                x=df_plot.index, y=df_plot['Close'],
-                                mode='lines', line=dict(color='#cfd8dc', width=1.5, dash='dot'),
-                                hoverinfo='skip'
-                            ))
-
-                            if not df_reg.empty:
-                                day_open_val = df_reg['Open'].iloc[0]
-                                day_close_val = df_reg['Close'].iloc[-1]
-                                line_color  = COLOR_UP if day_close_val >= day_open_val else COLOR_DOWN
-                                fill_color  = 'rgba(5, 154, 129, 0.2)' if day_close_val >= day_open_val else 'rgba(242, 54, 69, 0.2)'
-
-                                fig_spark.add_trace(go.Scatter(
-                                    x=df_reg.index, y=df_reg['Close'],
-                                    mode='lines', line=dict(color=line_color, width=2),
-                                    fill='tozeroy', fillcolor=fill_color, hoverinfo='skip'
-                                ))
-                                if 'VWAP' in df_reg.columns:
-                                    fig_spark.add_trace(go.Scatter(
-                                        x=df_reg.index, y=df_reg['VWAP'],
-                                        mode='lines', line=dict(color=COLOR_VWAP, width=1.5),
-                                        name='VWAP', hoverinfo='skip'
-                                    ))
-
-                            if '.TW' not in ticker_input:
-                                # [修正] 動態判斷夏/冬令時間
-                                tz_ny = pytz.timezone('America/New_York')
-                                now_ny = datetime.now(tz_ny)
-                                is_dst = bool(now_ny.dst())
-                                open_str  = '21:30' if is_dst else '22:30'
-                                close_str = '04:00' if is_dst else '05:00'
-
-                                tick_vals  = [session_start, reg_start, reg_end, session_end]
-                                tick_texts = [
-                                    '17:00<br><span style="font-size:9px;color:gray">盤前</span>',
-                                    f'🔔{open_str}<br><span style="font-size:9px;color:gray">開盤</span>',
-                                    f'🌙{close_str}<br><span style="font-size:9px;color:gray">收盤</span>',
-                                    '09:00<br><span style="font-size:9px;color:gray">結算</span>'
-                                ]
-                                x_range = [session_start, session_end]
-                            else:
-                                tick_vals = tick_texts = None
-                                x_range   = None
-
-                            y_min = df_plot['Low'].min()  * 0.999
-                            y_max = df_plot['High'].max() * 1.001
-
-                            fig_spark.update_layout(
-                                height=110,
-                                margin=dict(l=10, r=10, t=5, b=35),
-                                xaxis=dict(
-                                    visible=True, range=x_range, fixedrange=True,
-                                    showgrid=False, showline=False, zeroline=False,
-                                    tickmode='array', tickvals=tick_vals, ticktext=tick_texts,
-                                    side='bottom', tickfont=dict(size=11)
-                                ),
-                                yaxis=dict(visible=False, range=[y_min, y_max], fixedrange=True),
-                                paper_bgcolor='rgba(0,0,0,0)',
-                                plot_bgcolor='rgba(0,0,0,0)',
-                                showlegend=False, dragmode=False
-                            )
-
-                    st.markdown(get_price_card_html(
-                        regular_price, reg_change, reg_pct,
-                        is_extended, ext_price, ext_pct, ext_label,
-                        day_high_pct, day_low_pct
-                    ), unsafe_allow_html=True)
-
-                    if not df_intra.empty:
-                        # 走勢迷你圖：靜態，不攔截觸控
-                        st.markdown('<div class="spark-chart-wrapper">', unsafe_allow_html=True)
-                        st.plotly_chart(fig_spark, use_container_width=True,
-                                        config=get_mobile_chart_config(allow_zoom=False))
+                        # [修正] 主圖 (含趨勢狀態底色) 以完整歷史建一次並快取；顯示區間由圖上的按鈕切換
+                        data_version = (data_fingerprint(df), spec_hash(indicator_spec))
+                        st.plotly_chart(
+                            build_main_chart(ticker_input, data_version, strat_fast, strat_slow, df),
+                            use_container_width=True,
+                            # [關鍵] 手機啟用雙指縮放 + 工具列
+                            config=get_mobile_chart_config(allow_zoom=True)
+                        )
+                        mark_paint('主圖')
                         st.markdown('</div>', unsafe_allow_html=True)
+                        st.caption(f'K線底色：綠 = 多頭排列、紅 = 空頭排列 (收盤 / MA{strat_fast} / MA{strat_slow})')
+                        # [修正] 更長的區間按需補抓 (預設只抓目前指標 + 預設區間所需的長度)
+                        longer = next_window(len(df))
+                        if longer is not None:
+                            st.button(f'📜 載入更長歷史 ({longer[0]})', key='chart_load_longer',
+                                      on_click=extend_chart_history, args=(longer[1],))
 
-                with c2:
-                    st.markdown(get_metric_card_html('本益比 (P/E)', f"{info.get('trailingPE', 'N/A')}", '估值參考'), unsafe_allow_html=True)
-                with c3:
-                    st.markdown(get_metric_card_html('EPS', f"{info.get('trailingEps', 'N/A')}", '獲利能力'), unsafe_allow_html=True)
-                with c4:
-                    mcap  = info.get('marketCap', 0)
-                    m_str = f'{mcap/1_000_000_000:.1f}B' if mcap > 1_000_000_000 else f'{mcap/1_000_000:.1f}M'
-                    st.markdown(get_metric_card_html('市值', m_str, info.get('sector', 'N/A')), unsafe_allow_html=True)
-
-                # ── 策略訊號 ──
-                st.markdown('#### 🤖 策略訊號解讀 (Rule-Based)')
-                ai_data = generate_ai_summary(ticker_input, last, strat_fast_val, strat_slow_val)
-                k1, k2, k3, k4 = st.columns(4)
-                with k1:
                     st.markdown(f"""
-                    <div class="metric-card">
-                      <div class="metric-title">趨勢訊號</div>
-                      <div class="metric-value" style="font-size:1.2rem;">{ai_data['trend']['msg']}</div>
-                      <div><span class="status-badge {ai_data['trend']['bg']}">MA{strat_fast} vs MA{strat_slow}</span></div>
-                    </div>""", unsafe_allow_html=True)
-                with k2:
-                    st.markdown(f"""
-                    <div class="metric-card">
-                      <div class="metric-title">量能判讀</div>
-                      <div class="metric-value" style="font-size:1.2rem;">{ai_data['vol']['msg']}</div>
-                      <div><span class="status-badge {ai_data['vol']['bg']}">{ai_data['vol']['val']:.1f} 倍均量</span></div>
-                    </div>""", unsafe_allow_html=True)
-                with k3:
-                    st.markdown(f"""
-                    <div class="metric-card">
-                      <div class="metric-title">MACD 趨勢</div>
-                      <div class="metric-value" style="font-size:1.2rem;">{ai_data['macd']['msg']}</div>
-                      <div><span class="status-badge {ai_data['macd']['bg']}">{ai_data['macd']['val']:.2f}</span></div>
-                    </div>""", unsafe_allow_html=True)
-                with k4:
-                    st.markdown(f"""
-                    <div class="metric-card">
-                      <div class="metric-title">RSI 強弱</div>
-                      <div class="metric-value" style="font-size:1.2rem;">{ai_data['rsi']['msg']}</div>
-                      <div><span class="status-badge {ai_data['rsi']['bg']}">{ai_data['rsi']['val']:.1f}</span></div>
+                    <div class="ai-summary-card">
+                      <div class="ai-title">🔎 綜合指標速覽</div>
+                      <div class="ai-content">{ai_data['suggestion']}</div>
                     </div>""", unsafe_allow_html=True)
 
-                # ── 均線監控 ──
-                st.markdown('#### 📏 關鍵均線監控')
-                ma_list = [5, 10, 20, 30, 60, 120, 200]
-                ma_html = ''.join([
-                    f'<div class="ma-box">'
-                    f'<div class="ma-label">MA {d}</div>'
-                    f'<div class="ma-val {"txt-up-vip" if last.get(f"MA_{d}", 0) > prev.get(f"MA_{d}", 0) else "txt-down-vip"}">'
-                    f'{last.get(f"MA_{d}", 0):.2f} {"▲" if last.get(f"MA_{d}", 0) > prev.get(f"MA_{d}", 0) else "▼"}</div></div>'
-                    for d in ma_list
-                ])
-                st.markdown(f'<div class="ma-container">{ma_html}</div>', unsafe_allow_html=True)
-
-                # ── 互動式主圖表 ──────────────────────────────────
-                st.markdown('#### 📉 互動式技術分析 (Plotly)')
-
-                # [手機優化] 在圖表上方顯示操作提示
-                st.markdown(
-                    '<div class="mobile-chart-hint">👆 雙指縮放 | 單指拖拉 | 右上角工具列可截圖</div>',
-                    unsafe_allow_html=True
-                )
-
-                chart_days = st.slider('選擇顯示天數 (Days)', min_value=30, max_value=300, value=90, step=5)
-                df_chart = df.tail(chart_days) if len(df) > chart_days else df
-
-                fig_interactive = plot_interactive_chart(df_chart, ticker_input)
-
-                st.markdown('<div class="main-chart-wrapper">', unsafe_allow_html=True)
-                st.plotly_chart(
-                    fig_interactive,
-                    use_container_width=True,
-                    # [關鍵] 手機啟用雙指縮放 + 工具列
-                    config=get_mobile_chart_config(allow_zoom=True)
-                )
-                st.markdown('</div>', unsafe_allow_html=True)
-
-                st.markdown(f"""
-                <div class="ai-summary-card">
-                  <div class="ai-title">🔎 綜合指標速覽</div>
-                  <div class="ai-content">{ai_data['suggestion']}</div>
-                </div>""", unsafe_allow_html=True)
-
-                # ── Gemini 深度分析 ──
-                st.markdown('---')
-                st.subheader('🤖 Gemini 深度戰略分析')
-
-                with st.expander('✨ 點擊展開：呼叫 AI 進行完整解讀 (消耗 Token)', expanded=False):
-                    if st.button('🚀 啟動 Gemini 分析', key='btn_gemini_analyze'):
-                        if 'GEMINI_API_KEY' not in st.secrets:
-                            st.error('❌ 未設定 API Key，請檢查 secrets.toml')
-                        else:
-                            with st.spinner('正在連線 AI 大腦...'):
-                                try:
-                                    # [修正] 使用快取的 model，不重複掃描
-                                    model = get_gemini_model()
-                                    if not model:
-                                        st.error('無法初始化 Gemini 模型')
-                                    else:
-                                        tech_insight = generate_technical_context(df)
-                                        persona_prompts = {
-                                            'Buffett': '你是巴菲特。請忽略短期波動，專注於護城河、現金流與長期價值。如果本益比過高，請直言不諱。',
-                                            'Soros':   '你是索羅斯。請專注於市場情緒與反身性理論。尋找價格與基本面的背離，這是不是一個泡沫？',
-                                            'Simons':  '你是量化大師西蒙斯。不要講故事，只看數據機率。請根據 RSI, MACD, 乖離率進行統計分析。',
-                                            'General': '你是軍工複合體戰略家。請從地緣政治、供應鏈安全、國防預算角度分析這家公司的戰略價值。'
-                                        }
-                                        selected_key    = ai_persona.split(' ')[0]
-                                        selected_prompt = persona_prompts.get(selected_key, persona_prompts['General'])
-
-                                        prompt = f"""
+                    # ── 相關性最高的個股 ──
+                    corr_window = st.session_state.get('corr_window', 60)
+                    try:
+                        peers = load_most_correlated(ticker_input, corr_window, str(df.index[-1].date()))
+                    except Exception as e:
+                        # [修正] 相近個股只是附加資訊，失敗時不影響整頁
+                        peers = pd.Series(dtype=float)
+                        st.info(f'走勢最相近的個股暫時無法計算：{e}')
+                    if not peers.empty:
+                        st.markdown(f'#### 🔗 走勢最相近的個股 (近 {corr_window} 日)')
+                        st.markdown(' '.join(
+                            f'<span class="status-badge bg-blue">{t} {c:.2f}</span>' for t, c in peers.items()
+                        ), unsafe_allow_html=True)
+
+                    # ── Gemini 深度分析 ──
+                    st.markdown('---')
+                    st.subheader('🤖 Gemini 深度戰略分析')
+
+                    gemini_panel = st.expander('✨ 點擊展開：呼叫 AI 進行完整解讀 (消耗 Token)', expanded=False,
+                                               key='panel_gemini', on_change='rerun')
+                    if gemini_panel.open:
+                        with gemini_panel:
+                            if st.button('🚀 啟動 Gemini 分析', key='btn_gemini_analyze'):
+                                if 'GEMINI_API_KEY' not in st.secrets:
+                                    st.error('❌ 未設定 API Key，請檢查 secrets.toml')
+                                else:
+                                    with st.spinner('正在連線 AI 大腦...'):
+                                        try:
+                                            # [修正] 使用快取的 model，不重複掃描
+                                            model = get_gemini_model()
+                                            if not model:
+                                                st.error('無法初始化 Gemini 模型')
+                                            else:
+                                                tech_insight = generate_technical_context(df)
+                                                persona_prompts = {
+                                                    'Buffett': '你是巴菲特。請忽略短期波動，專注於護城河、現金流與長期價值。如果本益比過高，請直言不諱。',
+                                                    'Soros':   '你是索羅斯。請專注於市場情緒與反身性理論。尋找價格與基本面的背離，這是不是一個泡沫？',
+                                                    'Simons':  '你是量化大師西蒙斯。不要講故事，只看數據機率。請根據 RSI, MACD, 乖離率進行統計分析。',
+                                                    'General': '你是軍工複合體戰略家。請從地緣政治、供應鏈安全、國防預算角度分析這家公司的戰略價值。'
+                                                }
+                                                selected_key    = ai_persona.split(' ')[0]
+                                                selected_prompt = persona_prompts.get(selected_key, persona_prompts['General'])
+
+                                                prompt = f"""
 {selected_prompt}
 分析目標：{ticker_input} ({info.get('longName', '')})
 【內部技術監控數據】：{tech_insight}
@@ -936,23 +1414,84 @@ if ticker_input:
 4. 具體操作策略（該追高、觀望還是停損？）
 請用繁體中文，語氣專業但直白。
 """
-                                        response = model.generate_content(prompt)
-                                        st.markdown(f"""
-                                        <div style="background-color:#f0f2f6; padding:15px; border-radius:10px; border-left:5px solid #FF4B4B; line-height:1.7;">
-                                        {response.text}
-                                        </div>""", unsafe_allow_html=True)
-
-                                except Exception as e:
-                                    st.error(f'AI 連線失敗，錯誤原因: {e}')
-                                    st.caption('建議：請檢查 API Key 是否正確，或稍後再試。')
-
-            with tab_calc:
-                render_calculator_tab(current_close_price, exchange_rate, quote_type)
-            with tab_inv:
-                render_inventory_tab(current_close_price, quote_type)
+                                                response = model.generate_content(prompt)
+                                                st.markdown(f"""
+                                                <div style="background-color:#f0f2f6; padding:15px; border-radius:10px; border-left:5px solid #FF4B4B; line-height:1.7;">
+                                                {response.text}
+                                                </div>""", unsafe_allow_html=True)
+
+                                        except Exception as e:
+                                            st.error(f'AI 連線失敗，錯誤原因: {e}')
+                                            st.caption('建議：請檢查 API Key 是否正確，或稍後再試。')
+
+            if tab_calc.open:
+                with tab_calc:
+                    render_calculator_tab(current_close_price, fetch_quote_snapshot(quote_symbols).get(FX_SYMBOLS['USDTWD']), quote_type)
+            if tab_inv.open:
+                with tab_inv:
+                    render_inventory_tab(current_close_price, quote_type)
+            if tab_backtest.open:
+                with tab_backtest:
+                    fx_quote = fetch_quote_snapshot(quote_symbols).get(FX_SYMBOLS['USDTWD'])
+                    render_backtest_tab(ticker_input, strat_fast, strat_slow, quote_type, fx_quote)
+                    st.markdown('---')
+                    sweep_job = st.session_state.get('sweep_job')
+                    st.session_state.sweep_polling = sweep_job is not None and sweep_job.running
+                    sweep_fragment = st.fragment(render_sweep_panel,
+                                                 run_every=SWEEP_POLL_SECONDS if st.session_state.sweep_polling else None)
+                    sweep_fragment(ticker_input, quote_type, fx_quote)
+                    st.markdown('---')
+                    render_portfolio_panel(ticker_input, strat_fast, strat_slow, fx_quote)
+            if tab_screener.open:
+                with tab_screener:
+                    render_screener_tab(strat_fast, strat_slow)
 
         else:
             st.error('資料不足，請確認股票代號是否正確。')
     except Exception as e:
         st.error(f'系統忙碌中: {e}')
-        st.exception(e)  # 開發模式下顯示完整錯誤堆疊
\ No newline at end of file
+        st.exception(e)  # 開發模式下顯示完整錯誤堆疊
+
+mark_paint('整頁')
+
+# ─────────────────────────────────────────────────────────────
+#  7. 系統監控 (側邊欄)
+# ─────────────────────────────────────────────────────────────
+with st.sidebar.expander('📈 系統監控', expanded=False):
+    # [新增] 首屏時間：主圖送出 / 整頁執行完畢
+    paint = st.session_state.get('paint_ms', {})
+    if paint:
+        st.caption('本次執行：' + '、'.join(f'{k} {v:,.0f} ms' for k, v in paint.items()))
+
+    sched = get_scheduler().metrics()
+    st.caption(f"上游排程：佇列 {sched['queue_depth']}、執行中 {sched['in_flight']} (逾時仍在跑 {sched['abandoned']})、"
+               f"成功 {sched['success']}、重試 {sched['retries']}、逾時 {sched['timeouts']}、錯誤 {sched['errors']}")
+    if sched['calls']:
+        st.bar_chart(pd.Series(sched['latency_histogram'], name='次數'), height=160)
+        st.dataframe(pd.DataFrame(sched['by_kind']).T, use_container_width=True)
+
+    sf_stats = get_singleflight_stats()
+    st.caption(f"上游請求合併 (Single-flight)：共 {sf_stats['total']['calls']} 次，"
+               f"實際抓取 {sf_stats['total']['executed']} 次，合併 {sf_stats['total']['coalesced']} 次")
+    if sf_stats['by_kind']:
+        st.dataframe(pd.DataFrame(sf_stats['by_kind']).T, use_container_width=True)
+
+    # [新增] 指標結果快取的命中狀況
+    memo = get_indicator_memo().stats()
+    st.caption(f"指標快取：命中 {memo['hits']} 次、未命中 {memo['misses']} 次 (命中率 {memo['hit_rate']:.0%})，"
+               f"{memo['entries']} 筆 / {memo['bytes'] / 1024:.1f} KB，淘汰 {memo['evictions']} 次")
+
+    # [新增] 各圖表送到瀏覽器的 JSON 大小
+    payloads = payload_report()
+    if not payloads.empty:
+        st.caption(f"圖表 payload：共 {payloads['KB'].sum():.1f} KB")
+        st.dataframe(payloads.style.format('{:.1f}'), use_container_width=True)
+
+    # [新增] 記憶體用量：本 session 與共用 store
+    mem_session = session_memory_report(st.session_state)
+    mem_shared  = get_shared_store().report()
+    st.caption(f"本 session 占用約 {mem_session['bytes'].sum() / 1024:.1f} KB；"
+               f"共用資料 {len(mem_shared)} 份，約 {mem_shared['bytes'].sum() / 1024:.1f} KB "
+               f"(精簡前 {mem_shared['raw_frame_bytes'].sum() / 1024:.1f} KB → 精簡後 {mem_shared['frame_bytes'].sum() / 1024:.1f} KB)")
+    if not mem_session.empty:
+        st.dataframe(mem_session.head(10), use_container_width=True, hide_index=True)
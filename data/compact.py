@@ -0,0 +1,138 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 精簡記憶體格式 + 跨 session 共用資料
+#  - 指標欄位轉 float32、成交量轉整數、移除除權息欄位
+#  - info 只保留畫面有用到的欄位
+#  - 各 session 只在 session_state 存一把 key，實際資料放在 process 共用的 store
+# ─────────────────────────────────────────────────────────────
+
+DROP_COLUMNS = ['Dividends', 'Stock Splits', 'Capital Gains']
+INDICATOR_COLUMNS = ['RSI', 'MACD', 'Signal', 'Hist', 'Vol_MA', 'VWAP']
+INDICATOR_PREFIXES = ('MA_', 'EMA_', 'BB_')   # 均線 / 布林通道等依參數命名的欄位
+
+# 畫面 / 策略實際讀取的 info 欄位
+INFO_FIELDS = ['quoteType', 'longName', 'shortName', 'sector', 'marketCap', 'trailingPE', 'trailingEps']
+
+SHARED_STORE_MAX_ENTRIES = 64
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(deep=True).sum()) if isinstance(df, pd.DataFrame) else 0
+
+
+def compact_frame(df):
+    """回傳精簡後的新 DataFrame (原 df 不變)，原始大小記錄在 attrs['raw_nbytes']"""
+    if df is None or df.empty:
+        return df
+    raw_nbytes = frame_nbytes(df)
+    df = df.drop(columns=[c for c in DROP_COLUMNS if c in df.columns])
+    df.attrs['raw_nbytes'] = raw_nbytes
+    df = compact_indicators(df)
+    if 'Volume' in df.columns:
+        df['Volume'] = df['Volume'].fillna(0).astype(np.int64)
+    return df
+
+
+def is_indicator_column(col):
+    return col in INDICATOR_COLUMNS or str(col).startswith(INDICATOR_PREFIXES)
+
+
+def compact_indicators(df):
+    """
+    [修正] 指標欄位 (含 MA_* / EMA_* / BB_*) 轉 float32；價格欄位維持 float64
+    compute_indicators 的輸出 (也就是指標快取存放的那份) 要經過這一步才有效果
+    """
+    if df is None or df.empty:
+        return df
+    cols = [c for c in df.columns if is_indicator_column(c) and df[c].dtype != np.float32]
+    if cols:
+        df = df.astype({c: np.float32 for c in cols})
+    return df
+
+
+def trim_info(info):
+    return {k: info[k] for k in INFO_FIELDS if k in info}
+
+
+def _deep_sizeof(obj, seen=None):
+    """估算物件 (含 DataFrame / dict / list) 實際占用的記憶體"""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum()) if isinstance(obj, pd.DataFrame) else int(obj.memory_usage(deep=True))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(v, seen) for v in obj)
+    return size
+
+
+class SharedFrameStore:
+    """以 (ticker, 資料版本) 為 key 的共用資料，LRU 淘汰"""
+
+    def __init__(self, max_entries=SHARED_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, bundle):
+        """同一版本已存在就沿用既有那份 (多個 session 共用同一個物件)，回傳實際存放的 bundle"""
+        with self._lock:
+            bundle = self._data.setdefault(key, bundle)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return bundle
+
+    def get(self, key):
+        with self._lock:
+            bundle = self._data.get(key)
+            if bundle is not None:
+                self._data.move_to_end(key)
+            return bundle
+
+    def report(self):
+        with self._lock:
+            items = list(self._data.items())
+        rows = []
+        for k, b in items:
+            frames = [v for v in b.values() if isinstance(v, pd.DataFrame)]
+            rows.append({
+                'key': f'{k[0]} @ {k[1]}',
+                'bytes': _deep_sizeof(b),
+                'raw_frame_bytes': sum(f.attrs.get('raw_nbytes', frame_nbytes(f)) for f in frames),
+                'frame_bytes': sum(frame_nbytes(f) for f in frames),
+            })
+        return pd.DataFrame(rows, columns=['key', 'bytes', 'raw_frame_bytes', 'frame_bytes'])
+
+
+@st.cache_resource
+def get_shared_store():
+    return SharedFrameStore()
+
+
+def make_bundle_key(ticker, df):
+    """資料版本以最後一根K棒時間與筆數表示，資料一更新 key 就不同"""
+    version = f'{df.index[-1]}#{len(df)}' if df is not None and not df.empty else 'empty'
+    return (ticker, version)
+
+
+def session_memory_report(session_state):
+    """每個 session_state 欄位實際占用的位元組數"""
+    rows = []
+    for k in list(session_state.keys()):
+        try:
+            rows.append({'key': str(k), 'bytes': _deep_sizeof(session_state[k])})
+        except Exception:
+            continue
+    return pd.DataFrame(rows, columns=['key', 'bytes']).sort_values('bytes', ascending=False)
@@ -1,44 +1,133 @@
-import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import streamlit as st  # [新增] 引入 streamlit 以使用快取功能
-from ta.trend import SMAIndicator, MACD
-from ta.momentum import RSIIndicator
-
-# [新增] ttl=60 代表資料會暫存 60 秒，期間內不再重複下載
-# show_spinner=False 代表背景默默執行，不需一直跳出轉圈圈
-@st.cache_data(ttl=60, show_spinner=False)
-def fetch_stock_data_now(ticker):
-    stock = yf.Ticker(ticker)
-    df = stock.history(period="2y")
-    df_intra = stock.history(period="1d", interval="5m", prepost=True)
-    info = stock.info
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from data.store import update_history
+from data.providers import get_provider, quote_from_intraday
+from data.singleflight import single_flight
+from data.compact import compact_frame, trim_info, get_shared_store, make_bundle_key
+from logic.lookback import period_for_bars
+
+# [新增] 各資料來源拆開快取，TTL 依變動頻率分別設定：
+#   日K / 基本面 → 1 小時 (盤中只有最後一根在變，報價卡另走即時報價)
+#   5 分K / 報價 → 60 秒
+DAILY_TTL = 3600
+INFO_TTL = 3600
+INTRADAY_TTL = 60
+
+
+
+def _load_daily(ticker, min_bars):
+    # [新增] 日K改由本地歷史庫增量更新，只向上游要最新幾根
+    df = update_history(ticker, get_provider(), min_bars=min_bars)
+    # [新增] 只保留回看規劃需要的長度
+    if min_bars and len(df) > min_bars:
+        df = df.iloc[-min_bars:]
+
+    # [修正] 指標改由 logic.indicators.compute_indicators 在使用端一次算完，這裡只存原始K棒
+    # [新增] 精簡格式後才進快取 (float32 指標 / 整數成交量 / 去除權息欄位)
+    return compact_frame(df)
+
+
+@st.cache_data(ttl=DAILY_TTL, show_spinner=False)
+def fetch_daily_history(ticker, min_bars=None):
+    """日K (OHLCV)；min_bars 由 logic.lookback.plan_lookback 決定"""
+    # [新增] 多個 session 同時 miss 時只抓一次
+    return single_flight(('daily', ticker, min_bars), _load_daily, ticker, min_bars)
+
+
+@st.cache_data(ttl=INTRADAY_TTL, show_spinner=False)
+def fetch_intraday_data(ticker):
+    """當日 5 分K (含盤前盤後)，連同 chart API 回傳的 metadata 一起快取"""
+    df_intra, meta = single_flight(('intraday', ticker), get_provider().intraday,
+                                   ticker, period="1d", interval="5m", prepost=True)
+    return compact_frame(df_intra), meta
+
+
+@st.cache_data(ttl=INFO_TTL, show_spinner=False)
+def fetch_stock_info(ticker):
+    """基本面 (stock.info 很慢，長 TTL)；只保留畫面用得到的欄位"""
+    return trim_info(single_flight(('info', ticker), get_provider().info, ticker))
+
+
+@st.cache_data(ttl=DAILY_TTL, show_spinner=False)
+def fetch_universe_history(tickers, min_bars):
+    """
+    [新增] 多檔日K一次下載，整理成 (日期 × ticker) 的 Close / Volume 矩陣
+    回傳 {'Close': DataFrame, 'Volume': DataFrame}，欄位順序與 tickers 相同 (查無資料者不列入)
+    """
+    tickers = list(tickers)
+    raw = single_flight(('universe', tuple(tickers), min_bars), get_provider().download,
+                        tickers, period=period_for_bars(min_bars), group_by='ticker')
+    if raw is None or raw.empty:
+        return {'Close': pd.DataFrame(), 'Volume': pd.DataFrame()}
+    close = raw.xs('Close', axis=1, level=1).reindex(columns=tickers).dropna(axis=1, how='all')
+    # 停牌 / 假日缺值沿用前值；上市較晚的前段保持 NaN
+    close = close.ffill().iloc[-min_bars:].astype('float64')
+    volume = raw.xs('Volume', axis=1, level=1).reindex(index=close.index, columns=close.columns)
+    volume = volume.fillna(0).where(close.notna()).astype('float64')
+    return {'Close': close, 'Volume': volume}
+
+
+def fetch_quote(ticker):
+    """
+    [新增] 輕量報價：最新價、昨收、盤前/盤後價
+    完全不碰 stock.info，只用 5 分K 與其 metadata (共用 fetch_intraday_data 的快取)
+    """
+    return quote_from_intraday(*fetch_intraday_data(ticker))
+
+
+def _fetch_pool(workers):
+    """
+    [修正] 快取未命中時同時抓取用的執行緒池 (每次載入一個，用完即關閉)
+    worker 啟動時帶上目前 Streamlit session 的 context (避免快取警告)；
+    池關閉後 worker 隨之結束，context 不會殘留到之後其他 session 的任務
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch",
+                              initializer=add_script_run_ctx, initargs=(None, ctx))
+
+
+def fetch_stock_data_now(ticker, min_bars=None):
+    """
+    日K / 基本面 並行抓取 (各自有快取，命中者幾乎不耗時)
+    [修正] 5 分K 由報價卡自己取得 (fetch_intraday_data / 即時緩衝區)，不再隨 bundle 一起抓與保存
+    """
+    with _fetch_pool(2) as pool:
+        f_daily = pool.submit(fetch_daily_history, ticker, min_bars)
+        f_info = pool.submit(fetch_stock_info, ticker)
+
+    df = f_daily.result()
+    info = f_info.result()
     quote_type = info.get('quoteType', 'EQUITY')
-    
-    # 資料清洗與基礎指標計算
-    if not df.empty:
-        df['RSI'] = RSIIndicator(df['Close'], window=14).rsi()
-        macd = MACD(df['Close'])
-        df['MACD'] = macd.macd()
-        df['Signal'] = macd.macd_signal()
-        df['Hist'] = macd.macd_diff()
-        
-        # 強制填補 NaN
-        df['Hist'] = df['Hist'].fillna(0)
-        df['MACD'] = df['MACD'].fillna(0)
-        df['Signal'] = df['Signal'].fillna(0)
-        
-        df['Vol_MA'] = SMAIndicator(df['Volume'], window=20).sma_indicator()
-    
-    return df, df_intra, info, quote_type
-
-# [新增] 匯率也加上快取，設定 1 小時 (3600秒) 更新一次即可，不用一直查
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_exchange_rate_now():
-    try:
-        fx = yf.Ticker("USDTWD=X")
-        hist = fx.history(period="1d")
-        if not hist.empty:
-            return hist['Close'].iloc[-1]
-        return 32.5
-    except:
-        return 32.5
\ No newline at end of file
+
+    return df, info, quote_type
+
+
+def load_stock_bundle(ticker, min_bars=None):
+    """
+    [新增] 抓取資料並放進 process 共用的 store，回傳 (key, bundle)。
+    session 只需記住 key；同一版本的資料所有 session 共用同一份。
+    """
+    df, info, quote_type = fetch_stock_data_now(ticker, min_bars)
+    key = make_bundle_key(ticker, df)
+    bundle = get_shared_store().put(key, {'df': df, 'info': info, 'quote_type': quote_type})
+    return key, bundle
+
+
+def clear_stock_cache(ticker, min_bars=None):
+    """[修正] 手動重新整理：清掉該代號的日K / 基本面 / 分K快取，下次載入會重新向上游抓取"""
+    fetch_daily_history.clear(ticker, min_bars)
+    fetch_stock_info.clear(ticker)
+    fetch_intraday_data.clear(ticker)
+
+
+def get_stock_bundle(key, min_bars=None):
+    """依 key 取回共用資料；已被淘汰則重新載入 (回傳新的 key)"""
+    bundle = get_shared_store().get(key)
+    if bundle is None:
+        return load_stock_bundle(key[0], min_bars)
+    return key, bundle
@@ -0,0 +1,160 @@
+import math
+import threading
+import time as _time
+from collections import deque
+from datetime import time
+
+import pandas as pd
+import streamlit as st
+
+from data.providers import get_provider, quote_from_intraday
+from data.singleflight import single_flight
+from logic.streaming import StreamingVWAP
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 即時模式：5 分K 環形緩衝區
+#  每次輪詢只向上游要「最後一根 (含) 之後」的K棒並附加，
+#  VWAP (logic.streaming.StreamingVWAP) 與當日高低點隨K棒增量更新，成本為 O(新K棒數)。
+# ─────────────────────────────────────────────────────────────
+
+LIVE_POLL_SECONDS = 15       # 同一檔股票兩次上游輪詢的最短間隔 (所有 session 共用)
+LIVE_BUFFER_BARS = 400       # 5 分K 含盤前盤後一天約 192 根，留足兩天份
+LIVE_INTERVAL_OPTIONS = [15, 30, 60, 120, 300]   # 報價卡自動更新間隔 (秒)，不短於上游輪詢間隔
+
+
+def session_hours(ticker):
+    """回傳 (時區, 開盤時間, 收盤時間)"""
+    if '.TW' in ticker:
+        return 'Asia/Taipei', time(9, 0), time(13, 30)
+    return 'America/New_York', time(9, 30), time(16, 0)
+
+
+class IntradayBuffer:
+    """單一股票的分K緩衝區 + 增量 VWAP / 當日高低"""
+
+    def __init__(self, ticker, maxlen=LIVE_BUFFER_BARS):
+        self.ticker = ticker
+        self.tz, self.open_time, self.close_time = session_hours(ticker)
+        self._bars = deque(maxlen=maxlen)   # (ts, open, high, low, close, volume, vwap)
+        self._lock = threading.Lock()
+        self.last_poll = 0.0
+        self.meta = {}                      # 最近一次輪詢的 chart metadata (昨收、交易時段)
+        self.vwap = StreamingVWAP()         # 以當地交易日為 session，換日自動歸零
+        self._reset_session(None)
+
+    def _reset_session(self, session_date):
+        self.session_date = session_date
+        self.reg_high = self.reg_low = None     # 正規盤高低
+        self.reg_close = None                   # 正規盤最後一根收盤
+        self.all_high = self.all_low = None     # 含盤前盤後 (正規盤尚無資料時使用)
+
+    @property
+    def last_ts(self):
+        return self._bars[-1][0] if self._bars else None
+
+    def _add(self, ts, o, h, l, c, v):
+        local_ts = ts.tz_convert(self.tz) if ts.tzinfo is not None else ts
+        if local_ts.date() != self.session_date:
+            # 換日：高低點重新累計 (VWAP 由 session 自動歸零)
+            self._reset_session(local_ts.date())
+
+        vwap = self.vwap.update(c, v, local_ts.date())
+        if math.isnan(vwap):
+            vwap = c    # 尚無成交量時以收盤價代替
+
+        self.all_high = h if self.all_high is None else max(self.all_high, h)
+        self.all_low = l if self.all_low is None else min(self.all_low, l)
+        if self.open_time <= local_ts.time() <= self.close_time:
+            self.reg_high = h if self.reg_high is None else max(self.reg_high, h)
+            self.reg_low = l if self.reg_low is None else min(self.reg_low, l)
+            self.reg_close = c
+
+        self._bars.append((ts, o, h, l, c, v, vwap))
+
+    def _drop_last(self):
+        """移除最後一根 (尚未收完的K棒會被新資料覆蓋)，並扣回其累計量"""
+        ts, o, h, l, c, v, _ = self._bars.pop()
+        self.vwap.remove(c, v)
+        # 高低點只增不減；被覆蓋的K棒高低必然 ≤ 新K棒，直接保留即可
+
+    def append(self, df_new):
+        """附加新K棒，回傳實際新增/更新的根數"""
+        if df_new is None or df_new.empty:
+            return 0
+        with self._lock:
+            last_ts = self.last_ts
+            rows = df_new[df_new.index >= last_ts] if last_ts is not None else df_new
+            if rows.empty:
+                return 0
+            if last_ts is not None and rows.index[0] == last_ts:
+                self._drop_last()
+            for ts, o, h, l, c, v in zip(rows.index, rows['Open'], rows['High'], rows['Low'],
+                                         rows['Close'], rows['Volume']):
+                self._add(ts, float(o), float(h), float(l), float(c), float(v))
+            return len(rows)
+
+    def to_frame(self):
+        """目前緩衝區內容 (僅最新交易日)，欄位與原本的 df_intra + VWAP 相同"""
+        with self._lock:
+            bars = list(self._bars)
+        if not bars:
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume', 'VWAP'])
+        df = pd.DataFrame(bars, columns=['Datetime', 'Open', 'High', 'Low', 'Close', 'Volume', 'VWAP'])
+        df = df.set_index('Datetime')
+        local_dates = df.index.tz_convert(self.tz).date if df.index.tz is not None else df.index.date
+        return df[local_dates == self.session_date]
+
+    def quote(self, frame=None):
+        """
+        [修正] 即時模式的報價只由緩衝區K棒 + 已取得的 metadata 組成，不再另抓整天的分K；
+        正規盤價取緩衝區內最後一根正規盤K棒 (metadata 的 regularMarketPrice 可能已過時)
+        """
+        frame = self.to_frame() if frame is None else frame
+        meta = dict(self.meta)
+        if self.reg_close is not None:
+            meta['regularMarketPrice'] = self.reg_close
+        return quote_from_intraday(frame, meta)
+
+    @property
+    def day_high(self):
+        return self.reg_high if self.reg_high is not None else self.all_high
+
+    @property
+    def day_low(self):
+        return self.reg_low if self.reg_low is not None else self.all_low
+
+
+@st.cache_resource
+def _live_buffers():
+    return {}, threading.Lock()
+
+
+def get_live_buffer(ticker):
+    buffers, lock = _live_buffers()
+    with lock:
+        if ticker not in buffers:
+            buffers[ticker] = IntradayBuffer(ticker)
+        return buffers[ticker]
+
+
+def _poll(buffer):
+    provider = get_provider()
+    if buffer.last_ts is None:
+        df_new, meta = provider.intraday(buffer.ticker, period="1d", interval="5m", prepost=True)
+    else:
+        df_new, meta = provider.intraday(buffer.ticker, interval="5m", prepost=True, start=buffer.last_ts)
+    if meta:
+        buffer.meta = meta
+    buffer.last_poll = _time.time()
+    return buffer.append(df_new)
+
+
+def poll_live_intraday(ticker):
+    """
+    即時模式輪詢：距上次輪詢超過 LIVE_POLL_SECONDS 才打上游，
+    多個 session 同時輪詢同一檔會合併成一次請求。回傳緩衝區。
+    """
+    buffer = get_live_buffer(ticker)
+    if _time.time() - buffer.last_poll >= LIVE_POLL_SECONDS:
+        single_flight(('live', ticker), _poll, buffer)
+    return buffer
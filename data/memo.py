@@ -0,0 +1,92 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from data.compact import frame_nbytes, compact_indicators
+from logic.indicators import compute_indicators
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 指標結果快取 (content-addressed)
+#  key = (ticker, 最後一根K棒時間, 筆數, 最後一根收盤 / 量, spec 雜湊)
+#  資料沒變的重跑 (拉圖表天數、切換熱力圖選項…) 直接取用，不再重算指標
+#  以筆數與總位元組雙重上限做 LRU 淘汰，並記錄命中 / 未命中次數
+#  存放前指標欄位先轉 float32 (data.compact.compact_indicators)
+# ─────────────────────────────────────────────────────────────
+
+MEMO_MAX_ENTRIES = 128
+MEMO_MAX_BYTES = 64 * 1024 * 1024
+
+
+def spec_hash(spec):
+    """spec (dict，值可為 list / tuple) 的穩定雜湊"""
+    text = json.dumps(spec, sort_keys=True, default=list)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def data_fingerprint(df):
+    """最後一根K棒時間 + 筆數 + 最後收盤 / 量：盤中最後一根更新時也會換 key"""
+    if df is None or df.empty:
+        return ('empty',)
+    last = df.iloc[-1]
+    return (str(df.index[-1]), len(df), float(last['Close']), float(last.get('Volume', 0)))
+
+
+class IndicatorMemo:
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES, max_bytes=MEMO_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_or_compute(self, key, fn, *args):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        value = fn(*args)
+        size = frame_nbytes(value)
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = (value, size)
+                self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, old_size) = self._data.popitem(last=False)
+                self._bytes -= old_size
+                self._stats['evictions'] += 1
+            return self._data.get(key, (value,))[0]
+
+    def stats(self):
+        with self._lock:
+            calls = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hit_rate': self._stats['hits'] / calls if calls else 0.0,
+            }
+
+
+@st.cache_resource
+def get_indicator_memo():
+    return IndicatorMemo()
+
+
+def _compute_compact(df, spec):
+    return compact_indicators(compute_indicators(df, spec))
+
+
+def cached_indicators(ticker, df, spec):
+    """
+    同一份資料 + 同一組 spec 只算一次；回傳的 DataFrame 為共用物件，呼叫端請勿原地修改
+    """
+    key = (ticker, data_fingerprint(df), spec_hash(spec))
+    return get_indicator_memo().get_or_compute(key, _compute_compact, df, spec)
@@ -0,0 +1,298 @@
+import json
+import os
+import time
+
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import (YFInvalidPeriodError, YFPricesMissingError, YFRateLimitError,
+                                 YFTickerMissingError, YFTzMissingError)
+
+from data.scheduler import get_scheduler
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 行情資料來源抽象層
+#  所有上游請求 (日K / 5 分K / 報價 / 基本面 / 多檔下載) 都經由 provider，
+#  方便切換成離線重播來源做壓測與效能量測。
+#  實際請求一律透過 data.scheduler 排程 (限速 / 併發上限 / 重試 / 逾時)。
+#
+#  環境變數：
+#    STOCK_VIP_PROVIDER        yfinance (預設) | replay
+#    STOCK_VIP_REPLAY_DIR      重播資料夾 (預設 data/fixtures)
+#    STOCK_VIP_REPLAY_LATENCY  每次呼叫模擬延遲秒數 (預設 0)
+# ─────────────────────────────────────────────────────────────
+
+DEFAULT_REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _session_of(ts_epoch, trading_period):
+    """判斷時間點落在 pre / regular / post 哪一段"""
+    for name in ('pre', 'regular', 'post'):
+        period = trading_period.get(name) or {}
+        if period.get('start', 0) <= ts_epoch < period.get('end', 0):
+            return name
+    return None
+
+
+def quote_from_intraday(df_intra, meta):
+    """由 5 分K 與 chart metadata 推出輕量報價 (最新價、昨收、盤前/盤後價)"""
+    quote = {
+        'last_price': meta.get('regularMarketPrice'),
+        'previous_close': meta.get('previousClose', meta.get('chartPreviousClose')),
+        'pre_market_price': None,
+        'post_market_price': None,
+    }
+    if df_intra.empty:
+        return quote
+
+    last_ts = df_intra.index[-1]
+    last_close = float(df_intra['Close'].iloc[-1])
+    if quote['last_price'] is None:
+        quote['last_price'] = last_close
+
+    trading_period = meta.get('currentTradingPeriod') or {}
+    if trading_period:
+        last_epoch = int(pd.Timestamp(last_ts).timestamp())
+        session = _session_of(last_epoch, trading_period)
+        # 最後一根 K 棒的開始時間若在盤前/盤後時段，代表目前為延長交易報價
+        if session == 'pre':
+            quote['pre_market_price'] = last_close
+        elif session == 'post':
+            quote['post_market_price'] = last_close
+    return quote
+
+
+class MarketDataProvider:
+    """資料來源介面，子類別需實作 history / intraday / info / download"""
+
+    name = "base"
+    retryable = ()      # 除網路 / 逾時外，此來源另外值得重試的例外 (如限流)
+
+    def _upstream(self, kind, fn, *args, **kwargs):
+        """所有實際請求的出口：交給排程器執行"""
+        return get_scheduler().call(kind, fn, *args, retry_on=self.retryable, **kwargs)
+
+    def history(self, ticker, period=None, start=None):
+        """日K，period (如 "2y") 與 start (YYYY-MM-DD) 擇一"""
+        raise NotImplementedError
+
+    def intraday(self, ticker, period="1d", interval="5m", prepost=True, start=None):
+        """分K，回傳 (DataFrame, metadata dict)；給 start 時只回傳該時間 (含) 之後的K棒"""
+        raise NotImplementedError
+
+    def quote(self, ticker):
+        return quote_from_intraday(*self.intraday(ticker))
+
+    def info(self, ticker):
+        """基本面 dict"""
+        raise NotImplementedError
+
+    def download(self, tickers, period="1d", group_by="column"):
+        """多檔一次下載，欄位格式與 yf.download 相同 (MultiIndex)"""
+        raise NotImplementedError
+
+
+# 代號不存在 / 該區間無資料：屬正常結果，不重試
+_YF_NO_DATA_ERRORS = (YFPricesMissingError, YFTzMissingError, YFTickerMissingError, YFInvalidPeriodError)
+
+
+def _yf_history(stock, **kwargs):
+    """讓網路 / 限流錯誤拋出給排程器重試，查無資料則回傳空表 (與原本行為相同)"""
+    try:
+        return stock.history(raise_errors=True, **kwargs)
+    except _YF_NO_DATA_ERRORS:
+        return pd.DataFrame()
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+    retryable = (YFRateLimitError,)
+
+    def history(self, ticker, period=None, start=None):
+        stock = yf.Ticker(ticker)
+        if start is not None:
+            return self._upstream('history', _yf_history, stock, start=start)
+        return self._upstream('history', _yf_history, stock, period=period or "2y")
+
+    def intraday(self, ticker, period="1d", interval="5m", prepost=True, start=None):
+        def _fetch():
+            stock = yf.Ticker(ticker)
+            if start is not None:
+                df_intra = _yf_history(stock, start=start, interval=interval, prepost=prepost)
+            else:
+                df_intra = _yf_history(stock, period=period, interval=interval, prepost=prepost)
+            try:
+                # 剛呼叫過 history，metadata 已在物件內，不會再發請求
+                meta = stock.get_history_metadata()
+            except Exception:
+                meta = {}
+            return df_intra, meta
+
+        return self._upstream('intraday', _fetch)
+
+    def info(self, ticker):
+        return self._upstream('info', lambda: yf.Ticker(ticker).info)
+
+    def download(self, tickers, period="1d", group_by="column"):
+        # 多檔下載由 yfinance 內部平行處理，整批只佔一個排程名額
+        return self._upstream('download', yf.download, list(tickers), period=period,
+                              group_by=group_by, progress=False)
+
+
+_PERIOD_OFFSETS = {
+    'd': lambda n: pd.DateOffset(days=n),
+    'wk': lambda n: pd.DateOffset(weeks=n),
+    'mo': lambda n: pd.DateOffset(months=n),
+    'y': lambda n: pd.DateOffset(years=n),
+}
+
+
+def _trim_period(df, period):
+    """依 period 從資料最後一天往回截取 (以資料本身的時間為準，結果可重現)"""
+    if df.empty or not period or period == "max":
+        return df
+    for unit in ('wk', 'mo', 'd', 'y'):
+        if period.endswith(unit) and period[:-len(unit)].isdigit():
+            n = int(period[:-len(unit)])
+            last = df.index[-1]
+            if unit == 'd':
+                # 1d/5d 以交易日計算，與 yfinance 行為一致
+                days = pd.Index(df.index.normalize().unique())
+                return df[df.index.normalize() >= days[-min(n, len(days))]]
+            return df[df.index > last - _PERIOD_OFFSETS[unit](n)]
+    return df
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    離線重播來源：讀取錄製好的 Parquet / CSV 檔，並可模擬網路延遲。
+    資料夾結構：
+      history/<TICKER>.parquet|csv      日K
+      intraday/<TICKER>.parquet|csv     分K
+      intraday/<TICKER>.meta.json       分K metadata (可省略)
+      info/<TICKER>.json                基本面 (可省略)
+    """
+
+    name = "replay"
+
+    def __init__(self, root=DEFAULT_REPLAY_DIR, latency=0.0):
+        self.root = root
+        self.latency = float(latency)
+
+    def _sleep(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _read_frame(self, kind, ticker):
+        base = os.path.join(self.root, kind, ticker.upper())
+        if os.path.exists(base + ".parquet"):
+            return pd.read_parquet(base + ".parquet")
+        if os.path.exists(base + ".csv"):
+            df = pd.read_csv(base + ".csv", index_col=0)
+            df.index = pd.to_datetime(df.index, utc=True)
+            return df
+        return pd.DataFrame()
+
+    def _read_json(self, path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def history(self, ticker, period=None, start=None):
+        return self._upstream('history', self._history, ticker, period, start)
+
+    def _history(self, ticker, period, start):
+        self._sleep()
+        df = self._read_frame("history", ticker)
+        if df.empty:
+            return df
+        if start is not None:
+            start_ts = pd.Timestamp(start)
+            if df.index.tz is not None:
+                start_ts = start_ts.tz_localize(df.index.tz)
+            return df[df.index >= start_ts]
+        return _trim_period(df, period or "2y")
+
+    def intraday(self, ticker, period="1d", interval="5m", prepost=True, start=None):
+        return self._upstream('intraday', self._intraday, ticker, period, start)
+
+    def _intraday(self, ticker, period, start):
+        self._sleep()
+        df_intra = self._read_frame("intraday", ticker)
+        if start is not None and not df_intra.empty:
+            # [修正] 與 _history 相同：start 沒帶時區時依資料的時區解讀，避免 tz-aware / naive 比較出錯
+            start_ts = pd.Timestamp(start)
+            if df_intra.index.tz is not None and start_ts.tzinfo is None:
+                start_ts = start_ts.tz_localize(df_intra.index.tz)
+            elif df_intra.index.tz is None and start_ts.tzinfo is not None:
+                start_ts = start_ts.tz_convert(None)
+            df_intra = df_intra[df_intra.index >= start_ts]
+        else:
+            df_intra = _trim_period(df_intra, period)
+        meta = self._read_json(os.path.join(self.root, "intraday", f"{ticker.upper()}.meta.json"))
+        return df_intra, meta
+
+    def info(self, ticker):
+        return self._upstream('info', self._info, ticker)
+
+    def _info(self, ticker):
+        self._sleep()
+        return self._read_json(os.path.join(self.root, "info", f"{ticker.upper()}.json"))
+
+    def download(self, tickers, period="1d", group_by="column"):
+        return self._upstream('download', self._download, list(tickers), period, group_by)
+
+    def _download(self, tickers, period, group_by):
+        # 一次下載只算一次延遲，與真實的批次請求相同
+        self._sleep()
+        frames = {}
+        for t in tickers:
+            df = _trim_period(self._read_frame("history", t), period)
+            if not df.empty:
+                frames[t] = df[['Open', 'High', 'Low', 'Close', 'Volume']]
+        if not frames:
+            return pd.DataFrame()
+        raw = pd.concat(frames, axis=1)  # (Ticker, Price) 與 group_by='ticker' 相同
+        if group_by != 'ticker':
+            raw = raw.swaplevel(0, 1, axis=1).sort_index(axis=1)
+        return raw
+
+
+def record_fixtures(tickers, root=DEFAULT_REPLAY_DIR, provider=None, period="2y"):
+    """把真實資料錄製成 ReplayProvider 可用的檔案"""
+    provider = provider or YFinanceProvider()
+    for kind in ("history", "intraday", "info"):
+        os.makedirs(os.path.join(root, kind), exist_ok=True)
+    for t in tickers:
+        t = t.upper()
+        provider.history(t, period=period).to_parquet(os.path.join(root, "history", f"{t}.parquet"))
+        df_intra, meta = provider.intraday(t)
+        df_intra.to_parquet(os.path.join(root, "intraday", f"{t}.parquet"))
+        with open(os.path.join(root, "intraday", f"{t}.meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, default=str)
+        with open(os.path.join(root, "info", f"{t}.json"), "w", encoding="utf-8") as f:
+            json.dump(provider.info(t), f, default=str)
+
+
+_provider = None
+
+
+def get_provider():
+    """依環境變數取得 (並重用) 目前的資料來源"""
+    global _provider
+    if _provider is None:
+        kind = os.environ.get("STOCK_VIP_PROVIDER", "yfinance").lower()
+        if kind == "replay":
+            _provider = ReplayProvider(
+                root=os.environ.get("STOCK_VIP_REPLAY_DIR", DEFAULT_REPLAY_DIR),
+                latency=os.environ.get("STOCK_VIP_REPLAY_LATENCY", 0.0),
+            )
+        else:
+            _provider = YFinanceProvider()
+    return _provider
+
+
+def set_provider(provider):
+    """直接指定資料來源 (壓測腳本用)"""
+    global _provider
+    _provider = provider
@@ -0,0 +1,89 @@
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import pandas as pd
+import streamlit as st
+
+from data.providers import get_provider
+from data.singleflight import single_flight
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 統一報價服務 (宏觀指標 / 匯率 / 使用者自訂代號)
+#  登記表內所有代號每個更新週期只做一次批次下載，
+#  抓不到時沿用上一次成功的值並明確標記 stale，不再回傳 0.0 / 32.5。
+# ─────────────────────────────────────────────────────────────
+
+QUOTE_TTL = 300
+
+MACRO_SYMBOLS = {"VIX": "^VIX", "Gold": "GC=F", "Oil": "CL=F", "BTC": "BTC-USD"}
+FX_SYMBOLS = {"USDTWD": "USDTWD=X"}
+
+# 完全沒有匯率資料時的試算預設值 (畫面上會明確標示)
+FALLBACK_USDTWD = 32.5
+
+
+class Quote(NamedTuple):
+    symbol: str
+    last: Optional[float]          # 最新值
+    change: Optional[float]        # 與前一筆收盤的差
+    change_pct: Optional[float]    # 漲跌幅 (%)
+    as_of: Optional[pd.Timestamp]  # 最新值的K棒時間
+    fetched_at: float              # 本次報價的抓取時間 (epoch 秒)
+    stale: bool                    # True = 本次沒抓到，數值來自上一次成功或完全沒有
+    error: Optional[str] = None
+
+
+# 每個代號上一次成功的報價 (跨 session 共用)
+_last_good = {}
+_last_good_lock = threading.Lock()
+
+
+def get_quote_symbols(extra=()):
+    """登記表 (宏觀 + 匯率) 加上使用者自訂代號，回傳排序後的 tuple 作為快取鍵"""
+    symbols = set(MACRO_SYMBOLS.values()) | set(FX_SYMBOLS.values())
+    symbols |= {s.strip().upper() for s in extra if s and s.strip()}
+    return tuple(sorted(symbols))
+
+
+def _close_matrix(raw, symbols):
+    if raw is None or raw.empty:
+        return pd.DataFrame()
+    if isinstance(raw.columns, pd.MultiIndex):
+        return raw['Close']
+    # 單一代號時沒有 MultiIndex
+    return raw[['Close']].rename(columns={'Close': symbols[0]})
+
+
+def _stale_quote(symbol, now, error):
+    with _last_good_lock:
+        prev = _last_good.get(symbol)
+    if prev is not None:
+        return prev._replace(stale=True, error=error)
+    return Quote(symbol, None, None, None, None, now, True, error)
+
+
+@st.cache_data(ttl=QUOTE_TTL, show_spinner=False)
+def fetch_quote_snapshot(symbols):
+    """一次批次下載所有代號，回傳 {symbol: Quote}"""
+    now = time.time()
+    try:
+        raw = single_flight(('quotes', symbols), get_provider().download, list(symbols), period="5d")
+        closes = _close_matrix(raw, symbols)
+        error = None
+    except Exception as e:
+        closes = pd.DataFrame()
+        error = str(e)
+
+    snapshot = {}
+    for symbol in symbols:
+        col = closes[symbol].dropna() if symbol in closes.columns else pd.Series(dtype=float)
+        if len(col) < 2:
+            snapshot[symbol] = _stale_quote(symbol, now, error or "無資料")
+            continue
+        curr, prev = float(col.iloc[-1]), float(col.iloc[-2])
+        quote = Quote(symbol, curr, curr - prev, (curr - prev) / prev * 100, col.index[-1], now, False)
+        with _last_good_lock:
+            _last_good[symbol] = quote
+        snapshot[symbol] = quote
+    return snapshot
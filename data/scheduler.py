@@ -0,0 +1,223 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 上游請求排程器
+#  所有打到行情來源的呼叫都經過這裡：
+#    - Token bucket 限速 (平均每秒 RATE 次，瞬間最多 BURST 次)
+#    - 同時最多 MAX_CONCURRENCY 個請求在跑
+#    - 網路 / 限流等暫時性錯誤以指數退避 + 隨機抖動 (full jitter) 重試
+#    - 每次呼叫有逾時上限 (從實際開始執行起算)；逾時後仍在跑的請求繼續佔用同時執行名額
+#    - 提供 佇列深度 / 延遲分布 / 重試 / 錯誤 等指標
+# ─────────────────────────────────────────────────────────────
+
+RATE_PER_SECOND = 4.0
+BURST = 8
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+CALL_TIMEOUT = 20.0
+QUEUE_TIMEOUT = 30.0     # [修正] 等待執行名額的上限 (名額被卡住的請求佔滿時不會無限等待)
+
+# 延遲分布的分桶上限 (秒)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class UpstreamTimeout(Exception):
+    pass
+
+
+# [修正] 只有網路 / 逾時 / 限流這類暫時性錯誤才重試；程式錯誤、查無資料等立即拋出
+# (requests / curl_cffi 的例外皆繼承 OSError；各資料來源可再以 retry_on 補充自己的限流例外)
+RETRYABLE_ERRORS = (UpstreamTimeout, ConnectionError, TimeoutError, OSError)
+_NOT_RETRYABLE_OS_ERRORS = (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError)
+
+
+def is_retryable(exc, retry_on=()):
+    """exc 是否為值得重試的暫時性錯誤"""
+    if isinstance(exc, tuple(retry_on)):
+        return True
+    if not isinstance(exc, RETRYABLE_ERRORS) or isinstance(exc, _NOT_RETRYABLE_OS_ERRORS):
+        return False
+    # HTTP 錯誤：只重試 429 與 5xx
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個 token，不足時睡到補滿為止"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class UpstreamScheduler:
+    def __init__(self, rate=RATE_PER_SECOND, burst=BURST, max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 timeout=CALL_TIMEOUT, queue_timeout=QUEUE_TIMEOUT):
+        self.bucket = TokenBucket(rate, burst)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # [修正] 名額在請求「真正結束」時才歸還：逾時而放棄等待的請求仍在背景跑，照樣佔用名額，
+        # 因此同時執行的請求不會超過 max_concurrency，執行緒池也不會有排隊
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='upstream')
+
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._abandoned = 0
+        self._counts = {'calls': 0, 'success': 0, 'retries': 0, 'errors': 0, 'timeouts': 0}
+        self._by_kind = {}
+        self._latency = [0] * len(LATENCY_BUCKETS)
+
+    def _backoff(self, attempt):
+        # full jitter：在 [0, min(max, base * 2^attempt)] 之間隨機
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record_latency(self, seconds):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self._latency[i] += 1
+                return
+
+    def _count(self, kind, field):
+        self._counts[field] += 1
+        kind_counts = self._by_kind.setdefault(kind, {'calls': 0, 'success': 0, 'retries': 0, 'errors': 0, 'timeouts': 0})
+        kind_counts[field] += 1
+
+    def _submit(self, kind, fn, args, kwargs):
+        """
+        取得名額後送進執行緒池，回傳 (future, 放棄旗標, 開始執行的時間)
+        逾時從 fn 實際開始執行才起算，不含等名額 / 等 token 的時間；
+        等名額超過 queue_timeout 則拋出 UpstreamTimeout
+        """
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self._waiting -= 1
+            if acquired:
+                self._running += 1
+        if not acquired:
+            raise UpstreamTimeout(f'{kind} 等待執行名額逾時 ({self.queue_timeout:g}s)')
+
+        started = threading.Event()
+        state = {'abandoned': False}
+
+        def _task():
+            started.set()
+            return fn(*args, **kwargs)
+
+        def _release(_):
+            with self._lock:
+                self._running -= 1
+                if state['abandoned']:
+                    self._abandoned -= 1
+            self._slots.release()
+
+        try:
+            self.bucket.acquire()
+            future = self._pool.submit(_task)
+        except BaseException:
+            _release(None)
+            raise
+        future.add_done_callback(_release)
+        started.wait()
+        return future, state, time.monotonic()
+
+    def call(self, kind, fn, *args, timeout=None, retry_on=(), **kwargs):
+        """
+        經排程執行 fn(*args, **kwargs)；kind 為請求種類 (history / intraday / info / download ...)。
+        只重試暫時性錯誤 (見 is_retryable，retry_on 可補充例外型別)；其他例外或重試用盡後直接拋出。
+        """
+        timeout = timeout or self.timeout
+        with self._lock:
+            self._count(kind, 'calls')
+
+        attempt = 0
+        while True:
+            try:
+                future, state, started = self._submit(kind, fn, args, kwargs)
+            except UpstreamTimeout:
+                # 名額全被卡住的請求佔用：重試只會再等一次，直接回報
+                with self._lock:
+                    self._count(kind, 'timeouts')
+                    self._count(kind, 'errors')
+                raise
+            try:
+                try:
+                    result = future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    with self._lock:
+                        # 放棄等待，但請求仍在背景執行並佔用名額，直到它自己結束
+                        if not future.done():
+                            state['abandoned'] = True
+                            self._abandoned += 1
+                    raise UpstreamTimeout(f'{kind} 逾時 ({timeout:g}s)')
+                with self._lock:
+                    self._record_latency(time.monotonic() - started)
+                    self._count(kind, 'success')
+                return result
+            except Exception as e:
+                retryable = is_retryable(e, retry_on)
+                with self._lock:
+                    self._record_latency(time.monotonic() - started)
+                    if isinstance(e, UpstreamTimeout):
+                        self._count(kind, 'timeouts')
+                    if not retryable or attempt >= self.max_retries:
+                        self._count(kind, 'errors')
+                        raise
+                    self._count(kind, 'retries')
+            # 退避期間不佔名額
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def metrics(self):
+        with self._lock:
+            histogram = {
+                (f'≤{b:g}s' if b != float('inf') else f'>{LATENCY_BUCKETS[-2]:g}s'): n
+                for b, n in zip(LATENCY_BUCKETS, self._latency)
+            }
+            return {
+                'queue_depth': self._waiting,
+                'in_flight': self._running,
+                'abandoned': self._abandoned,
+                **self._counts,
+                'by_kind': {k: dict(v) for k, v in self._by_kind.items()},
+                'latency_histogram': histogram,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """整個 process 共用一個排程器"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UpstreamScheduler()
+        return _scheduler
@@ -0,0 +1,84 @@
+import threading
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] Single-flight：同一時間多個 session 要同一份資料 (同 ticker、同種類)，
+#  只有第一個真的去上游抓，其餘等它抓完直接共用結果。
+#  整個 process 共用一份 (Streamlit 各 session 跑在同一個 process 的不同執行緒)。
+# ─────────────────────────────────────────────────────────────
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def _bump(self, kind, field):
+        stats = self._stats.setdefault(kind, {'calls': 0, 'executed': 0, 'coalesced': 0})
+        stats['calls'] += 1
+        stats[field] += 1
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        key 為 (資料種類, ticker, ...)；相同 key 正在抓取時直接等待其結果。
+        上游拋錯時，所有等待者都會收到同一個例外。
+        """
+        kind = key[0] if isinstance(key, tuple) else key
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                self._bump(kind, 'executed')
+            else:
+                leader = False
+                self._bump(kind, 'coalesced')
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    def stats(self):
+        """各資料種類的 呼叫數 / 實際執行數 / 被合併數"""
+        with self._lock:
+            per_kind = {k: dict(v) for k, v in self._stats.items()}
+            in_flight = len(self._calls)
+        total = {'calls': 0, 'executed': 0, 'coalesced': 0}
+        for v in per_kind.values():
+            for f in total:
+                total[f] += v[f]
+        return {'total': total, 'by_kind': per_kind, 'in_flight': in_flight}
+
+
+_flight = SingleFlight()
+
+
+def single_flight(key, fn, *args, **kwargs):
+    return _flight.do(key, fn, *args, **kwargs)
+
+
+def get_singleflight_stats():
+    return _flight.stats()
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data.providers import get_provider
+from data.singleflight import single_flight
+from data.universe import SECTOR_TICKERS, TICKER_SECTOR
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 全市場快照服務 (熱力圖用)
+#  - 背景執行緒整批下載 S&P 100，向量化算出 價格 / 開盤 / 量 / 漲跌幅 / 成交金額
+#  - Stale-while-revalidate：過期時先回傳舊快照，同時在背景更新
+#  - 所有板塊 / 等權重切換都從同一張表切片，不再各自下載
+# ─────────────────────────────────────────────────────────────
+
+SNAPSHOT_REFRESH_SECONDS = 1800
+
+
+def build_snapshot(raw, universe=SECTOR_TICKERS):
+    """
+    把 download(group_by='ticker') 的結果整理成一張快照表 (index = Ticker)
+    欄位：Sector, Price, Open, Volume, Change (%), Turnover
+    """
+    if raw is None or raw.empty or not isinstance(raw.columns, pd.MultiIndex):
+        return pd.DataFrame()
+
+    # 各欄位轉成 (日期 × ticker) 矩陣，取每檔最後一筆有效值
+    last = {}
+    for field in ('Close', 'Open', 'Volume'):
+        mat = raw.xs(field, axis=1, level=1)
+        last[field] = mat.ffill().iloc[-1]
+
+    snap = pd.DataFrame({
+        'Price': last['Close'].astype(float),
+        'Open': last['Open'].astype(float),
+        'Volume': last['Volume'].astype(float),
+    })
+    snap.index.name = 'Ticker'
+    tickers = [t for tickers in universe.values() for t in tickers]
+    snap = snap.reindex([t for t in tickers if t in snap.index]).dropna(subset=['Price', 'Open'])
+    snap = snap[snap['Open'] != 0]
+
+    snap['Sector'] = snap.index.map(TICKER_SECTOR)
+    snap['Change'] = (snap['Price'] - snap['Open']) / snap['Open'] * 100
+    snap['Turnover'] = np.where(snap['Volume'] > 0, snap['Price'] * snap['Volume'], 1000.0)
+    return snap
+
+
+class MarketSnapshotService:
+    def __init__(self, universe=SECTOR_TICKERS, refresh_seconds=SNAPSHOT_REFRESH_SECONDS):
+        self.universe = universe
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._snapshot = pd.DataFrame()
+        self._updated_at = 0.0
+        self._version = 0
+        self._refreshing = False
+        self.last_error = None
+
+    def _refresh(self):
+        try:
+            tickers = [t for tickers in self.universe.values() for t in tickers]
+            raw = single_flight(('snapshot', 'universe'), get_provider().download,
+                                tickers, period='1d', group_by='ticker')
+            snap = build_snapshot(raw, self.universe)
+            with self._lock:
+                if not snap.empty:
+                    self._snapshot = snap
+                    self._updated_at = time.time()
+                    self._version += 1
+                self.last_error = None
+        except Exception as e:
+            self.last_error = e
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh_async(self):
+        """背景更新 (已在更新中則略過)"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='market-snapshot', daemon=True).start()
+
+    def get(self):
+        """
+        立即回傳目前快照 (可能為空或過期，永不等待網路)，
+        過期或尚無資料時觸發背景更新。
+        回傳 (snapshot, version, updated_at)
+        """
+        with self._lock:
+            snap, version, updated_at = self._snapshot, self._version, self._updated_at
+        if time.time() - updated_at > self.refresh_seconds:
+            self.refresh_async()
+        return snap, version, updated_at
+
+    @property
+    def is_refreshing(self):
+        return self._refreshing
+
+
+@st.cache_resource
+def get_snapshot_service():
+    """整個 process 共用一個快照服務；建立時就開始背景暖機"""
+    service = MarketSnapshotService()
+    service.refresh_async()
+    return service
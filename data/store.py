@@ -0,0 +1,114 @@
+import os
+import tempfile
+
+import pandas as pd
+
+from logic.lookback import bars_to_calendar_days
+
+# 本地日K歷史資料庫：每檔股票一個 Parquet 檔 (data/.cache/history/<provider>/<TICKER>.parquet)
+# 可用環境變數 STOCK_VIP_STORE_DIR 指定其他位置
+STORE_DIR = os.environ.get(
+    "STOCK_VIP_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "history")
+)
+
+# 首次建檔時下載的長度 (未指定 min_bars 時使用，與原本 period="2y" 一致)
+INITIAL_PERIOD = "2y"
+
+# 新抓到的資料若含除權息，舊的還原價格會全部變動，需整段重抓
+_ADJUST_COLS = ['Dividends', 'Stock Splits']
+
+
+def _store_path(ticker, namespace):
+    safe = ticker.upper().replace("/", "_").replace("=", "_").replace("^", "_")
+    # 不同資料來源分開存放，避免重播資料混入真實歷史
+    return os.path.join(STORE_DIR, namespace, f"{safe}.parquet")
+
+
+def load_history(ticker, namespace="yfinance"):
+    """讀取本地已存的日K，沒有則回傳空 DataFrame"""
+    path = _store_path(ticker, namespace)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        # 檔案毀損就當作沒有，下次會整段重建
+        return pd.DataFrame()
+
+
+def save_history(ticker, df, namespace="yfinance"):
+    """寫回本地 (先寫暫存檔再換名，避免多個 session 同時寫入讀到半個檔案)"""
+    if df.empty:
+        return
+    path = _store_path(ticker, namespace)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # [修正] 暫存檔名由 mkstemp 產生，同一 process 內多個執行緒同時寫入也不會共用同一個暫存檔
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _has_new_adjustment(df_new):
+    for col in _ADJUST_COLS:
+        if col in df_new.columns and (df_new[col].fillna(0) != 0).any():
+            return True
+    return False
+
+
+def _start_for(bars, end=None):
+    end = pd.Timestamp.now() if end is None else end
+    return (end - pd.Timedelta(days=bars_to_calendar_days(bars))).strftime("%Y-%m-%d")
+
+
+def update_history(ticker, provider, min_bars=None):
+    """
+    增量更新日K：
+      - 本地沒有資料 → 下載 min_bars 根 (未指定則 INITIAL_PERIOD) 建檔
+      - 本地已有資料 → 只向上游要「最後一根 (含) 之後」的K棒並合併
+        (最後一根會重抓，因為盤中它仍在變動)
+      - 本地根數不足 min_bars → 向前補抓不足的區段
+      - 新K棒出現除權息 → 還原價已改變，整段重抓
+    provider 為 data.providers 的資料來源
+    """
+    ns = provider.name
+    df_old = load_history(ticker, ns)
+
+    if df_old.empty:
+        if min_bars:
+            df = provider.history(ticker, start=_start_for(min_bars))
+        else:
+            df = provider.history(ticker, period=INITIAL_PERIOD)
+        save_history(ticker, df, ns)
+        return df
+
+    last_date = df_old.index[-1]
+    df_new = provider.history(ticker, start=last_date.strftime("%Y-%m-%d"))
+
+    if not df_new.empty and _has_new_adjustment(df_new.loc[df_new.index > last_date]):
+        start = min(df_old.index[0].strftime("%Y-%m-%d"), _start_for(min_bars)) if min_bars else df_old.index[0].strftime("%Y-%m-%d")
+        df = provider.history(ticker, start=start)
+        save_history(ticker, df, ns)
+        return df
+
+    df = df_old
+    if not df_new.empty:
+        df = pd.concat([df_old[df_old.index < df_new.index[0]], df_new])
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+
+    if min_bars and len(df) < min_bars:
+        # [新增] 使用者需要更長的區間：只補抓最早一根之前的部分
+        first_date = df.index[0]
+        df_back = provider.history(ticker, start=_start_for(min_bars - len(df), end=first_date))
+        df_back = df_back[df_back.index < first_date] if not df_back.empty else df_back
+        if not df_back.empty:
+            df = pd.concat([df_back, df]).sort_index()
+
+    if df is not df_old:
+        save_history(ticker, df, ns)
+    return df
@@ -0,0 +1,56 @@
+# ─────────────────────────────────────────────────────────────
+#  板塊清單 (S&P 100 成分股，熱力圖 / 全市場掃描共用)
+# ─────────────────────────────────────────────────────────────
+SECTOR_TICKERS = {
+    "Technology": [
+        "NVDA", "AAPL", "MSFT", "AMD", "INTC", "TSM", "AVGO", "QCOM", "ORCL", "ADBE",
+        "CRM", "CSCO", "TXN", "IBM", "NOW", "MU", "LRCX", "AMAT", "ADI", "PANW"
+    ],
+    "Communication": [
+        "GOOGL", "META", "NFLX", "DIS", "TMUS", "VZ", "CMCSA", "T", "CHTR", "DASH"
+    ],
+    "Consumer Cyclical": [
+        "AMZN", "TSLA", "HD", "MCD", "NKE", "SBUX", "LOW", "BKNG", "TJX", "F",
+        "GM", "LULU", "MAR", "HLT", "CMG"
+    ],
+    "Financial": [
+        "JPM", "BAC", "V", "MA", "WFC", "MS", "GS", "BLK", "C", "AXP",
+        "SPGI", "PGR", "CB", "MMC", "UBS", "SCHW"
+    ],
+    "Healthcare": [
+        "LLY", "UNH", "JNJ", "MRK", "PFE", "ABBV", "TMO", "ABT", "DHR", "BMY",
+        "AMGN", "CVS", "ELV", "GILD", "ISRG", "SYK"
+    ],
+    "Energy": [
+        "XOM", "CVX", "COP", "SLB", "EOG", "MPC", "PSX", "VLO", "OXY", "KMI", "WMB"
+    ],
+    "Industrials": [
+        "CAT", "GE", "LMT", "RTX", "BA", "HON", "UNP", "UPS", "DE", "ADP",
+        "ETN", "WM", "GD", "NOC", "ITW", "EMR"
+    ],
+    "Consumer Defensive": [
+        "WMT", "PG", "COST", "KO", "PEP", "PM", "MO", "EL", "CL", "KMB",
+        "GIS", "SYY", "STZ", "TGT"
+    ],
+    "Utilities": [
+        "NEE", "DUK", "SO", "AEP", "SRE", "D", "PEG", "PCG", "EXC", "XEL"
+    ],
+    "Real Estate": [
+        "PLD", "AMT", "CCI", "EQIX", "PSA", "O", "SPG", "WELL", "DLR", "VICI"
+    ]
+}
+
+
+# ticker → 板塊 對照
+TICKER_SECTOR = {t: sector for sector, tickers in SECTOR_TICKERS.items() for t in tickers}
+
+
+def get_universe(target_sector=None):
+    """回傳 {板塊: [ticker...]}，指定板塊時只回傳該板塊"""
+    if target_sector in SECTOR_TICKERS:
+        return {target_sector: SECTOR_TICKERS[target_sector]}
+    return SECTOR_TICKERS
+
+
+def get_universe_tickers(target_sector=None):
+    return [t for tickers in get_universe(target_sector).values() for t in tickers]
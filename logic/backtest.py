@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+from logic.fees import get_fees
+from logic.indicators import sma
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 均線交叉回測 (向量化)
+#  - 快線 > 慢線 持有，否則空手；訊號於收盤確認、下一根收盤成交 (避免偷看)
+#  - 手續費套用 logic.fees.get_fees (ETF 固定 $3、一般股票 0.1%、賣出加 SEC fee)
+#  - 可買零股 (與計算機相同)，每次進場投入全部現金
+#  - 資金以台幣輸入，依目前匯率換成美元回測，結果可再換回台幣
+# ─────────────────────────────────────────────────────────────
+
+TRADING_DAYS = 252
+
+
+def crossover_position(close, fast, slow):
+    """
+    每根K棒收盤時的持倉 (1 = 持有, 0 = 空手)；沿最後一軸，可 2-D
+    第 t 根收盤確認的訊號於第 t+1 根收盤成交
+    """
+    close = np.asarray(close, dtype=np.float64)
+    fast_ma, slow_ma = sma(close, fast), sma(close, slow)
+    signal = (fast_ma > slow_ma).astype(np.int8)   # NaN 比較為 False → 暖機期空手
+    position = np.zeros_like(signal)
+    position[..., 1:] = signal[..., :-1]
+    return position
+
+
+def simulate(close, position, fees, initial_usd):
+    """
+    依持倉序列模擬單檔全額進出，回傳 (equity, trades)
+      equity：每根K棒收盤的帳戶價值 (美元，持倉以收盤價計)
+      trades：每筆交易的 entry / exit 位置、價格、進出場前後現金
+    固定手續費讓每筆交易的現金成為仿射遞迴 C_j = a_j·C_{j-1} + c_j，
+    以累積乘積 / 累積和一次解出，不需逐筆迴圈。
+    """
+    close = np.asarray(close, dtype=np.float64)
+    position = np.asarray(position, dtype=np.int8)
+    n = close.size
+    buy_fixed, buy_rate = fees['buy_fixed'], fees['buy_rate']
+    sell_fixed, sell_rate = fees['sell_fixed'], fees['sell_rate']
+
+    change = np.diff(position, prepend=0)
+    entries = np.flatnonzero(change == 1)
+    exits = np.flatnonzero(change == -1)
+    # 最後仍持有的部位：以最後一根收盤價「假設出場」計算現金 (不計入勝率)，權益曲線照常按市價
+    open_at_end = len(exits) < len(entries)
+    exit_idx = np.append(exits, n - 1) if open_at_end else exits
+
+    p_in, p_out = close[entries], close[exit_idx]
+    # 每筆：C_j = a_j·(C_{j-1} - buy_fixed) - sell_fixed
+    a = p_out * (1 - sell_rate) / (p_in * (1 + buy_rate))
+    c = -(a * buy_fixed + sell_fixed)
+    growth = np.cumprod(a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cash_after = growth * (initial_usd + np.cumsum(c / growth))
+    cash_before = np.concatenate([[initial_usd], cash_after[:-1]])
+    shares = np.maximum(cash_before - buy_fixed, 0) / (p_in * (1 + buy_rate))
+
+    # 權益曲線：持有期間 = 股數 × 收盤價；空手期間 = 最近一筆出場後的現金
+    equity = np.full(n, float(initial_usd))
+    if len(entries):
+        trade_no = np.cumsum(change == 1) - 1        # 每根K棒屬於第幾筆交易 (-1 = 尚未進場)
+        idx = np.maximum(trade_no, 0)
+        equity = np.where(trade_no >= 0, cash_after[idx], equity)
+        equity = np.where(position == 1, shares[idx] * close, equity)
+
+    trades = {
+        'entry': entries, 'exit': exit_idx, 'entry_price': p_in, 'exit_price': p_out,
+        'shares': shares, 'cash_before': cash_before, 'cash_after': cash_after,
+        'closed': np.arange(len(entries)) < len(exits),
+        'fees': buy_fixed + shares * p_in * buy_rate + np.where(
+            np.arange(len(entries)) < len(exits), sell_fixed + shares * p_out * sell_rate, 0.0),
+    }
+    return equity, trades
+
+
+def curve_stats(equity, initial_usd, dates=None):
+    """權益曲線的 總報酬 / CAGR / 最大回撤 / Sharpe (以投入資金為基準)"""
+    equity = np.concatenate([[initial_usd], np.asarray(equity, dtype=np.float64)])
+    n = equity.size - 1
+    if dates is not None and len(dates) > 1:
+        years = max((dates[-1] - dates[0]).days / 365.25, 1 / TRADING_DAYS)
+    else:
+        years = max(n / TRADING_DAYS, 1 / TRADING_DAYS)
+
+    total_return = equity[-1] / equity[0] - 1
+    cagr = (equity[-1] / equity[0]) ** (1 / years) - 1 if equity[-1] > 0 else -1.0
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    rets = np.diff(equity) / equity[:-1]
+    sharpe = rets.mean() / rets.std() * np.sqrt(TRADING_DAYS) if rets.size > 1 and rets.std() > 0 else 0.0
+    return {
+        'total_return': float(total_return),
+        'cagr': float(cagr),
+        'max_drawdown': float(drawdown.min()),
+        'sharpe': float(sharpe),
+        'years': years,
+        'mean_equity': float(equity.mean()),
+    }
+
+
+def performance(equity, trades, position, initial_usd, dates=None):
+    """CAGR / 最大回撤 / Sharpe / 勝率 / 周轉率 / 持倉比例 等統計 (報酬以投入資金為基準)"""
+    stats = curve_stats(equity, initial_usd, dates)
+    years, mean_equity = stats.pop('years'), stats.pop('mean_equity')
+
+    closed = trades['closed']
+    wins = trades['cash_after'][closed] > trades['cash_before'][closed]
+    notional = (trades['shares'] * trades['entry_price']).sum() + \
+               (trades['shares'] * trades['exit_price'])[closed].sum()
+    stats.update({
+        'trades': int(closed.sum()),
+        'win_rate': float(wins.mean()) if wins.size else float('nan'),
+        # 年化周轉率 = 每年成交金額 / 平均權益
+        'turnover': float(notional / mean_equity / years),
+        'exposure': float(np.mean(position)),
+        'fees': float(trades['fees'].sum()),
+    })
+    return stats
+
+
+def backtest_ma_cross(df, fast, slow, quote_type='EQUITY', initial_twd=100_000, fx_rate=32.5):
+    """
+    單檔均線交叉回測；df 需有 Close (DatetimeIndex)
+    回傳 {'equity': DataFrame(策略 / 買進持有，台幣), 'stats': dict, 'trades': DataFrame}
+    """
+    close = df['Close'].to_numpy(dtype=np.float64)
+    fees = get_fees(quote_type)
+    initial_usd = initial_twd / fx_rate
+
+    position = crossover_position(close, fast, slow)
+    equity, trades = simulate(close, position, fees, initial_usd)
+    stats = performance(equity, trades, position, initial_usd, df.index)
+    stats['fees_twd'] = stats.pop('fees') * fx_rate
+
+    # 買進持有對照 (同樣扣手續費)
+    hold = np.ones_like(position)
+    bh_equity, _ = simulate(close, hold, fees, initial_usd)
+    stats['buy_hold_return'] = float(bh_equity[-1] / initial_usd - 1)
+
+    trade_table = pd.DataFrame({
+        '進場日': df.index[trades['entry']],
+        '進場價': trades['entry_price'],
+        '出場日': df.index[trades['exit']],
+        '出場價': trades['exit_price'],
+        '股數': trades['shares'],
+        '損益 (TWD)': (trades['cash_after'] - trades['cash_before']) * fx_rate,
+        '已平倉': trades['closed'],
+    })
+    curve = pd.DataFrame({'策略': equity * fx_rate, '買進持有': bh_equity * fx_rate}, index=df.index)
+    return {'equity': curve, 'stats': stats, 'trades': trade_table}
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from logic.indicators import DEFAULT_SPEC, sma, ema, macd, rsi, bollinger
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 多檔批次指標
+#  輸入 (ticker × 日期) 的收盤 / 成交量矩陣，沿日期軸一次算完所有股票，
+#  共用 logic.indicators 的底層陣列運算 (單檔與多檔結果一致)。
+# ─────────────────────────────────────────────────────────────
+
+
+def compute_universe_indicators(close, volume=None, spec=None):
+    """
+    close / volume 為 2-D 陣列 (ticker × 日期)，上市較晚者前段可為 NaN。
+    回傳 {欄位名: 2-D 陣列}，欄位與 compute_indicators 相同，另加 Vol_Ratio (量 / 均量)。
+    """
+    spec = DEFAULT_SPEC if spec is None else spec
+    close = np.asarray(close, dtype=np.float64)
+    out = {'Close': close}
+
+    for n in sorted(set(spec.get('ma') or [])):
+        out[f'MA_{n}'] = sma(close, n)
+    for n in sorted(set(spec.get('ema') or [])):
+        out[f'EMA_{n}'] = ema(close, n)
+
+    if spec.get('macd'):
+        out['MACD'], out['Signal'], out['Hist'] = macd(close, *spec['macd'])
+
+    if spec.get('rsi'):
+        out['RSI'] = rsi(close, spec['rsi'])
+
+    if spec.get('bollinger'):
+        out['BB_High'], out['BB_Low'], out['BB_Mid'], out['BB_Width'] = bollinger(close, *spec['bollinger'])
+
+    if volume is not None:
+        volume = np.asarray(volume, dtype=np.float64)
+        out['Volume'] = volume
+        if spec.get('vol_ma'):
+            vol_ma = sma(volume, spec['vol_ma'])
+            out['Vol_MA'] = vol_ma
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out['Vol_Ratio'] = np.where(vol_ma > 0, volume / vol_ma, np.nan)
+    return out
+
+
+def universe_indicators(matrices, spec=None):
+    """
+    fetch_universe_history 的結果 ({'Close': 日期 × ticker, 'Volume': ...}) → 指標矩陣
+    回傳 (tickers, dates, {欄位名: 2-D 陣列})
+    """
+    close = matrices['Close']
+    volume = matrices.get('Volume')
+    values = compute_universe_indicators(
+        close.to_numpy().T,
+        volume.to_numpy().T if volume is not None and not volume.empty else None,
+        spec,
+    )
+    return list(close.columns), close.index, values
+
+
+def latest_table(tickers, values, columns=None):
+    """取每檔最後一根的指標值，回傳 DataFrame (index = Ticker)"""
+    columns = columns or list(values)
+    return pd.DataFrame({c: values[c][:, -1] for c in columns if c in values},
+                        index=pd.Index(tickers, name='Ticker'))
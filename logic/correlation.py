@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+from logic.numeric import rolling_sum
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 相關係數 / Beta 分析
+#  - 報酬矩陣 (ticker × 日期) 以累積和求滾動的 Σx、Σy、Σxy、Σx²，
+#    每個視窗的共變異數只需幾次相減，不必對每個視窗重新計算
+#  - 兩兩相關矩陣：視窗內標準化後做一次矩陣乘法
+#  - 熱力圖排序：平均連結階層式分群的葉節點順序，同群的股票會排在一起
+# ─────────────────────────────────────────────────────────────
+
+CORR_WINDOWS = [20, 60, 120, 250]
+BENCHMARK = 'SPY'
+
+
+def daily_returns(close):
+    """close：(ticker × 日期) 陣列，回傳同形狀的日報酬 (第一天為 NaN)"""
+    close = np.asarray(close, dtype=np.float64)
+    rets = np.full(close.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rets[..., 1:] = close[..., 1:] / close[..., :-1] - 1
+    return rets
+
+
+def rolling_beta_corr(rets, market, window):
+    """
+    每檔對大盤的滾動 beta 與相關係數，回傳 (beta, corr) 皆為 (ticker × 日期)
+    cov = Σxy/n - x̄ȳ、var = Σx²/n - x̄² 皆由滾動和取得
+    """
+    x = np.asarray(rets, dtype=np.float64)
+    m = np.broadcast_to(np.asarray(market, dtype=np.float64), x.shape)
+    n = window
+    sx, sm = rolling_sum(x, n), rolling_sum(m, n)
+    sxm, sxx, smm = rolling_sum(x * m, n), rolling_sum(x * x, n), rolling_sum(m * m, n)
+    cov = sxm / n - (sx / n) * (sm / n)
+    var_x = sxx / n - (sx / n) ** 2
+    var_m = smm / n - (sm / n) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = np.where(var_m > 0, cov / var_m, np.nan)
+        corr = np.where((var_x > 0) & (var_m > 0), cov / np.sqrt(var_x * var_m), np.nan)
+    return beta, np.clip(corr, -1, 1)
+
+
+def correlation_matrix(rets, window):
+    """最後 window 天的兩兩相關矩陣；視窗內有缺值的股票整列為 NaN"""
+    x = np.asarray(rets, dtype=np.float64)[:, -window:]
+    mean = x.mean(axis=1, keepdims=True)
+    std = x.std(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(std > 0, (x - mean) / std, np.nan)
+    return np.clip(z @ z.T / x.shape[1], -1, 1)
+
+
+def cluster_order(corr):
+    """
+    平均連結 (average linkage) 階層式分群，距離 = 1 - 相關係數；
+    合併時把兩群的成員接在一起，最後的順序就是樹狀圖的葉節點順序 (NaN 列排在最後)
+    """
+    valid = np.flatnonzero(np.isfinite(corr).all(axis=1))
+    invalid = np.setdiff1d(np.arange(corr.shape[0]), valid)
+    if valid.size < 3:
+        return np.concatenate([valid, invalid])
+
+    dist = 1 - corr[np.ix_(valid, valid)]
+    np.fill_diagonal(dist, np.inf)
+    members = [[i] for i in range(valid.size)]
+    size = np.ones(valid.size)
+    alive = np.ones(valid.size, dtype=bool)
+    for _ in range(valid.size - 1):
+        a, b = np.unravel_index(np.argmin(dist), dist.shape)
+        # Lance-Williams：新群到其他群的距離 = 兩群距離的加權平均
+        merged = (size[a] * dist[a] + size[b] * dist[b]) / (size[a] + size[b])
+        dist[a], dist[:, a] = merged, merged
+        dist[a, a] = np.inf
+        dist[b], dist[:, b] = np.inf, np.inf
+        members[a] = members[a] + members[b]
+        size[a] += size[b]
+        alive[b] = False
+    root = int(np.flatnonzero(alive)[0])
+    return np.concatenate([valid[members[root]], invalid])
+
+
+def correlation_view(close, window, benchmark=BENCHMARK):
+    """
+    close：DataFrame (日期 × ticker)，可含大盤代號
+    回傳 {'corr': 排序後的相關矩陣 DataFrame, 'beta': 每檔最新 beta / 對大盤相關 DataFrame}
+    """
+    tickers = [t for t in close.columns if t != benchmark]
+    rets = daily_returns(close[tickers].to_numpy().T)
+    corr = correlation_matrix(rets, window)
+    order = cluster_order(corr)
+    ordered = [tickers[i] for i in order]
+    corr_df = pd.DataFrame(corr[np.ix_(order, order)], index=ordered, columns=ordered)
+
+    beta_df = pd.DataFrame(index=pd.Index(tickers, name='Ticker'))
+    if benchmark in close.columns:
+        market = daily_returns(close[benchmark].to_numpy())
+        beta, corr_m = rolling_beta_corr(rets, market, window)
+        beta_df['Beta'] = beta[:, -1]
+        beta_df[f'與 {benchmark} 相關'] = corr_m[:, -1]
+    return {'corr': corr_df, 'beta': beta_df}
+
+
+def _trading_dates(index):
+    """DatetimeIndex → 無時區、只留日期 (當地交易日)"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+def most_correlated(close, target, window, top=10, target_close=None):
+    """
+    與 target 最相關的股票 (依最近 window 天日報酬)
+    target 不在 close 內時，可用 target_close (Series) 依日期對齊後計算
+    """
+    if target_close is not None:
+        # [修正] 兩邊索引時區 / 時間可能不同 (tz-naive vs tz-aware、台股與美股收盤時刻)，統一成無時區的日期再對齊
+        close = close.drop(columns=[target], errors='ignore')
+        close.index = _trading_dates(close.index)
+        target_close = target_close.copy()
+        target_close.index = _trading_dates(target_close.index)
+        close = close.join(target_close.rename(target), how='inner')
+    if target not in close.columns:
+        return pd.Series(dtype=float)
+    rets = daily_returns(close.to_numpy().T)[:, -window:]
+    n = rets.shape[1]
+    x = rets[list(close.columns).index(target)]
+    mean = rets.mean(axis=1, keepdims=True)
+    std = rets.std(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = ((rets - mean) @ (x - x.mean())) / (n * std * x.std())
+    result = pd.Series(corr, index=close.columns).drop([target, BENCHMARK], errors='ignore').dropna()
+    return result.sort_values(ascending=False).head(top)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 長區間圖表的降採樣
+#  - 把 N 根K棒切成約「圖表寬度 (像素)」個區間，每個區間只畫一點 / 一根
+#  - K線：區間內 開 = 第一根開盤、高 = 最高、低 = 最低、收 = 最後一根收盤、量 = 加總
+#  - 線圖 (均線 / MACD / RSI)：Largest-Triangle-Three-Buckets (LTTB)，保留轉折形狀
+#  - 柱狀 (MACD 柱)：取區間內絕對值最大的一根，極值不會被平均掉
+# ─────────────────────────────────────────────────────────────
+
+CHART_POINTS = 600   # 約為手機 2x 螢幕的圖表寬度 (Streamlit 無法在 Python 端取得實際像素)
+
+
+def bucket_edges(n, buckets):
+    """把 0..n 切成 buckets 段的起點 (長度 buckets)"""
+    return np.unique(np.linspace(0, n, buckets + 1).astype(np.int64)[:-1])
+
+
+def lttb(y, threshold, x=None):
+    """
+    Largest-Triangle-Three-Buckets：從 y 中選出 threshold 個點的位置
+    第一點與最後一點固定；其餘每個區間選「與前一選點、下一區間平均點」圍成三角形面積最大的點
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.size
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < edges.size else n
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def downsample_ohlc(df, buckets):
+    """OHLCV 依區間彙整 (區間以第一根的日期為索引)；根數不超過 buckets 時原樣回傳"""
+    if len(df) <= buckets:
+        return df[['Open', 'High', 'Low', 'Close', 'Volume']]
+    starts = bucket_edges(len(df), buckets)
+    ends = np.append(starts[1:], len(df)) - 1
+    return pd.DataFrame({
+        'Open':   df['Open'].to_numpy()[starts],
+        'High':   np.maximum.reduceat(df['High'].to_numpy(), starts),
+        'Low':    np.minimum.reduceat(df['Low'].to_numpy(), starts),
+        'Close':  df['Close'].to_numpy()[ends],
+        'Volume': np.add.reduceat(df['Volume'].to_numpy(dtype=np.float64), starts),
+    }, index=df.index[starts])
+
+
+def downsample_line(series, points):
+    """LTTB 降採樣單條線 (略過暖機期的 NaN)，回傳 (日期, 數值)"""
+    s = series.dropna()
+    idx = lttb(s.to_numpy(), points)
+    return s.index[idx], s.to_numpy()[idx]
+
+
+def downsample_extreme(series, buckets):
+    """每個區間取絕對值最大的一根 (MACD 柱等正負柱狀)，回傳 (日期, 數值)"""
+    s = series.dropna()
+    if len(s) <= buckets:
+        return s.index, s.to_numpy()
+    values = s.to_numpy(dtype=np.float64)
+    starts = bucket_edges(len(values), buckets)
+    # 區間內 |值| 最大者的位置：先依 (區間, |值|) 排序，取每個區間的最後一個
+    group = np.repeat(np.arange(starts.size), np.diff(np.append(starts, len(values))))
+    order = np.lexsort((np.abs(values), group))
+    last = np.append(np.flatnonzero(np.diff(group[order])), len(values) - 1)
+    pick = order[last]
+    return s.index[pick], values[pick]
+
+
+def downsample_chart(df, points=CHART_POINTS, lines=()):
+    """
+    長區間主圖所需的資料：
+      {'ohlc': 彙整後 OHLCV, 'lines': {欄位: (日期, 數值)}, 'hist': (日期, 數值), 'bars': 原始根數}
+    """
+    return {
+        'ohlc': downsample_ohlc(df, points),
+        'lines': {col: downsample_line(df[col], points) for col in lines if col in df.columns},
+        'hist': downsample_extreme(df['Hist'], points) if 'Hist' in df.columns else None,
+        'bars': len(df),
+    }
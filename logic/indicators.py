@@ -1,32 +1,181 @@
-from ta.trend import SMAIndicator
-from ta.volatility import BollingerBands
+import numpy as np
+import pandas as pd
+
+from logic.numeric import rolling_sum
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 統一指標引擎
+#  以宣告式 spec 描述要算哪些指標，一次對 NumPy 陣列算完，回傳單一 DataFrame。
+#  主圖表 / 策略訊號 / Gemini 摘要都讀同一份結果，RSI 等數值不再各算各的。
+#
+#  計算方式與原本的 ta 套件一致：
+#    SMA        rolling mean (滿 window 才有值)
+#    EMA / MACD ewm(span, adjust=False, min_periods=span)
+#    RSI        Wilder 平滑 ewm(alpha=1/n, adjust=False, min_periods=n)
+#    Bollinger  rolling mean ± k × 母體標準差 (ddof=0)
+#
+#  底層函式都沿最後一個軸計算，1-D (單檔) 與 2-D (多檔 × 日期) 皆可使用。
+# ─────────────────────────────────────────────────────────────
+
+DEFAULT_SPEC = {
+    'ma': [5, 10, 20, 30, 60, 120, 200],
+    'ema': [],
+    'macd': (12, 26, 9),
+    'rsi': 14,
+    'bollinger': (20, 2),
+    'vol_ma': 20,
+    'vwap': False,
+}
+
+
+def make_spec(**overrides):
+    """以 DEFAULT_SPEC 為底，覆寫部分設定；設為 None / [] 代表不計算"""
+    spec = dict(DEFAULT_SPEC)
+    spec.update(overrides)
+    return spec
+
+
+# ── 底層陣列運算 (沿 axis=-1) ────────────────────────────────
+
+def _first_valid(x):
+    """每列第一筆非 NaN 的值 (保留維度，可直接廣播)"""
+    idx = np.argmax(~np.isnan(x), axis=-1)[..., None]
+    return np.nan_to_num(np.take_along_axis(x, idx, axis=-1))
+
+
+def sma(x, n):
+    return rolling_sum(x, n) / n
+
+
+def rolling_std(x, n):
+    """母體標準差 (ddof=0)；先減去第一筆以降低大數相減的誤差"""
+    x = np.asarray(x, dtype=np.float64)
+    shifted = x - _first_valid(x)
+    mean = rolling_sum(shifted, n) / n
+    mean_sq = rolling_sum(shifted * shifted, n) / n
+    return np.sqrt(np.clip(mean_sq - mean * mean, 0, None))
+
+
+def ema(x, span=None, alpha=None, min_periods=None):
+    """adjust=False 的指數移動平均 (遞迴部分交給 pandas 的 C 實作)"""
+    x = np.asarray(x, dtype=np.float64)
+    if alpha is None:
+        alpha = 2.0 / (span + 1)
+    if min_periods is None:
+        min_periods = span or 0
+    frame = pd.DataFrame(np.atleast_2d(x).T)
+    out = frame.ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean().to_numpy().T
+    return out.reshape(x.shape)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """回傳 (macd, signal, hist)"""
+    line = ema(close, fast) - ema(close, slow)
+    sig = ema(line, signal)
+    return line, sig, line - sig
+
+
+def rsi(close, n=14):
+    close = np.asarray(close, dtype=np.float64)
+    diff = np.diff(close, axis=-1, prepend=np.nan)
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    # 尚無價格的位置維持 NaN，讓平滑從各檔第一筆價格開始
+    up[np.isnan(close)] = np.nan
+    down[np.isnan(close)] = np.nan
+    avg_up = ema(up, alpha=1.0 / n, min_periods=n)
+    avg_down = ema(down, alpha=1.0 / n, min_periods=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = 100 - 100 / (1 + avg_up / avg_down)
+    out = np.where(avg_down == 0, 100.0, out)
+    return np.where(np.isnan(avg_up), np.nan, out)
+
+
+def bollinger(close, n=20, k=2):
+    """回傳 (high, low, mid, width)"""
+    mid = sma(close, n)
+    std = rolling_std(close, n)
+    high, low = mid + k * std, mid - k * std
+    with np.errstate(divide='ignore', invalid='ignore'):
+        width = (high - low) / mid
+    return high, low, mid, width
+
+
+def vwap(close, volume):
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.cumsum(close * volume, axis=-1) / np.cumsum(volume, axis=-1)
+
+
+# ── 引擎 ─────────────────────────────────────────────────────
+
+def compute_indicators(df, spec=None):
+    """
+    依 spec 一次算完所有指標，回傳新的 DataFrame (原 df 不變)
+    產生欄位：MA_n, EMA_n, MACD/Signal/Hist, RSI, BB_High/BB_Low/BB_Mid/BB_Width, Vol_MA, VWAP
+    """
+    spec = DEFAULT_SPEC if spec is None else spec
+    out = df.copy()
+    if df.empty:
+        return out
+
+    close = df['Close'].to_numpy(dtype=np.float64)
+    cols = {}
+
+    for n in sorted(set(spec.get('ma') or [])):
+        cols[f'MA_{n}'] = sma(close, n)
+    for n in sorted(set(spec.get('ema') or [])):
+        cols[f'EMA_{n}'] = ema(close, n)
+
+    if spec.get('macd'):
+        line, sig, hist = macd(close, *spec['macd'])
+        # 與原本一致：暖機期補 0
+        cols['MACD'] = np.nan_to_num(line)
+        cols['Signal'] = np.nan_to_num(sig)
+        cols['Hist'] = np.nan_to_num(hist)
+
+    if spec.get('rsi'):
+        cols['RSI'] = rsi(close, spec['rsi'])
+
+    if spec.get('bollinger'):
+        cols['BB_High'], cols['BB_Low'], cols['BB_Mid'], cols['BB_Width'] = bollinger(close, *spec['bollinger'])
+
+    if 'Volume' in df.columns:
+        volume = df['Volume'].to_numpy(dtype=np.float64)
+        if spec.get('vol_ma'):
+            cols['Vol_MA'] = sma(volume, spec['vol_ma'])
+        if spec.get('vwap'):
+            cols['VWAP'] = vwap(close, volume)
+
+    for name, values in cols.items():
+        out[name] = values
+    return out
+
+
+# ── 舊介面 (保留相容，內部改用引擎) ──────────────────────────
 
 def calculate_ma(df, ma_list=[5, 10, 20, 30, 60, 120, 200]):
+    close = df['Close'].to_numpy(dtype=np.float64)
     for d in ma_list:
-        df[f'MA_{d}'] = SMAIndicator(df['Close'], window=d).sma_indicator()
+        df[f'MA_{d}'] = sma(close, d)
     return df
 
 def get_strategy_values(df, fast=5, slow=20):
-    fast_val = SMAIndicator(df['Close'], window=fast).sma_indicator().iloc[-1]
-    slow_val = SMAIndicator(df['Close'], window=slow).sma_indicator().iloc[-1]
-    return fast_val, slow_val
+    """優先讀取引擎已算好的 MA 欄位，沒有才現算"""
+    def _last_ma(n):
+        if f'MA_{n}' in df.columns:
+            return df[f'MA_{n}'].iloc[-1]
+        return sma(df['Close'].to_numpy(dtype=np.float64), n)[-1]
+    return _last_ma(fast), _last_ma(slow)
 
 def calculate_bollinger(df, window=20, window_dev=2):
-    indicator_bb = BollingerBands(close=df["Close"], window=window, window_dev=window_dev)
-    df['BB_High'] = indicator_bb.bollinger_hband()
-    df['BB_Low'] = indicator_bb.bollinger_lband()
-    df['BB_Mid'] = indicator_bb.bollinger_mavg()
-    df['BB_Width'] = (df['BB_High'] - df['BB_Low']) / df['BB_Mid']
+    df['BB_High'], df['BB_Low'], df['BB_Mid'], df['BB_Width'] = bollinger(df['Close'].to_numpy(dtype=np.float64), window, window_dev)
     return df
 
 # [新增] 計算 VWAP (成交量加權平均價)
 def calculate_vwap(df):
     if df.empty: return df
     df = df.copy()
-    # 累計成交量
-    df['Cum_Vol'] = df['Volume'].cumsum()
-    # 累計成交金額 (價格 * 成交量)
-    df['Cum_Vol_Price'] = (df['Close'] * df['Volume']).cumsum()
-    # VWAP = 累計成交金額 / 累計成交量
-    df['VWAP'] = df['Cum_Vol_Price'] / df['Cum_Vol']
-    return df
\ No newline at end of file
+    df['VWAP'] = vwap(df['Close'], df['Volume'])
+    return df
@@ -0,0 +1,64 @@
+import math
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 回看長度規劃：依目前啟用的指標算出「最少需要幾根日K」
+#  只抓需要的長度，使用者把圖表拉長時再延伸。
+# ─────────────────────────────────────────────────────────────
+
+DEFAULT_MA_LIST = [5, 10, 20, 30, 60, 120, 200]
+
+# EMA 類指標 (MACD / Wilder RSI) 需要數倍週期才會收斂到與長歷史一致
+EMA_WARMUP_FACTOR = 4
+
+# 技術分析摘要 (Gemini prompt) 至少需要的K棒數
+CONTEXT_BARS = 60
+
+# [修正] 主圖顯示區間 (標籤, K棒數)：由圖上的按鈕在瀏覽器端切換；
+#        只列出已載入歷史涵蓋的區間，更長的區間等使用者要求時再補抓
+CHART_WINDOWS = [('1月', 22), ('3月', 66), ('90日', 90), ('半年', 125), ('1年', 250), ('2年', 500), ('3年', 750)]
+DEFAULT_CHART_DAYS = 90
+
+
+def plan_lookback(ma_list=DEFAULT_MA_LIST, bb_window=20, macd=(12, 26, 9), rsi_window=14,
+                  vol_ma_window=20, chart_days=90, context_bars=CONTEXT_BARS):
+    """
+    回傳需要的日K根數：
+      最長的暖機期 (讓圖表第一根就有完整指標) + 圖表顯示天數
+    """
+    fast, slow, signal = macd
+    warmup = max(
+        max(ma_list) if ma_list else 0,
+        bb_window,
+        vol_ma_window,
+        EMA_WARMUP_FACTOR * (slow + signal),
+        EMA_WARMUP_FACTOR * rsi_window,
+    )
+    return max(warmup + chart_days, context_bars)
+
+
+def covered_windows(bars):
+    """已有 bars 根K棒時可顯示的區間"""
+    return [(label, days) for label, days in CHART_WINDOWS if days <= bars]
+
+
+def next_window(bars):
+    """下一個尚未涵蓋的區間 (標籤, K棒數)；都已涵蓋則為 None"""
+    return next(((label, days) for label, days in CHART_WINDOWS if days > bars), None)
+
+
+def bars_to_calendar_days(bars):
+    """交易日換算日曆天 (每週 5 個交易日，另加假日緩衝)"""
+    return int(math.ceil(bars * 7 / 5 * 1.05)) + 10
+
+
+# yfinance 批次下載只接受固定的 period 字串
+_DOWNLOAD_PERIODS = [('1mo', 30), ('3mo', 92), ('6mo', 183), ('1y', 365), ('2y', 730), ('5y', 1826), ('10y', 3652)]
+
+
+def period_for_bars(bars):
+    """涵蓋 bars 根日K的最短 period 字串 (多檔批次下載用)"""
+    days = bars_to_calendar_days(bars)
+    for period, span in _DOWNLOAD_PERIODS:
+        if span >= days:
+            return period
+    return 'max'
@@ -0,0 +1,25 @@
+import numpy as np
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 共用的陣列數值運算
+#  指標引擎 (logic.indicators) 與相關係數 (logic.correlation) 共用，
+#  沿最後一個軸計算，1-D 與 2-D 皆可使用。
+# ─────────────────────────────────────────────────────────────
+
+
+def rolling_sum(x, n):
+    """長度不足 n 或視窗內含 NaN 的位置為 NaN (多檔矩陣中上市較晚的股票前段為 NaN)"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if n <= 0 or x.shape[-1] < n:
+        return out
+    missing = np.isnan(x)
+    c = np.cumsum(np.where(missing, 0.0, x), axis=-1)
+    m = np.cumsum(missing, axis=-1)
+    out[..., n - 1] = c[..., n - 1]
+    out[..., n:] = c[..., n:] - c[..., :-n]
+    gaps = np.empty(x.shape, dtype=m.dtype)
+    gaps[..., n - 1] = m[..., n - 1]
+    gaps[..., n:] = m[..., n:] - m[..., :-n]
+    out[..., n - 1:][gaps[..., n - 1:] > 0] = np.nan
+    return out
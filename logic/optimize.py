@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from logic.backtest import TRADING_DAYS
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 快慢線參數掃描
+#  - 每檔只算一次累積和，任何週期的均線都是 O(1) 相減取得
+#  - 所有 (fast, slow) 組合排成 (組合數 × 日期) 矩陣一次回測 (與 logic.backtest 同一套成交 / 手續費規則)
+#  - 組合數很多時分段計算，單一矩陣不超過 SWEEP_BLOCK_ELEMENTS 個元素
+#  - [修正] 多檔時以執行緒池分批平行 (大陣列運算時 NumPy 會釋放 GIL)，
+#    不從背景執行緒 fork 子程序 (fork 當下其他執行緒持有的鎖會留在子程序，可能卡死)
+#    背景執行緒收集結果，畫面可隨時讀取目前的部分結果
+# ─────────────────────────────────────────────────────────────
+
+SWEEP_WORKERS = max(1, min(4, (os.cpu_count() or 1)))
+SWEEP_CHUNK = 8                      # 每個任務處理幾檔
+SWEEP_BLOCK_ELEMENTS = 250_000       # (組合數 × 日期) 單段上限，float64 約 2 MB；每段約 6 個同尺寸暫存陣列
+
+
+def make_grid(fast_range, slow_range):
+    """回傳 fast < slow 的所有組合 (fast 陣列, slow 陣列)"""
+    f, s = np.meshgrid(np.asarray(fast_range), np.asarray(slow_range), indexing='ij')
+    keep = f < s
+    return f[keep], s[keep]
+
+
+def ma_from_cumsum(csum, windows):
+    """
+    csum 為前面補 0 的累積和 (長度 T+1)，回傳 (len(windows) × T) 的均線矩陣
+    MA_n[t] = (csum[t+1] - csum[t+1-n]) / n，長度不足處為 NaN
+    """
+    T = csum.size - 1
+    out = np.full((len(windows), T), np.nan)
+    for i, n in enumerate(windows):
+        if n <= T:
+            out[i, n - 1:] = (csum[n:] - csum[:-n]) / n
+    return out
+
+
+def sweep_series(close, fast, slow, fees, initial_usd):
+    """
+    單檔、所有組合一次回測；回傳 {'return', 'sharpe', 'max_drawdown', 'trades'} 各為 (組合數,) 陣列
+    每根K棒的權益為仿射遞迴 E_t = g_t·E_{t-1} + h_t：
+      持有 g = 漲跌比；進場當根 g = 1/(1+買費率), h = -固定費/(1+買費率)；出場當根另乘 (1-賣費率) 並扣固定費
+    以 cumprod / cumsum 解出整個 (組合數 × 日期) 的權益矩陣；組合分段計算以限制記憶體
+    """
+    close = np.asarray(close, dtype=np.float64)
+    close = close[np.isfinite(close)]
+    T = close.size
+    csum = np.concatenate([[0.0], np.cumsum(close)])
+    windows = np.unique(np.concatenate([fast, slow]))
+    row = {n: i for i, n in enumerate(windows)}
+    ma = ma_from_cumsum(csum, windows)
+    fast_rows = np.array([row[n] for n in fast], dtype=np.int64)
+    slow_rows = np.array([row[n] for n in slow], dtype=np.int64)
+
+    ratio = np.ones(T)
+    ratio[1:] = close[1:] / close[:-1]
+    block = max(1, SWEEP_BLOCK_ELEMENTS // max(T, 1))
+    parts = [_sweep_block(ma[fast_rows[i:i + block]] > ma[slow_rows[i:i + block]], ratio, fees, initial_usd)
+             for i in range(0, max(len(fast_rows), 1), block)]
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def _sweep_block(signal, ratio, fees, initial_usd):
+    """一段組合的回測：signal 為 (組合數 × 日期) 的「快線 > 慢線」布林矩陣"""
+    pos = np.zeros(signal.shape, dtype=bool)
+    pos[:, 1:] = signal[:, :-1]
+    prev = np.zeros_like(pos)
+    prev[:, 1:] = pos[:, :-1]
+    entry, exit_ = pos & ~prev, ~pos & prev
+
+    buy_fixed, buy_rate = fees['buy_fixed'], fees['buy_rate']
+    sell_fixed, sell_rate = fees['sell_fixed'], fees['sell_rate']
+
+    # [修正] 盡量就地運算，減少 (組合數 × 日期) 的暫存陣列
+    g = np.where(pos & prev, ratio, 1.0)
+    g[entry] = 1.0 / (1 + buy_rate)
+    np.copyto(g, np.broadcast_to(ratio * (1 - sell_rate), g.shape), where=exit_)
+    h = np.zeros(g.shape)
+    h[entry] = -buy_fixed / (1 + buy_rate)
+    h[exit_] -= sell_fixed
+    del pos, prev, entry
+
+    G = np.cumprod(g, axis=1, out=g)
+    equity = np.divide(h, G, out=h)
+    np.cumsum(equity, axis=1, out=equity)
+    equity += initial_usd
+    equity *= G
+    del g, G
+
+    full = np.concatenate([np.full((equity.shape[0], 1), initial_usd), equity], axis=1)
+    rets = np.diff(full, axis=1) / full[:, :-1]
+    std = rets.std(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, rets.mean(axis=1) / std * np.sqrt(TRADING_DAYS), 0.0)
+    return {
+        'return': equity[:, -1] / initial_usd - 1,
+        'sharpe': sharpe,
+        'max_drawdown': (full / np.maximum.accumulate(full, axis=1) - 1).min(axis=1),
+        'trades': exit_.sum(axis=1),
+    }
+
+
+def _sweep_chunk(closes, fast, slow, fees, initial_usd):
+    """執行緒池的任務：一批股票各自掃描"""
+    return {t: sweep_series(c, fast, slow, fees, initial_usd) for t, c in closes.items()}
+
+
+class SweepJob:
+    """
+    背景掃描工作：start() 後立即返回，畫面以 snapshot() 讀取目前累積的結果
+    多檔結果以「各檔平均」彙整成每個組合一個數字
+    """
+
+    def __init__(self, closes, fast_range, slow_range, fees, initial_usd, workers=SWEEP_WORKERS):
+        self.closes = closes                       # {ticker: 收盤價陣列}
+        self.fast, self.slow = make_grid(fast_range, slow_range)
+        self.fast_range, self.slow_range = list(fast_range), list(slow_range)
+        self.fees = fees
+        self.initial_usd = initial_usd
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._sums = {k: np.zeros(self.fast.size) for k in ('return', 'sharpe', 'max_drawdown', 'trades')}
+        self._done = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    @property
+    def total(self):
+        return len(self.closes)
+
+    @property
+    def running(self):
+        return self.started_at is not None and self.finished_at is None
+
+    def start(self):
+        self.started_at = time.time()
+        threading.Thread(target=self._run, daemon=True, name='sweep').start()
+        return self
+
+    def _collect(self, result):
+        with self._lock:
+            for stats in result.values():
+                for k in self._sums:
+                    self._sums[k] += np.nan_to_num(stats[k])
+                self._done += 1
+
+    def _run(self):
+        try:
+            tickers = list(self.closes)
+            chunks = [tickers[i:i + SWEEP_CHUNK] for i in range(0, len(tickers), SWEEP_CHUNK)]
+            if len(chunks) <= 1 or self.workers <= 1:
+                # 單批 (或單核) 直接在本執行緒算
+                for chunk in chunks:
+                    self._collect(_sweep_chunk({t: self.closes[t] for t in chunk},
+                                               self.fast, self.slow, self.fees, self.initial_usd))
+            else:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sweep') as pool:
+                    futures = [pool.submit(_sweep_chunk, {t: self.closes[t] for t in chunk},
+                                           self.fast, self.slow, self.fees, self.initial_usd)
+                               for chunk in chunks]
+                    for future in as_completed(futures):
+                        self._collect(future.result())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.time()
+
+    def snapshot(self):
+        """
+        回傳目前的彙整結果：{'done', 'total', 'grid': {指標: (fast × slow) 矩陣}}
+        矩陣列為 fast_range、欄為 slow_range，fast >= slow 的位置為 NaN
+        """
+        with self._lock:
+            done = self._done
+            means = {k: v / done if done else v * np.nan for k, v in self._sums.items()}
+        grid = {}
+        f_pos = {n: i for i, n in enumerate(self.fast_range)}
+        s_pos = {n: j for j, n in enumerate(self.slow_range)}
+        fi = np.array([f_pos[n] for n in self.fast])
+        sj = np.array([s_pos[n] for n in self.slow])
+        for k, v in means.items():
+            mat = np.full((len(self.fast_range), len(self.slow_range)), np.nan)
+            mat[fi, sj] = v
+            grid[k] = mat
+        return {'done': done, 'total': self.total, 'grid': grid}
+
+    def best(self, metric='sharpe'):
+        """目前最佳的 (fast, slow, 數值)"""
+        with self._lock:
+            if not self._done:
+                return None
+            values = self._sums[metric] / self._done
+        i = int(np.nanargmax(values))
+        return int(self.fast[i]), int(self.slow[i]), float(values[i])
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from logic.backtest import crossover_position, curve_stats
+from logic.fees import get_fees
+from logic.indicators import rolling_std
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 多檔組合回測 (共用現金 + 定期再平衡)
+#  - 輸入對齊好的 (日期 × ticker) 收盤矩陣，所有股票同時以陣列運算
+#  - 只在再平衡日逐次計算 (一年 12 / 52 次)，兩次之間持股不變，權益 = 現金 + 股數 · 價格矩陣
+#  - 每筆買賣依 logic.fees.get_fees 扣手續費 (ETF 固定費 / 一般股票費率 / 賣出 SEC fee)
+#  - 所有規則都從慢線暖機結束後的同一天開始，策略與等權基準比較的是同一段期間
+# ─────────────────────────────────────────────────────────────
+
+REBALANCE_FREQ = {'每週': 'W', '每月': 'M', '每季': 'Q'}
+RULES = {'ma_cross': '快線 > 慢線才持有', 'hold_all': '全部持有 (等權基準)'}
+VOL_WINDOW = 20
+REBALANCE_DRIFT = 0.2    # [新增] 權重偏離目標不到目標的 20% 的持股不調整，避免每次再平衡都有零碎交易
+
+
+def rebalance_points(dates, freq, start=0):
+    """每個週期的第一個交易日 (位置)，從 start 開始"""
+    periods = pd.DatetimeIndex(dates).tz_localize(None).to_period(freq)
+    first = np.flatnonzero(np.concatenate([[True], periods[1:] != periods[:-1]]))
+    points = first[first >= start]
+    return points if points.size and points[0] == start else np.concatenate([[start], points])
+
+
+def target_weights(eligible, vol, sizing, max_weight):
+    """
+    再平衡日的目標權重 (ticker,)；eligible 為該日可持有的布林陣列
+    equal：符合條件者等權；inverse_vol：依近 20 日報酬波動度的倒數分配
+    """
+    if sizing == 'inverse_vol':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw = np.nan_to_num(np.where(eligible & (vol > 0), 1 / vol, 0.0))
+    else:
+        raw = eligible.astype(np.float64)
+    total = raw.sum()
+    weights = raw / total if total > 0 else raw
+    if max_weight:
+        weights = np.minimum(weights, max_weight)
+    return weights
+
+
+def backtest_portfolio(close, fast=5, slow=20, rule='ma_cross', freq='M', sizing='equal',
+                       max_weight=None, quote_types=None, initial_twd=1_000_000, fx_rate=32.5,
+                       drift=REBALANCE_DRIFT):
+    """
+    close：DataFrame (日期 × ticker)，上市較晚者前段為 NaN
+    drift：已持有且權重偏離目標小於「目標權重 × drift」的股票，該次再平衡不交易 (出清與新建倉不受限)
+    回傳 {'equity': Series (TWD), 'stats': dict, 'weights': DataFrame (每次再平衡後的權重)}
+    """
+    tickers = list(close.columns)
+    dates = close.index
+    prices = close.to_numpy(dtype=np.float64).T          # (ticker × 日期)
+    n_tickers, n_dates = prices.shape
+    quote_types = quote_types or {}
+    fee_list = [get_fees(quote_types.get(t, 'EQUITY')) for t in tickers]
+    buy_fixed = np.array([f['buy_fixed'] for f in fee_list])
+    buy_rate = np.array([f['buy_rate'] for f in fee_list])
+    sell_fixed = np.array([f['sell_fixed'] for f in fee_list])
+    sell_rate = np.array([f['sell_rate'] for f in fee_list])
+
+    tradable = np.isfinite(prices)
+    if rule == 'ma_cross':
+        eligible_all = crossover_position(prices, fast, slow).astype(bool) & tradable
+    else:
+        eligible_all = tradable
+    # [修正] 起始日不隨規則改變，否則等權基準會多算暖機期那一段
+    start = min(slow, n_dates - 1)
+    points = rebalance_points(dates, freq, start)
+
+    returns = np.full(prices.shape, np.nan)
+    returns[:, 1:] = prices[:, 1:] / prices[:, :-1] - 1
+    vol = rolling_std(returns, VOL_WINDOW)
+
+    cash = initial_twd / fx_rate
+    shares = np.zeros(n_tickers)
+    equity = np.full(n_dates, cash)
+    total_fees = traded = 0.0
+    n_trades = 0
+    weight_rows = []
+    held_counts = []
+    px = np.nan_to_num(prices)
+
+    for i, t in enumerate(points):
+        end = points[i + 1] if i + 1 < len(points) else n_dates
+        p = px[:, t]
+        value = cash + shares @ p
+        weights = target_weights(eligible_all[:, t], vol[:, t], sizing, max_weight)
+
+        # [新增] 偏離不大的既有持股維持原股數，只交易其餘股票
+        with np.errstate(divide='ignore', invalid='ignore'):
+            current = np.where(value > 0, shares * p / value, 0.0)
+        # [修正] 以相對目標的比例判斷，持股檔數多、單檔目標權重小時仍會再平衡
+        hold = (shares > 0) & (weights > 0) & (np.abs(weights - current) < drift * weights)
+        held_value = shares[hold] @ p[hold]
+
+        # 兩段估算：先以總值算目標與手續費，再扣掉手續費重算，確保現金不為負
+        budget = value
+        for _ in range(2):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                target = np.where(p > 0, weights * budget / p, 0.0)
+            target[hold] = shares[hold]
+            # 維持不動的持股若偏高，其餘股票依比例縮小，總額不超過預算
+            trade_value = target[~hold] @ p[~hold]
+            if trade_value > 0 and held_value + trade_value > budget:
+                target[~hold] *= max(budget - held_value, 0.0) / trade_value
+            delta = target - shares
+            buys, sells = delta > 1e-9, delta < -1e-9
+            notional = np.abs(delta) * p
+            fees = (np.where(buys, buy_fixed + notional * buy_rate, 0.0)
+                    + np.where(sells, sell_fixed + notional * sell_rate, 0.0)).sum()
+            budget = value - fees
+
+        cash = value - fees - target @ p
+        shares = target
+        total_fees += fees
+        traded += notional.sum()
+        n_trades += int(buys.sum() + sells.sum())
+        weight_rows.append(weights)
+        held_counts.append(int(np.count_nonzero(shares > 0)))
+        equity[t:end] = cash + shares @ px[:, t:end]
+
+    eq = equity[start:]
+    initial_usd = initial_twd / fx_rate
+    stats = curve_stats(eq, initial_usd, dates[start:])
+    years, mean_equity = stats.pop('years'), stats.pop('mean_equity')
+    stats.update({
+        'trades': n_trades,
+        'rebalances': len(points),
+        'turnover': float(traded / mean_equity / years),
+        'fees_twd': float(total_fees * fx_rate),
+        # [修正] 以再平衡後實際持有 (股數 > 0) 的檔數計
+        'avg_holdings': float(np.mean(held_counts)) if held_counts else 0.0,
+    })
+    weights = pd.DataFrame(weight_rows, index=dates[points], columns=tickers)
+    return {'equity': pd.Series(eq * fx_rate, index=dates[start:]), 'stats': stats, 'weights': weights}
@@ -1,91 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 規則門檻 (單檔摘要與全市場選股共用)
+# ─────────────────────────────────────────────────────────────
+VOL_EXPLODE_RATIO = 2.0   # 量 / 均量 > 2 → 爆量
+VOL_WARM_RATIO = 1.0      # > 1 → 溫和
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+BB_SQUEEZE_WIDTH = 0.10   # 通道寬度 < 10% → 壓縮
+
+
+def classify_signals(close, fast_ma, slow_ma, volume, vol_ma, hist, rsi, bb_high, bb_low, bb_width):
+    """
+    [新增] generate_ai_summary 的判斷規則向量化版本
+    各參數可為純量或同形狀陣列 (多檔最後一根 / 單檔整段歷史)，回傳 {狀態名: 陣列}
+    """
+    close, fast_ma, slow_ma = (np.asarray(a, dtype=np.float64) for a in (close, fast_ma, slow_ma))
+    volume, vol_ma, hist, rsi = (np.asarray(a, dtype=np.float64) for a in (volume, vol_ma, hist, rsi))
+    bb_high, bb_low, bb_width = (np.asarray(a, dtype=np.float64) for a in (bb_high, bb_low, bb_width))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_ratio = np.where(vol_ma > 0, volume / vol_ma, 0.0)
+
+    trend = np.select(
+        [(close > fast_ma) & (fast_ma > slow_ma), (close < fast_ma) & (fast_ma < slow_ma)],
+        ['多頭', '空頭'], default='盤整')
+    vol = np.select([vol_ratio > VOL_EXPLODE_RATIO, vol_ratio > VOL_WARM_RATIO], ['爆量', '溫和'], default='一般')
+    macd = np.where(hist > 0, '多方', '空方')
+    rsi_state = np.select([rsi > RSI_OVERBOUGHT, rsi < RSI_OVERSOLD], ['過熱', '超賣'], default='中性')
+    bb = np.select(
+        [close > bb_high, close < bb_low, bb_width < BB_SQUEEZE_WIDTH],
+        ['突破上緣', '跌破下緣', '壓縮'], default='正常')
+
+    return {'trend': trend, 'vol': vol, 'macd': macd, 'rsi': rsi_state, 'bb': bb, 'vol_ratio': vol_ratio}
+
+
+def screen_universe(tickers, values, fast, slow, sectors=None):
+    """
+    [新增] 全市場選股：values 為 logic.batch.compute_universe_indicators 的結果，
+    對每檔最後一根套用同一組規則，回傳一張可排序 / 篩選的表 (index = Ticker)
+    """
+    last = {k: v[:, -1] for k, v in values.items()}
+    n = len(tickers)
+    nan = np.full(n, np.nan)
+    states = classify_signals(
+        last['Close'], last[f'MA_{fast}'], last[f'MA_{slow}'],
+        last.get('Volume', nan), last.get('Vol_MA', nan), np.nan_to_num(last.get('Hist', nan)),
+        last.get('RSI', nan), last.get('BB_High', nan), last.get('BB_Low', nan), last.get('BB_Width', nan),
+    )
+    prev_close = values['Close'][:, -2] if values['Close'].shape[-1] > 1 else nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (last['Close'] / prev_close - 1) * 100
+
+    table = pd.DataFrame({
+        'Sector': [sectors.get(t, '') for t in tickers] if sectors else '',
+        'Close': last['Close'],
+        'Change %': change,
+        '趨勢': states['trend'],
+        'RSI': last.get('RSI', nan),
+        'RSI 狀態': states['rsi'],
+        '量比': states['vol_ratio'],
+        '量能': states['vol'],
+        'MACD': states['macd'],
+        '布林': states['bb'],
+        'BB_Width': last.get('BB_Width', nan),
+    }, index=pd.Index(tickers, name='Ticker'))
+    # 資料不足 (慢線尚未成形) 的代號不列入
+    return table[np.isfinite(last[f'MA_{slow}'])]
+
+
+def signal_series(df, fast, slow):
+    """
+    [新增] 整段歷史每一根K棒的狀態 (index 與 df 相同)
+    欄位：trend / vol / macd / rsi / bb / vol_ratio
+    """
+    def _col(name, default=np.nan):
+        return df[name].to_numpy(dtype=np.float64) if name in df.columns else np.full(len(df), default)
+
+    states = classify_signals(
+        _col('Close'), _col(f'MA_{fast}'), _col(f'MA_{slow}'),
+        _col('Volume'), _col('Vol_MA'), np.nan_to_num(_col('Hist', 0.0)),
+        _col('RSI'), _col('BB_High', 0.0), _col('BB_Low', 0.0), _col('BB_Width', 0.0),
+    )
+    return pd.DataFrame(states, index=df.index)
+
+
+def regime_segments(states):
+    """連續相同狀態合併成區段，回傳 [(起始位置, 結束位置, 狀態), ...] (結束位置含)"""
+    states = np.asarray(states)
+    if states.size == 0:
+        return []
+    starts = np.concatenate([[0], np.flatnonzero(states[1:] != states[:-1]) + 1])
+    ends = np.concatenate([starts[1:] - 1, [states.size - 1]])
+    return [(int(s), int(e), states[s]) for s, e in zip(starts, ends)]
+
+
+# 各狀態對應的卡片文字 / 底色
+TREND_VIEW = {
+    '多頭': ("🚀 火力全開！(多頭)", "bg-up", "均線向上，順勢操作"),
+    '空頭': ("🐻 熊出沒注意 (空頭)", "bg-down", "均線蓋頭，保守為宜"),
+    '盤整': ("💤 睡覺行情 (盤整)", "bg-gray", "多空不明，建議觀望"),
+}
+VOL_VIEW = {'爆量': ("🔥 資金派對 (爆量)", "bg-down"), '溫和': ("💧 人氣回溫", "bg-blue"), '一般': ("❄️ 冷冷清清", "bg-gray")}
+MACD_VIEW = {'多方': ("🐂 牛軍集結", "bg-up"), '空方': ("📉 空軍壓境", "bg-down")}
+RSI_VIEW = {'過熱': ("🔥 太燙了！(過熱)", "bg-down"), '超賣': ("🧊 跌過頭囉 (超賣)", "bg-up"), '中性': ("⚖️ 多空拔河", "bg-gray")}
+BB_TEXT = {
+    '突破上緣': "股價突破布林通道上緣，多頭氣勢極強，但需提防短線乖離過大回檔。",
+    '跌破下緣': "股價跌破布林通道下緣，短線超賣，隨時可能出現技術性反彈。",
+    '壓縮': "布林通道目前極度壓縮，顯示變盤在即，請密切注意突破方向！",
+    '正常': "",
+}
+
+
 def generate_ai_summary(ticker, last_row, strat_fast_val, strat_slow_val):
-    trend_status = "盤整"
-    rsi_status = "中性"
-    vol_status = "一般"
-    macd_status = "不明"
-    bb_status = "正常"
-
-    # 1. 趨勢判斷
-    if last_row['Close'] > strat_fast_val > strat_slow_val:
-        trend_msg = "🚀 火力全開！(多頭)"
-        trend_bg = "bg-up"
-        trend_desc = "均線向上，順勢操作"
-        trend_status = "多頭"
-    elif last_row['Close'] < strat_fast_val < strat_slow_val:
-        trend_msg = "🐻 熊出沒注意 (空頭)"
-        trend_bg = "bg-down"
-        trend_desc = "均線蓋頭，保守為宜"
-        trend_status = "空頭"
-    else:
-        trend_msg = "💤 睡覺行情 (盤整)"
-        trend_bg = "bg-gray"
-        trend_desc = "多空不明，建議觀望"
-
-    # 2. 量能判斷
-    vol_r = last_row['Volume'] / last_row['Vol_MA'] if last_row['Vol_MA'] > 0 else 0
-    if vol_r > 2.0:
-        v_msg = "🔥 資金派對 (爆量)"
-        v_bg = "bg-down"
-        vol_status = "爆量"
-    elif vol_r > 1.0:
-        v_msg = "💧 人氣回溫"
-        v_bg = "bg-blue"
-        vol_status = "溫和"
-    else:
-        v_msg = "❄️ 冷冷清清"
-        v_bg = "bg-gray"
-
-    # 3. MACD 判斷
-    hist_val = last_row.get('Hist', 0)
-    if hist_val > 0:
-        m_msg = "🐂 牛軍集結"
-        m_bg = "bg-up"
-        macd_status = "多方"
-    else:
-        m_msg = "📉 空軍壓境"
-        m_bg = "bg-down"
-        macd_status = "空方"
+    # [修正] 判斷改用 classify_signals (與歷史訊號 / 選股同一套規則)，這裡只是最後一根的檢視
+    states = classify_signals(
+        last_row['Close'], strat_fast_val, strat_slow_val,
+        last_row['Volume'], last_row['Vol_MA'], last_row.get('Hist', 0), last_row['RSI'],
+        last_row.get('BB_High', 0), last_row.get('BB_Low', 0), last_row.get('BB_Width', 0),
+    )
+    trend_status, vol_status, macd_status, rsi_status, bb_status = (
+        states[k].item() for k in ('trend', 'vol', 'macd', 'rsi', 'bb'))
+    vol_r = float(states['vol_ratio'])
 
-    # 4. RSI 判斷
+    trend_msg, trend_bg, trend_desc = TREND_VIEW[trend_status]
+    v_msg, v_bg = VOL_VIEW[vol_status]
+    m_msg, m_bg = MACD_VIEW[macd_status]
+    r_msg, r_bg = RSI_VIEW[rsi_status]
     r_val = last_row['RSI']
-    if r_val > 70:
-        r_msg = "🔥 太燙了！(過熱)"
-        r_bg = "bg-down"
-        rsi_status = "過熱"
-    elif r_val < 30:
-        r_msg = "🧊 跌過頭囉 (超賣)"
-        r_bg = "bg-up"
-        rsi_status = "超賣"
-    else:
-        r_msg = "⚖️ 多空拔河"
-        r_bg = "bg-gray"
-        
-    # [新增] 5. 布林通道判讀 (只在 AI 文字中呈現)
-    bb_high = last_row.get('BB_High', 0)
-    bb_low = last_row.get('BB_Low', 0)
-    bb_width = last_row.get('BB_Width', 0)
-    close = last_row['Close']
-    
-    bb_text = ""
-    if close > bb_high:
-        bb_text = "股價突破布林通道上緣，多頭氣勢極強，但需提防短線乖離過大回檔。"
-    elif close < bb_low:
-        bb_text = "股價跌破布林通道下緣，短線超賣，隨時可能出現技術性反彈。"
-    elif bb_width < 0.10: # 通道壓縮小於 10%
-        bb_text = "布林通道目前極度壓縮，顯示變盤在即，請密切注意突破方向！"
-
-    # 6. 生成建議文字
+
+    # 布林通道判讀 (只在 AI 文字中呈現)
+    bb_text = BB_TEXT[bb_status]
+
+    # 生成建議文字
     suggestion = ""
     if trend_status == "多頭":
         suggestion += f"目前 {ticker} 呈現多頭排列，均線向上發散。"
         if rsi_status == "過熱":
-            suggestion += "惟 RSI 進入過熱區 (>70)，" + ("且突破布林上緣，" if close > bb_high else "") + "短線可能有獲利了結賣壓，不宜過度追價。"
+            suggestion += "惟 RSI 進入過熱區 (>70)，" + ("且突破布林上緣，" if bb_status == '突破上緣' else "") + "短線可能有獲利了結賣壓，不宜過度追價。"
         else:
             suggestion += "RSI 動能健康，" + bb_text + "可續抱或順勢操作。"
     elif trend_status == "空頭":
         suggestion += f"目前 {ticker} 呈現空頭排列，均線蓋頭反壓。"
         if rsi_status == "超賣":
-            suggestion += "但 RSI 已進入超賣區 (<30)，" + ("且觸及布林下緣，" if close < bb_low else "") + "隨時有機會出現反彈，搶短手腳要快。"
+            suggestion += "但 RSI 已進入超賣區 (<30)，" + ("且觸及布林下緣，" if bb_status == '跌破下緣' else "") + "隨時有機會出現反彈，搶短手腳要快。"
         else:
             suggestion += "技術面偏弱，建議多看少做。"
     else:
@@ -100,4 +159,4 @@ def generate_ai_summary(ticker, last_row, strat_fast_val, strat_slow_val):
         'macd': {'msg': m_msg, 'bg': m_bg, 'val': last_row.get('MACD', 0), 'status': macd_status},
         'rsi': {'msg': r_msg, 'bg': r_bg, 'val': r_val, 'status': rsi_status},
         'suggestion': suggestion
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,367 @@
+import json
+import math
+from collections import deque
+
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 串流指標：每來一根新K棒 O(1) 更新，不必整段重算
+#  先用歷史資料 seed 一次，之後逐根 update。
+#  數值與 logic.indicators 的批次版本一致 (同樣的暖機期 / NaN 規則)。
+#  所有狀態可 to_dict() / from_dict() 序列化，快取被清掉後可直接還原。
+# ─────────────────────────────────────────────────────────────
+
+NAN = float('nan')
+
+
+class StreamingIndicator:
+    """共用介面：update(x) 回傳最新值；value 為目前值；seed(iterable) 批次灌入歷史"""
+
+    kind = 'base'
+
+    def update(self, x):
+        raise NotImplementedError
+
+    def seed(self, values):
+        for x in values:
+            self.update(x)
+        return self
+
+    @property
+    def value(self):
+        raise NotImplementedError
+
+    def to_dict(self):
+        state = {k: (list(v) if isinstance(v, deque) else v) for k, v in self.__dict__.items()}
+        return {'kind': self.kind, 'state': state}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls.__new__(cls)
+        for k, v in data['state'].items():
+            obj.__dict__[k] = v
+        obj._restore()
+        return obj
+
+    def _restore(self):
+        """from_dict 後把 list 轉回 deque 等"""
+        pass
+
+
+def _is_nan(x):
+    return x is None or math.isnan(x)
+
+
+class StreamingSMA(StreamingIndicator):
+    """[修正] 視窗內有 NaN 時為 NaN，NaN 移出視窗後恢復 (與批次版 rolling_sum 相同)"""
+
+    kind = 'sma'
+
+    def __init__(self, n):
+        self.n = n
+        self.window = deque(maxlen=n)
+        self.total = 0.0
+        self.missing = 0         # 視窗內 NaN 的個數 (NaN 不計入 total)
+
+    def update(self, x):
+        if len(self.window) == self.n:
+            old = self.window[0]
+            if _is_nan(old):
+                self.missing -= 1
+            else:
+                self.total -= old
+        self.window.append(x)
+        if _is_nan(x):
+            self.missing += 1
+        else:
+            self.total += x
+        return self.value
+
+    @property
+    def value(self):
+        return self.total / self.n if len(self.window) == self.n and not self.missing else NAN
+
+    def _restore(self):
+        self.window = deque(self.window, maxlen=self.n)
+
+
+class StreamingEMA(StreamingIndicator):
+    """
+    adjust=False 的 EMA，與 pandas ewm(adjust=False, ignore_na=False) 相同：
+    前段 NaN 略過；[修正] 中段 NaN 時舊值的權重照樣逐根衰減 (old_wt × (1-alpha))，
+    缺值之後的第一筆以 (old_wt·ema + alpha·x) / (old_wt + alpha) 合併
+    """
+
+    kind = 'ema'
+
+    def __init__(self, span=None, alpha=None, min_periods=None):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1)
+        self.min_periods = min_periods if min_periods is not None else (span or 0)
+        self.count = 0
+        self.ema = None
+        self.old_wt = 1.0
+
+    def update(self, x):
+        if self.ema is None:
+            if not _is_nan(x):
+                self.ema, self.count = x, 1
+            return self.value
+        self.old_wt *= 1 - self.alpha
+        if not _is_nan(x):
+            self.ema = (self.old_wt * self.ema + self.alpha * x) / (self.old_wt + self.alpha)
+            self.old_wt = 1.0
+            self.count += 1
+        return self.value
+
+    @property
+    def value(self):
+        return self.ema if self.ema is not None and self.count >= self.min_periods else NAN
+
+    def _restore(self):
+        self.__dict__.setdefault('old_wt', 1.0)
+
+
+class StreamingMACD(StreamingIndicator):
+    """value 為 (macd, signal, hist)；暖機期為 NaN (批次版顯示時補 0)"""
+
+    kind = 'macd'
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+
+    def update(self, x):
+        line = self.fast.update(x) - self.slow.update(x)
+        self.signal.update(line)
+        return self.value
+
+    @property
+    def value(self):
+        line = self.fast.value - self.slow.value
+        sig = self.signal.value
+        return line, sig, line - sig
+
+    def to_dict(self):
+        return {'kind': self.kind, 'state': {k: getattr(self, k).to_dict() for k in ('fast', 'slow', 'signal')}}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls.__new__(cls)
+        for k, v in data['state'].items():
+            setattr(obj, k, StreamingEMA.from_dict(v))
+        return obj
+
+
+class StreamingRSI(StreamingIndicator):
+    """Wilder RSI (alpha = 1/n)"""
+
+    kind = 'rsi'
+
+    def __init__(self, n=14):
+        self.n = n
+        self.prev = None
+        self.avg_up = StreamingEMA(alpha=1.0 / n, min_periods=n)
+        self.avg_down = StreamingEMA(alpha=1.0 / n, min_periods=n)
+
+    def update(self, x):
+        self.prev, prev = x, self.prev
+        if _is_nan(x):
+            # [修正] 尚無價格的位置不進入平滑 (與批次版相同)
+            self.avg_up.update(NAN)
+            self.avg_down.update(NAN)
+            return self.value
+        # 第一根 (或前一根為 NaN) 沒有前值，漲跌都記 0 (與批次版 diff 後 NaN→0 相同)
+        diff = 0.0 if _is_nan(prev) else x - prev
+        self.avg_up.update(diff if diff > 0 else 0.0)
+        self.avg_down.update(-diff if diff < 0 else 0.0)
+        return self.value
+
+    @property
+    def value(self):
+        up, down = self.avg_up.value, self.avg_down.value
+        if math.isnan(up):
+            return NAN
+        if down == 0:
+            return 100.0
+        return 100 - 100 / (1 + up / down)
+
+    def to_dict(self):
+        return {'kind': self.kind, 'state': {
+            'n': self.n, 'prev': self.prev,
+            'avg_up': self.avg_up.to_dict(), 'avg_down': self.avg_down.to_dict(),
+        }}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls.__new__(cls)
+        state = data['state']
+        obj.n, obj.prev = state['n'], state['prev']
+        obj.avg_up = StreamingEMA.from_dict(state['avg_up'])
+        obj.avg_down = StreamingEMA.from_dict(state['avg_down'])
+        return obj
+
+
+class StreamingBollinger(StreamingIndicator):
+    """滑動視窗的累計和 / 平方和，value 為 (high, low, mid, width)；視窗內有 NaN 時為 NaN"""
+
+    kind = 'bollinger'
+
+    def __init__(self, n=20, k=2):
+        self.n = n
+        self.k = k
+        self.window = deque(maxlen=n)
+        self.ref = None          # 以第一筆有效值為基準位移，降低大數相減誤差
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.missing = 0
+
+    def update(self, x):
+        if self.ref is None and not _is_nan(x):
+            self.ref = x
+        if len(self.window) == self.n:
+            old = self.window[0]
+            if _is_nan(old):
+                self.missing -= 1
+            else:
+                self.total -= old
+                self.total_sq -= old * old
+        if _is_nan(x):
+            self.window.append(NAN)
+            self.missing += 1
+        else:
+            d = x - self.ref
+            self.window.append(d)
+            self.total += d
+            self.total_sq += d * d
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.window) < self.n or self.missing:
+            return NAN, NAN, NAN, NAN
+        mean = self.total / self.n
+        std = math.sqrt(max(self.total_sq / self.n - mean * mean, 0.0))
+        mid = mean + self.ref
+        high, low = mid + self.k * std, mid - self.k * std
+        return high, low, mid, (high - low) / mid if mid else NAN
+
+    def _restore(self):
+        self.window = deque(self.window, maxlen=self.n)
+
+
+class StreamingVWAP(StreamingIndicator):
+    """當日 VWAP；給 session (例如交易日日期字串) 時，換日自動歸零"""
+
+    kind = 'vwap'
+
+    def __init__(self):
+        self.session = None
+        self.cum_vol = 0.0
+        self.cum_pv = 0.0
+
+    def update(self, x, volume=0.0, session=None):
+        if session is not None and session != self.session:
+            self.session = session
+            self.cum_vol = self.cum_pv = 0.0
+        self.cum_vol += volume
+        self.cum_pv += x * volume
+        return self.value
+
+    def remove(self, x, volume=0.0):
+        """撤回先前 update 過的一筆 (尚未收完的K棒被新資料覆蓋時使用)"""
+        self.cum_vol -= volume
+        self.cum_pv -= x * volume
+        return self.value
+
+    def seed(self, values):
+        """values 為 (price, volume) 或 (price, volume, session) 的序列"""
+        for row in values:
+            self.update(*row)
+        return self
+
+    @property
+    def value(self):
+        return self.cum_pv / self.cum_vol if self.cum_vol > 0 else NAN
+
+
+STATE_TYPES = {cls.kind: cls for cls in (
+    StreamingSMA, StreamingEMA, StreamingMACD, StreamingRSI, StreamingBollinger, StreamingVWAP
+)}
+
+
+def indicator_from_dict(data):
+    return STATE_TYPES[data['kind']].from_dict(data)
+
+
+class StreamingIndicatorSet:
+    """
+    依 logic.indicators 的 spec 建立一組串流指標；
+    update(bar) 回傳與 compute_indicators 同名欄位的最新值
+    """
+
+    def __init__(self, spec=None):
+        if spec is None:
+            return
+        self.states = {}
+        for n in sorted(set(spec.get('ma') or [])):
+            self.states[f'MA_{n}'] = StreamingSMA(n)
+        for n in sorted(set(spec.get('ema') or [])):
+            self.states[f'EMA_{n}'] = StreamingEMA(n)
+        if spec.get('macd'):
+            self.states['MACD'] = StreamingMACD(*spec['macd'])
+        if spec.get('rsi'):
+            self.states['RSI'] = StreamingRSI(spec['rsi'])
+        if spec.get('bollinger'):
+            self.states['BB'] = StreamingBollinger(*spec['bollinger'])
+        if spec.get('vol_ma'):
+            self.states['Vol_MA'] = StreamingSMA(spec['vol_ma'])
+        if spec.get('vwap'):
+            self.states['VWAP'] = StreamingVWAP()
+        self.last_ts = None
+
+    def update(self, close, volume=0.0, ts=None, session=None):
+        out = {}
+        for name, state in self.states.items():
+            if name == 'Vol_MA':
+                out[name] = state.update(volume)
+            elif name == 'VWAP':
+                out[name] = state.update(close, volume, session)
+            elif name == 'MACD':
+                out['MACD'], out['Signal'], out['Hist'] = state.update(close)
+            elif name == 'BB':
+                out['BB_High'], out['BB_Low'], out['BB_Mid'], out['BB_Width'] = state.update(close)
+            else:
+                out[name] = state.update(close)
+        self.last_ts = ts if ts is not None else self.last_ts
+        return out
+
+    def seed(self, df):
+        """以歷史 DataFrame (需有 Close，Volume 可省略) 灌入狀態，回傳最後一根的值"""
+        out = {}
+        volumes = df['Volume'] if 'Volume' in df.columns else [0.0] * len(df)
+        for ts, close, volume in zip(df.index, df['Close'], volumes):
+            out = self.update(float(close), float(volume), ts)
+        return out
+
+    def to_dict(self):
+        return {
+            'states': {name: state.to_dict() for name, state in self.states.items()},
+            'last_ts': str(self.last_ts) if self.last_ts is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls()
+        obj.states = {name: indicator_from_dict(d) for name, d in data['states'].items()}
+        # [修正] 還原成 Timestamp，與 seed / update 傳入的索引型別一致
+        last_ts = data.get('last_ts')
+        obj.last_ts = pd.Timestamp(last_ts) if last_ts is not None else None
+        return obj
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
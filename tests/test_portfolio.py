@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from logic.portfolio import backtest_portfolio
+
+
+def _close(n_tickers=100, n_dates=504, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (n_dates, n_tickers)), axis=0))
+    return pd.DataFrame(prices, index=pd.bdate_range('2023-01-02', periods=n_dates),
+                        columns=[f'T{i:03d}' for i in range(n_tickers)])
+
+
+def test_rebalance_frequency_changes_result():
+    close = _close()
+    weekly = backtest_portfolio(close, rule='hold_all', freq='W')
+    quarterly = backtest_portfolio(close, rule='hold_all', freq='Q')
+    assert weekly['stats']['trades'] > quarterly['stats']['trades']
+    assert weekly['stats']['total_return'] != quarterly['stats']['total_return']
+
+
+def test_strategy_and_baseline_share_start():
+    close = _close(10)
+    strategy = backtest_portfolio(close, rule='ma_cross', fast=5, slow=60)
+    baseline = backtest_portfolio(close, rule='hold_all', fast=5, slow=60)
+    assert strategy['equity'].index[0] == baseline['equity'].index[0]
+
+
+def test_avg_holdings_counts_held_positions():
+    close = _close(5)
+    close.iloc[:300, 0] = np.nan          # 第一檔前段尚未上市
+    result = backtest_portfolio(close, rule='hold_all', freq='M')
+    held = (result['weights'] > 0).sum(axis=1)
+    assert 4 < result['stats']['avg_holdings'] < 5
+    assert result['stats']['avg_holdings'] == held.mean()
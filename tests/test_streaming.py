@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from logic import indicators
+from logic.streaming import (
+    StreamingSMA, StreamingEMA, StreamingMACD, StreamingRSI, StreamingBollinger, StreamingVWAP,
+    StreamingIndicatorSet, indicator_from_dict,
+)
+
+
+def _prices(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+
+def _run(state, values):
+    return np.array([state.update(float(x)) for x in values], dtype=np.float64)
+
+
+def _assert_close(streamed, batch):
+    np.testing.assert_allclose(streamed, batch, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('n', [1, 5, 20])
+def test_sma_matches_batch(n):
+    close = _prices()
+    _assert_close(_run(StreamingSMA(n), close), indicators.sma(close, n))
+
+
+def test_sma_recovers_after_nan():
+    close = _prices(60)
+    close[10] = np.nan
+    streamed = _run(StreamingSMA(5), close)
+    _assert_close(streamed, indicators.sma(close, 5))
+    assert np.isfinite(streamed[15:]).all()
+
+
+@pytest.mark.parametrize('span', [5, 12, 26])
+def test_ema_matches_batch(span):
+    close = _prices()
+    _assert_close(_run(StreamingEMA(span), close), indicators.ema(close, span))
+
+
+def test_macd_matches_batch():
+    close = _prices()
+    state = StreamingMACD(12, 26, 9)
+    streamed = np.array([state.update(float(x)) for x in close])
+    for got, expected in zip(streamed.T, indicators.macd(close, 12, 26, 9)):
+        _assert_close(got, expected)
+
+
+def _with_gaps(close):
+    close = close.copy()
+    close[:5] = np.nan
+    close[100:104] = np.nan
+    close[180] = np.nan
+    return close
+
+
+@pytest.mark.parametrize('span', [5, 26])
+def test_ema_decays_through_interior_nan(span):
+    close = _with_gaps(_prices())
+    _assert_close(_run(StreamingEMA(span), close), indicators.ema(close, span))
+
+
+def test_macd_and_rsi_match_batch_with_interior_nan():
+    close = _with_gaps(_prices())
+    state = StreamingMACD(12, 26, 9)
+    streamed = np.array([state.update(float(x)) for x in close])
+    for got, expected in zip(streamed.T, indicators.macd(close, 12, 26, 9)):
+        _assert_close(got, expected)
+    _assert_close(_run(StreamingRSI(14), close), indicators.rsi(close, 14))
+
+
+@pytest.mark.parametrize('leading_nan', [0, 7])
+def test_rsi_matches_batch(leading_nan):
+    close = _prices()
+    close[:leading_nan] = np.nan
+    _assert_close(_run(StreamingRSI(14), close), indicators.rsi(close, 14))
+
+
+def test_bollinger_matches_batch():
+    close = _prices()
+    close[50] = np.nan
+    state = StreamingBollinger(20, 2)
+    streamed = np.array([state.update(float(x)) for x in close])
+    for got, expected in zip(streamed.T, indicators.bollinger(close, 20, 2)):
+        _assert_close(got, expected)
+
+
+def test_vwap_matches_batch_and_resets_per_session():
+    close = _prices(100)
+    volume = np.random.default_rng(1).integers(1, 10_000, 100).astype(np.float64)
+    state = StreamingVWAP()
+    streamed = np.array([state.update(c, v, 'd1' if i < 60 else 'd2')
+                         for i, (c, v) in enumerate(zip(close, volume))])
+    _assert_close(streamed[:60], indicators.vwap(close[:60], volume[:60]))
+    _assert_close(streamed[60:], indicators.vwap(close[60:], volume[60:]))
+
+    state.remove(close[-1], volume[-1])
+    _assert_close(state.value, indicators.vwap(close[60:-1], volume[60:-1])[-1])
+
+
+def test_indicator_set_matches_compute_indicators():
+    close = _prices()
+    volume = np.random.default_rng(2).integers(1, 10_000, close.size).astype(np.float64)
+    df = pd.DataFrame({'Close': close, 'Volume': volume}, index=pd.date_range('2024-01-01', periods=close.size))
+    spec = indicators.make_spec(ema=[10], vwap=True)
+    batch = indicators.compute_indicators(df, spec)
+
+    state = StreamingIndicatorSet(spec)
+    rows = pd.DataFrame([state.update(c, v, ts) for ts, c, v in zip(df.index, close, volume)], index=df.index)
+    for col in rows.columns:
+        expected = batch[col].to_numpy()
+        if col in ('MACD', 'Signal', 'Hist'):
+            got = np.nan_to_num(rows[col].to_numpy())     # 批次版暖機期補 0
+        else:
+            got = rows[col].to_numpy()
+        _assert_close(got, expected)
+
+
+def test_round_trip_continues_identically():
+    close = _prices()
+    df = pd.DataFrame({'Close': close[:200]}, index=pd.date_range('2024-01-01', periods=200))
+    spec = indicators.make_spec()
+    state = StreamingIndicatorSet(spec)
+    state.seed(df)
+
+    restored = StreamingIndicatorSet.from_json(state.to_json())
+    assert restored.last_ts == df.index[-1]
+    assert isinstance(restored.last_ts, pd.Timestamp)
+    for x in close[200:]:
+        assert restored.update(float(x)) == pytest.approx(state.update(float(x)), nan_ok=True)
+
+
+def test_single_indicator_round_trip():
+    close = _prices(80)
+    sma = StreamingSMA(10).seed(close[:40])
+    restored = indicator_from_dict(sma.to_dict())
+    _assert_close(_run(restored, close[40:]), _run(sma, close[40:]))
@@ -0,0 +1,163 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# ─────────────────────────────────────────────────────────────
+#  [新增] 圖表精簡序列化：減少每次送到瀏覽器的 Plotly JSON
+#  - 日期轉成「毫秒」數值陣列 (plotly 日期軸可直接吃數字)，不再每點一串 ISO 字串
+#  - 價格四捨五入到最小跳動單位，數值陣列改用能精確表示的最小型別 (u1 / u4 / f4 …)，
+#    由 plotly 以 typed array (base64) 傳送
+#  - 漲跌顏色改為 0 / 1 數值 + 兩色 colorscale，不再每根K棒一個顏色字串
+#  - 每張圖記錄 payload 大小，方便在監控面板發現膨脹 (同一張圖每 PAYLOAD_SAMPLE_SECONDS 秒最多量一次)
+# ─────────────────────────────────────────────────────────────
+
+TICK_SIZE = 0.01            # 美股 $1 以上最小跳動
+SUB_DOLLAR_TICK = 0.0001    # $1 以下
+VALUE_DIGITS = 4            # 指標 (MACD / RSI …) 保留的小數位
+
+PRICE_TRACES = {'candlestick', 'ohlc'}
+NUMERIC_FIELDS = ('y', 'z', 'open', 'high', 'low', 'close', 'values')
+
+PAYLOAD_SAMPLE_SECONDS = 300   # [修正] 量測本身要多序列化一次，熱路徑 (即時報價卡等) 只抽樣量測
+
+_payloads = {}
+_payload_measured = {}
+_payload_lock = threading.Lock()
+
+
+def tick_decimals(values):
+    """依價位決定四捨五入的小數位 ($1 以下用 0.0001)"""
+    finite = np.abs(values[np.isfinite(values)])
+    tick = SUB_DOLLAR_TICK if finite.size and finite.max() < 1 else TICK_SIZE
+    return int(round(-np.log10(tick)))
+
+
+def encode_dates(index):
+    """DatetimeIndex → 毫秒數值 (去時區、保留當地時間，與原本 ISO 字串顯示的時間相同)"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.as_unit('ms').asi8.astype(np.float64)
+
+
+def encode_values(values, decimals=VALUE_DIGITS):
+    """四捨五入後改用能精確還原的最小型別：整數 → u1/u2/u4/i4；小數 → f4 (誤差小於半個跳動) 否則 f8"""
+    values = np.round(np.asarray(values, dtype=np.float64), decimals)
+    finite = values[np.isfinite(values)]
+    if finite.size == values.size and np.all(finite == np.round(finite)):
+        for dtype in (np.uint8, np.uint16, np.uint32, np.int32):
+            info = np.iinfo(dtype)
+            if not finite.size or (finite.min() >= info.min and finite.max() <= info.max):
+                return values.astype(dtype)
+    as_f4 = values.astype(np.float32)
+    err = np.abs(as_f4[np.isfinite(values)].astype(np.float64) - finite)
+    return as_f4 if not err.size or err.max() < 0.5 * 10.0 ** -decimals else values
+
+
+def binary_colors(mask, up_color, down_color):
+    """漲跌兩色：marker 用 0 / 1 數值 + colorscale (取代逐根的顏色字串清單)"""
+    return dict(color=np.asarray(mask, dtype=np.uint8), colorscale=[[0, down_color], [1, up_color]],
+                cmin=0, cmax=1, showscale=False)
+
+
+def _is_dates(values):
+    values = np.asarray(values)
+    return values.dtype.kind == 'M' or (values.dtype.kind == 'O' and isinstance(values[0], (pd.Timestamp, np.datetime64)))
+
+
+def _is_numeric(values):
+    return isinstance(values, (np.ndarray, pd.Series, pd.Index, list, tuple)) and \
+        np.asarray(values).dtype.kind in 'iuf'
+
+
+def to_ms(value):
+    """單一日期 (Timestamp / datetime / 字串) → 與 encode_dates 相同單位的毫秒數；非日期原樣回傳"""
+    if isinstance(value, (pd.Timestamp, datetime, np.datetime64, str)):
+        try:
+            return float(encode_dates([pd.Timestamp(value)])[0])
+        except (ValueError, TypeError):
+            return value
+    return value
+
+
+def _axis_key(ref):
+    """trace 的 xaxis 參照 ('x' / 'x2') → layout 屬性名稱 ('xaxis' / 'xaxis2')"""
+    return 'xaxis' + (ref or 'x')[1:]
+
+
+def _convert_date_layout(fig, refs):
+    """
+    資料改成毫秒後，對應的 x 軸要標成 date (否則 plotly 視為一般數值軸，rangebreaks 也失效)，
+    軸範圍、刻度位置與以該軸為座標的 shape 也一併換成毫秒
+    """
+    # 共用 x 軸 (matches) 的其他軸也是日期軸
+    refs = set(refs) | {'x' + k[5:] for k in fig.layout if k.startswith('xaxis') and fig.layout[k].matches in refs}
+    for ref in refs:
+        axis = fig.layout[_axis_key(ref)]
+        axis.type = 'date'
+        if axis.range is not None:
+            axis.range = [to_ms(v) for v in axis.range]
+        if axis.tickvals is not None:
+            axis.tickvals = [to_ms(v) for v in axis.tickvals]
+    for shape in fig.layout.shapes:
+        if (shape.xref or 'x') in refs:
+            shape.x0, shape.x1 = to_ms(shape.x0), to_ms(shape.x1)
+
+
+def compact_figure(fig):
+    """
+    就地精簡 figure 的資料陣列並回傳同一個 figure
+    K線 (與同軸的線) 依價位四捨五入到跳動單位，其他數值保留 VALUE_DIGITS 位
+    日期改成毫秒的 x 軸會標為 date，版面上的日期 (範圍 / 刻度 / shape) 換成同單位
+    """
+    price_axes = {t.yaxis or 'y' for t in fig.data if t.type in PRICE_TRACES}
+    date_refs = set()
+    for trace in fig.data:
+        x = getattr(trace, 'x', None)
+        if x is not None and len(x) and _is_dates(x):
+            trace.x = encode_dates(x)
+            date_refs.add(trace.xaxis or 'x')
+
+        is_price = trace.type in PRICE_TRACES or (getattr(trace, 'yaxis', None) or 'y') in price_axes
+        for field in NUMERIC_FIELDS:
+            values = getattr(trace, field, None) if field in trace else None
+            if values is None or not len(values) or not _is_numeric(values):
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            trace[field] = encode_values(values, tick_decimals(values) if is_price else VALUE_DIGITS)
+    if date_refs:
+        _convert_date_layout(fig, date_refs)
+    return fig
+
+
+def payload_bytes(fig):
+    return len(pio.to_json(fig, validate=False).encode())
+
+
+def record_payload(name, fig, force=False):
+    """
+    記錄某張圖送到瀏覽器的 JSON 大小 (bytes)，回傳該大小；
+    距上次量測未滿 PAYLOAD_SAMPLE_SECONDS 則略過 (回傳上次的大小)。
+    force：快取未命中時才會建圖的地方 (本來就不在熱路徑上) 每次都量
+    """
+    now = time.monotonic()
+    with _payload_lock:
+        last = _payload_measured.get(name)
+        if not force and last is not None and now - last < PAYLOAD_SAMPLE_SECONDS:
+            return _payloads.get(name)
+        _payload_measured[name] = now
+    size = payload_bytes(fig)
+    with _payload_lock:
+        _payloads[name] = size
+    return size
+
+
+def payload_report():
+    """各圖表最近一次的 payload 大小 (KB)"""
+    with _payload_lock:
+        items = dict(_payloads)
+    return pd.DataFrame({'KB': {k: v / 1024 for k, v in items.items()}}).rename_axis('圖表')